@@ -0,0 +1,113 @@
+import numpy as np
+
+# Tenure status codes stored in ``HouseholdStore.status``.
+STATUS_CODES = ("renting", "owning", "homeless")
+RENTING, OWNING, HOMELESS = range(len(STATUS_CODES))
+
+# Columns of ``HouseholdStore.preferences`` (weights used in location choice).
+PREFERENCE_NAMES = ("accessibility", "services", "cost")
+
+# Node value for households that are not placed on the network.
+NO_NODE = -1
+
+
+class HouseholdStore:
+    """
+    Household population held as struct-of-arrays.
+
+    Row ``i`` of every array describes household ``i``. At ~30 bytes per
+    household the full municipality (~330k dwellings) fits in a few MB, and
+    per-step operations are array passes instead of Python loops over agent
+    objects. ``HouseholdAgent`` objects are only built on demand through
+    ``agent`` for inspection.
+    """
+
+    COLUMNS = ("income", "status", "node", "cbd_node", "members", "preferences")
+
+    def __init__(self, capacity=0):
+        self.size = 0
+        self.income = np.zeros(capacity, dtype=np.float64)
+        self.status = np.zeros(capacity, dtype=np.int8)
+        self.node = np.full(capacity, NO_NODE, dtype=np.int32)
+        self.cbd_node = np.full(capacity, NO_NODE, dtype=np.int32)
+        self.members = np.ones(capacity, dtype=np.int8) # Household size
+        self.preferences = np.zeros((capacity, len(PREFERENCE_NAMES)), dtype=np.float32)
+        self._views = {}
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def capacity(self):
+        return self.income.shape[0]
+
+    def _reserve(self, n):
+        if self.size + n <= self.capacity:
+            return
+        new_capacity = max(self.size + n, 2 * self.capacity, 16)
+        for name in self.COLUMNS:
+            old = getattr(self, name)
+            fill = {"node": NO_NODE, "cbd_node": NO_NODE, "members": 1}.get(name, 0)
+            grown = np.full((new_capacity,) + old.shape[1:], fill, dtype=old.dtype)
+            grown[:self.size] = old[:self.size]
+            setattr(self, name, grown)
+
+    def add(self, income, node=NO_NODE, status=RENTING, cbd_node=NO_NODE, members=1, preferences=None):
+        """
+        Append households in bulk; scalar arguments are broadcast.
+
+        :return: Index array of the new households.
+        """
+        income = np.atleast_1d(np.asarray(income, dtype=np.float64))
+        n = income.shape[0]
+        self._reserve(n)
+        rows = slice(self.size, self.size + n)
+        self.income[rows] = income
+        self.node[rows] = node
+        self.status[rows] = status
+        self.cbd_node[rows] = cbd_node
+        self.members[rows] = members
+        if preferences is not None:
+            self.preferences[rows] = preferences
+        self.size += n
+        return np.arange(rows.start, rows.stop)
+
+    # ------------------------------------------------------------------
+    # Bulk operations
+    # ------------------------------------------------------------------
+    def view(self, name):
+        """Live slice of column ``name`` covering the current households."""
+        return getattr(self, name)[:self.size]
+
+    def housed(self):
+        """Indices of households placed on a node."""
+        return np.flatnonzero(self.view("node") != NO_NODE)
+
+    def counts_per_node(self, n_nodes):
+        """Number of housed households on each node."""
+        nodes = self.view("node")
+        return np.bincount(nodes[nodes != NO_NODE], minlength=n_nodes)
+
+    def relocate(self, idx, nodes):
+        """Move households ``idx`` to ``nodes``; homeless households become renters."""
+        idx = np.asarray(idx)
+        self.node[idx] = nodes
+        self.status[idx[self.status[idx] == HOMELESS]] = RENTING
+
+    def exit_market(self, idx):
+        """Households ``idx`` leave their dwelling and the housing market."""
+        self.node[idx] = NO_NODE
+        self.status[idx] = HOMELESS
+
+    # ------------------------------------------------------------------
+    # On-demand agent objects
+    # ------------------------------------------------------------------
+    def agent(self, index, model):
+        """``HouseholdAgent`` view of household ``index`` (created once, then reused)."""
+        from agents.households import HouseholdAgent
+
+        if not 0 <= index < self.size:
+            raise IndexError(f"Household {index} does not exist (size {self.size})")
+        if index not in self._views:
+            self._views[index] = HouseholdAgent(model, self, index)
+        return self._views[index]
@@ -1,32 +1,87 @@
-import mesa
-
-class HouseholdAgent(mesa.Agent):
-    def __init__(self, unique_id, model, income):
-        super().__init__(unique_id, model)
-        
-        # Initialize household attributes
-        self.income = income
-        self.status = "renting"
-        self.location = None
-        self.cbd_location = None
-
-        # Future attributes can include:
-        # self.preferences = {}
-
-    def search_for_housing(self):
-        # Placeholder: Implement logic for searching housing
-        pass
+from agents.household_store import STATUS_CODES, PREFERENCE_NAMES, NO_NODE
+from scheduler import BatchedAgent
+
+
+class HouseholdAgent(BatchedAgent):
+    """
+    Mesa view of one household stored in a ``HouseholdStore``.
+
+    Households live in the store's arrays; an agent object is only created
+    (via ``HouseholdStore.agent``) when a single household needs to be
+    inspected or driven by hand. Reading or assigning ``income``, ``status``,
+    ``members``, ``location``, ``cbd_location`` or ``preferences`` goes
+    straight to the store row.
+    """
+
+    def __init__(self, model, store, index):
+        super().__init__(model)
+        self.store = store
+        self.index = index
+
+    @property
+    def income(self):
+        return float(self.store.income[self.index])
+
+    @income.setter
+    def income(self, value):
+        self.store.income[self.index] = value
+
+    @property
+    def status(self):
+        return STATUS_CODES[self.store.status[self.index]]
 
+    @status.setter
+    def status(self, value):
+        self.store.status[self.index] = STATUS_CODES.index(value)
+
+    @property
+    def members(self):
+        return int(self.store.members[self.index])
+
+    @members.setter
+    def members(self, value):
+        self.store.members[self.index] = value
+
+    @property
+    def location(self):
+        node = int(self.store.node[self.index])
+        return None if node == NO_NODE else node
+
+    @property
+    def cbd_location(self):
+        node = int(self.store.cbd_node[self.index])
+        return None if node == NO_NODE else node
+
+    @property
+    def preferences(self):
+        return dict(zip(PREFERENCE_NAMES, self.store.preferences[self.index].tolist()))
+
+    def search_for_housing(self, k=5, max_travel_time=None):
+        """
+        Cheapest ``k`` affordable vacancies within ``max_travel_time`` of the CBD.
+
+        :return: Candidate node ids, cheapest first.
+        """
+        budget = self.income * self.model.max_cost_to_income
+        nodes, _ = self.model.vacancies.query(
+            budget, k=k, max_travel_time=max_travel_time, travel_time=self.model.travel_times.to_cbd
+        )
+        return nodes.tolist()
 
     def relocate(self, new_location):
-        # Placeholder: Implement logic for relocating to a new location
-        self.location = new_location
+        self.model.relocate_households([self.index], [new_location])
 
     def exit_housing_market(self):
-        # Placeholder: Implement logic for exiting the housing market
-        self.status = "homeless"
+        self.model.exit_households([self.index])
+
+    @classmethod
+    def step_all(cls, model, agents):
+        """
+        All households act at once through the market clearing, which
+        picks the households with pending work (searchers) from the store.
+        """
+        model.clear_housing_market()
 
-    
     def step(self):
         # Placeholder: Advance the household's state each step
         pass
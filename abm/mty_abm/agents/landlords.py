@@ -1,33 +1,143 @@
-import mesa
+import numpy as np
+from mesa.agent import AgentSet
+from events import COMPLETION, PERMIT_DECISION, PROPOSAL
+from scheduler import BatchedAgent
 
+# Project status values.
+PROPOSED, APPROVED, REJECTED, COMPLETED = "proposed", "approved", "rejected", "completed"
+
+
+class Project:
+    """A housing development of ``units`` dwellings at ``node``."""
+
+    __slots__ = ("landlord", "node", "units", "cost", "status", "proposed_at", "completes_at")
+
+    def __init__(self, landlord, node, units, cost, proposed_at):
+        self.landlord = landlord
+        self.node = node
+        self.units = units
+        self.cost = cost
+        self.status = PROPOSED
+        self.proposed_at = proposed_at
+        self.completes_at = None
+
+    def __repr__(self):
+        return f"Project(node={self.node}, units={self.units}, status={self.status})"
+
+
+class LandlordAgent(BatchedAgent):
+    """
+    Developer that builds dwellings through the model's event queue.
+
+    A landlord is only woken by events that concern it: a ``PROPOSAL``
+    review and the outcome of its own projects. A landlord that cannot
+    afford a project reviews again after a delay that doubles each time,
+    up to ``max_review_interval``; completed sales reset it. Landlords
+    short of capital therefore cost a few events over a long run instead of
+    one every step. Construction itself takes no work
+    per step; the ``COMPLETION`` event adds the dwellings.
+    """
+
+    # Timings in model steps.
+    review_interval = 1
+    max_review_interval = 32
+    permit_delay = 1
+    construction_time = 2
+    # A dwelling costs this many times the node's housing cost to build and
+    # sells (returns to capital) at sale_multiple times the price on completion.
+    construction_cost_multiple = 8.0
+    sale_multiple = 10.0
+    max_units_per_project = 50
+
+    def __init__(self, model, capital, strategy):
+        super().__init__(model)
 
-class LandlordAgent(mesa.Agent):
-    def __init__(self, unique_id, model, capital, strategy):
-        super().__init__(unique_id, model)
-        
         # Initialize landlord attributes
         self.capital = capital
         self.strategy = strategy
-        self.projects = [] # List of housing projects owned by the landlord
+        self.projects = [] # Active (proposed or under construction) housing projects
+        self.review_delay = self.review_interval # Grows while no project is affordable
         self.municipality_preferences = {}
 
-    
     def evaluate_projects(self):
-        # Placeholder: Evaluate existing housing projects
-        pass
+        """Node scores for a new project under the landlord's strategy (higher is better)."""
+        grid = self.model.grid
+        score = grid.housing_cost * grid.land_availability * (1.0 - 0.5 * grid.regulation_index)
+        if self.strategy == "infill":
+            # Favour nodes that are already built up.
+            score = score * (1.0 + grid.dwellings / max(grid.dwellings.max(), 1))
+        elif self.strategy == "sprawl":
+            score = score / (1.0 + grid.dwellings / max(grid.dwellings.mean(), 1))
+        return score
 
     def propose_new_project(self, location):
-        # Placeholder: Propose a new housing project at the specified location
-        pass
+        """Propose as many units at ``location`` as capital allows; returns the project or None."""
+        unit_cost = self.construction_cost_multiple * float(self.model.grid.housing_cost[location])
+        units = min(int(self.capital // unit_cost), self.max_units_per_project)
+        if units < 1:
+            return None
+        project = Project(self, int(location), units, units * unit_cost, self.model.steps)
+        self.projects.append(project)
+        self.request_permit(project)
+        return project
 
     def request_permit(self, project):
-        # Placeholder: Request a permit from the municipality for a new project
-        pass
+        """Queue the municipality's decision on ``project``."""
+        self.model.events.schedule(self.model.steps + self.permit_delay, PERMIT_DECISION, self, project)
 
     def develop_project(self, project):
-        # Placeholder: Develop the housing project if permit is granted
-        pass
-    
+        """Start building an approved project; the dwellings arrive with its ``COMPLETION`` event."""
+        project.status = APPROVED
+        project.completes_at = self.model.steps + self.construction_time
+        self.capital -= project.cost
+        self.model.events.schedule(project.completes_at, COMPLETION, self, project)
+
+    def reject_project(self, project):
+        project.status = REJECTED
+        self.projects.remove(project)
+        self._schedule_review(self.review_interval)
+
+    def complete_project(self, project):
+        """Collect the sale of a completed project (its dwellings are added in bulk by the model)."""
+        project.status = COMPLETED
+        self.projects.remove(project)
+        self.capital += project.units * self.sale_multiple * float(self.model.grid.housing_cost[project.node])
+        # New capital: review at the normal pace again.
+        self.review_delay = self.review_interval
+        self._schedule_review(self.review_interval)
+
+    def review(self):
+        """Woken by a ``PROPOSAL`` event: propose at the best node, if there is none pending."""
+        if any(p.status == PROPOSED for p in self.projects):
+            return
+        if self.propose_new_project(int(np.argmax(self.evaluate_projects()))) is None:
+            # Not enough capital: back off, since only price changes or a
+            # sale can make a project affordable.
+            self._schedule_review(self.review_delay)
+            self.review_delay = min(2 * self.review_delay, self.max_review_interval)
+        else:
+            self.review_delay = self.review_interval
+
+    def _schedule_review(self, delay):
+        self.model.events.schedule(self.model.steps + delay, PROPOSAL, self)
+
+    @classmethod
+    def pending_agents(cls, model, agents):
+        """Landlords named in a completion or review event due this step."""
+        due = sorted(model.due_events[COMPLETION] + model.due_events[PROPOSAL])
+        return AgentSet(dict.fromkeys(event.landlord for event in due), random=model.random)
+
+    @classmethod
+    def step_all(cls, model, agents):
+        """Deliver all due completions in one bulk dwelling update, then run due reviews."""
+        completions = [event.project for event in model.due_events[COMPLETION]]
+        if completions:
+            model.add_dwellings([p.node for p in completions], [p.units for p in completions])
+            for project in completions:
+                project.landlord.complete_project(project)
+        for event in model.due_events[PROPOSAL]:
+            event.landlord.review()
+
     def step(self):
-        # Placeholder: Evaluate and propose new housing project
-        pass
\ No newline at end of file
+        # Landlords act through their events in step_all.
+        pass
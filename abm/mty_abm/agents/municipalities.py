@@ -1,31 +1,168 @@
-import mesa
+import numpy as np
+from scheduler import BatchedAgent
 
-class MunicipalityAgent(mesa.Agent):
-    def __init__(self, unique_id, model, budget, regulatory_flexibility):
-        super().__init__(unique_id, model)
+
+def greedy_allocation(value, cost, budget):
+    """
+    Pick items by value per unit cost, best first; items that no longer fit
+    in what is left of ``budget`` are skipped, not stopped at.
+
+    :return: Boolean array of selected items.
+    """
+    order = np.lexsort((np.arange(value.shape[0]), -value / np.maximum(cost, 1e-12)))
+    selected = np.zeros(value.shape[0], dtype=bool)
+    remaining = budget
+    for i, c in zip(order.tolist(), cost[order].tolist()):
+        if c <= remaining:
+            selected[i] = True
+            remaining -= c
+    return selected
+
+
+def knapsack_allocation(value, cost, budget, resolution=10_000, max_table=50_000_000):
+    """
+    0/1 knapsack: the subset with the largest total value under ``budget``.
+
+    Costs are rounded up to ``budget / resolution`` units, so the result
+    never exceeds the budget; the resolution is lowered so the backtracking
+    table stays under ``max_table`` cells. Each item is one vectorized pass
+    over the capacity axis. If rounding makes the result worse than
+    ``greedy_allocation``, the greedy selection is returned instead.
+
+    :return: Boolean array of selected items.
+    """
+    n = value.shape[0]
+    selected = np.zeros(n, dtype=bool)
+    if n == 0 or budget <= 0:
+        return selected
+    resolution = int(max(1, min(resolution, max_table // n)))
+    # The small tolerance keeps costs that are exact multiples of a unit
+    # from being rounded up a whole unit by float error.
+    weight = np.ceil(cost / budget * resolution - 1e-9).astype(np.int64)
+    best = np.zeros(resolution + 1)
+    take = np.zeros((n, resolution + 1), dtype=bool)
+    for i in range(n):
+        w = weight[i]
+        if w > resolution:
+            continue
+        candidate = best[:resolution + 1 - w] + value[i]
+        better = candidate > best[w:]
+        best[w:][better] = candidate[better]
+        take[i, w:] = better
+    capacity = resolution
+    for i in range(n - 1, -1, -1):
+        if take[i, capacity]:
+            selected[i] = True
+            capacity -= weight[i]
+    greedy = greedy_allocation(value, cost, budget)
+    return greedy if value[greedy].sum() > value[selected].sum() else selected
+
+
+ALLOCATIONS = {"greedy": greedy_allocation, "knapsack": knapsack_allocation}
+
+
+class MunicipalityAgent(BatchedAgent):
+    """
+    Municipality that grants building permits in its district.
+
+    Permit requests reaching the municipality are queued in
+    ``permit_queue`` and decided together once per step: projects are
+    scored from array rules, those scoring at least ``min_permit_score``
+    compete for the servicing ``budget``, and the budget is allocated with
+    ``allocation`` (``"greedy"`` or ``"knapsack"``).
+    """
+
+    # Servicing cost the municipality takes on per approved dwelling; the
+    # approved projects of one step must fit in ``budget``.
+    servicing_cost_per_unit = 100.0
+    min_permit_score = 0.3
+    allocation = "greedy"
+
+    def __init__(self, model, budget, regulatory_flexibility, district=0):
+        super().__init__(model)
 
         # Initialize municipality attributes
         self.budget = budget
         self.regulatory_flexibility = regulatory_flexibility
+        self.district = district # Index into model.node_municipality
+        self.permit_queue = [] # Projects awaiting a permit decision
+
 
-        
         # Future attributes can include:
         # self.policy_alignment = policy_alignment
         # coordination_level = coordination_level
-        
-    def evaluate_permits(self):
-        # Placeholder: Evaluate housing project permits
-        pass
+
+    def queue_permit(self, project):
+        self.permit_queue.append(project)
+
+    def score_permits(self, nodes):
+        """
+        Permit score per project node: land availability, discounted by the
+        node's ``regulation_index`` to the extent the municipality is not
+        flexible about it.
+        """
+        grid = self.model.grid
+        strictness = 1.0 - self.regulatory_flexibility
+        return grid.land_availability[nodes] * (1.0 - strictness * grid.regulation_index[nodes])
+
+    def evaluate_permits(self, projects):
+        """
+        Decide on a batch of permit requests at once.
+
+        :return: ``(approved, rejected)`` lists of projects.
+        """
+        n = len(projects)
+        nodes = np.fromiter((p.node for p in projects), dtype=np.int64, count=n)
+        units = np.fromiter((p.units for p in projects), dtype=np.float64, count=n)
+        score = self.score_permits(nodes)
+        impact = units * self.servicing_cost_per_unit
+
+        eligible = np.flatnonzero(score >= self.min_permit_score)
+        approved = np.zeros(n, dtype=bool)
+        allocate = ALLOCATIONS[self.allocation]
+        approved[eligible] = allocate(score[eligible] * units[eligible], impact[eligible], self.budget)
+        return [p for p, a in zip(projects, approved) if a], [p for p, a in zip(projects, approved) if not a]
+
+    def decide_permits(self):
+        """Evaluate the whole permit queue and notify the landlords."""
+        if self.model.profiler is not None:
+            self.model.profiler.count("permits", len(self.permit_queue))
+        approved, rejected = self.evaluate_permits(self.permit_queue)
+        self.permit_queue = []
+        for project in approved:
+            project.landlord.develop_project(project)
+        for project in rejected:
+            project.landlord.reject_project(project)
+        return approved, rejected
 
     def invest_in_services(self):
         # Placeholder: Invest in public services to support housing development
         pass
 
-    def adjust_transit_capacity(self):
-        # Placeholder: Adjust edge weights (larger capacity for transit)
-        pass
+    def adjust_transit_capacity(self, edges, capacity_gain):
+        """
+        Add transit capacity on ``edges`` (``(u, v)`` node pairs), cutting
+        their travel time to ``1 / (1 + capacity_gain)`` of its current value.
+        A negative gain (above -1) slows them instead.
 
+        :return: Nodes whose CBD or service travel time changed.
+        """
+        if not capacity_gain > -1.0:
+            raise ValueError(f"capacity_gain must be greater than -1, got {capacity_gain}")
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        adjacency = self.model.travel_times.adjacency
+        current = np.asarray(adjacency[edges[:, 0], edges[:, 1]]).ravel()
+        return self.model.update_travel_times(edges[:, 0], edges[:, 1], current / (1.0 + capacity_gain))
+
+    def has_pending_work(self):
+        return bool(self.permit_queue)
+
+    @classmethod
+    def step_all(cls, model, agents):
+        """Each municipality with queued requests decides them as one batch."""
+        for municipality in agents:
+            municipality.decide_permits()
 
     def step(self):
         # Placeholder: Evaluate permits and invest in services
-        pass
\ No newline at end of file
+        pass
@@ -0,0 +1,288 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+import numpy as np
+import pandas as pd
+from scipy import stats
+from agents.household_store import NO_NODE
+from inequality import burdened_share, gini, mean_burden
+from model import MonterreyModel
+
+
+def homeless_share(model):
+    return float(np.mean(model.households.view("node") == NO_NODE))
+
+
+def mean_housing_cost(model):
+    return float(model.grid.housing_cost.mean())
+
+
+def vacancy_rate(model):
+    return model.vacancies.total_vacant / max(int(model.grid.dwellings.sum()), 1)
+
+
+def income_gini(model):
+    return float(gini(model.households.view("income")))
+
+
+# Scalar end-of-run metrics: name -> function(model). Reporters must be
+# module-level functions so they can be sent to worker processes.
+DEFAULT_REPORTERS = {
+    "homeless_share": homeless_share,
+    "mean_housing_cost": mean_housing_cost,
+    "vacancy_rate": vacancy_rate,
+    "mean_cost_burden": mean_burden,
+    "income_gini": income_gini,
+    "burdened_share": burdened_share,
+}
+
+
+def replicate_seed(root_seed, param_index, replicate):
+    """
+    Seed of one (parameter set, replicate) job.
+
+    Derived from the root seed and the job's position only, so it does not
+    depend on how jobs are split across workers or on the number of
+    replicates requested, and streams of different jobs are independent.
+    """
+    return np.random.SeedSequence(root_seed, spawn_key=(param_index, replicate))
+
+
+class SteadyState:
+    """
+    Early-termination rule for a single run.
+
+    ``reporter`` (function(model) returning a scalar) is read after every
+    step; the run stops once, after at least ``min_steps`` steps, its values
+    over the last ``window`` steps lie within ``tolerance`` times their mean
+    magnitude of each other.
+    """
+
+    def __init__(self, reporter, window=10, tolerance=0.01, min_steps=0):
+        self.reporter = reporter
+        self.window = window
+        self.tolerance = tolerance
+        self.min_steps = min_steps
+
+    def reached(self, history):
+        if len(history) < max(self.window, self.min_steps):
+            return False
+        recent = np.asarray(history[-self.window:])
+        return recent.max() - recent.min() <= self.tolerance * max(abs(recent.mean()), 1e-12)
+
+
+def run_replicate(model_cls, params, n_steps, seed, reporters, steady_state=None):
+    """
+    Run one model for up to ``n_steps`` steps.
+
+    :return: The reporter values followed by the number of steps run.
+    """
+    model = model_cls(**params, seed=seed)
+    history = []
+    steps = 0
+    while steps < n_steps:
+        model.step()
+        steps += 1
+        if steady_state is not None:
+            history.append(steady_state.reporter(model))
+            if steady_state.reached(history):
+                break
+    return [reporter(model) for reporter in reporters.values()] + [steps]
+
+
+def _run_jobs(model_cls, jobs, n_steps, reporters, steady_state=None):
+    return [run_replicate(model_cls, params, n_steps, seed, reporters, steady_state) for params, seed in jobs]
+
+
+def confidence_halfwidth(values, confidence=0.95):
+    """Half-width of the Student t confidence interval of the mean of ``values``."""
+    n = len(values)
+    if n < 2:
+        return np.inf
+    return stats.t.ppf((1 + confidence) / 2, n - 1) * np.std(values, ddof=1) / np.sqrt(n)
+
+
+class ReplicateRunner:
+    """
+    Run stochastic replicates of ``MonterreyModel`` for several parameter sets.
+
+    Every (parameter set, replicate) job gets its own ``SeedSequence`` stream
+    spawned from ``root_seed`` (see ``replicate_seed``), and results are
+    gathered back in job order, so the output is identical for any number of
+    workers. With ``workers > 1`` jobs run in a process pool in chunks.
+
+    ``run`` takes a fixed number of replicates per set; ``run_adaptive``
+    keeps adding batches of replicates to each set until the confidence
+    intervals of the target reporters are narrow enough.
+    """
+
+    def __init__(self, model_cls=MonterreyModel, n_steps=10, reporters=None, root_seed=0, workers=1,
+                 chunk_size=None, steady_state=None):
+        """
+        :param model_cls: Model class taking its parameters and ``seed`` as keywords.
+        :param reporters: name -> function(model) returning a scalar, read
+            after the last step; defaults to ``DEFAULT_REPORTERS``.
+        :param steady_state: Optional ``SteadyState``; runs stop early once it
+            is reached, and ``n_steps`` becomes a cap.
+        """
+        self.model_cls = model_cls
+        self.n_steps = n_steps
+        self.reporters = dict(reporters or DEFAULT_REPORTERS)
+        self.root_seed = root_seed
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.steady_state = steady_state
+
+    def _pool(self, n_jobs):
+        if self.workers <= 1 or n_jobs < 2:
+            return nullcontext()
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def _execute(self, pool, jobs):
+        """Run ``jobs``; yield ``(offset, rows)`` for each chunk as it finishes."""
+        if pool is None:
+            # One job at a time, so callers can save progress after each.
+            for offset in range(len(jobs)):
+                yield offset, _run_jobs(self.model_cls, jobs[offset:offset + 1], self.n_steps, self.reporters,
+                                        self.steady_state)
+            return
+        chunk_size = self.chunk_size or -(-len(jobs) // (4 * self.workers))
+        futures = {
+            pool.submit(_run_jobs, self.model_cls, jobs[i:i + chunk_size], self.n_steps, self.reporters,
+                        self.steady_state): i
+            for i in range(0, len(jobs), chunk_size)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    def _runs_frame(self, keys, values, param_sets):
+        runs = pd.DataFrame(values, columns=list(self.reporters) + ["steps"])
+        runs.insert(0, "replicate", [r for _, r in keys])
+        runs.insert(0, "param_set", [i for i, _ in keys])
+        params = pd.DataFrame([param_sets[i] for i, _ in keys])
+        return pd.concat([params, runs], axis=1)
+
+    def run(self, param_sets, n_replicates=10):
+        """
+        Run ``n_replicates`` of every parameter set.
+
+        :param param_sets: List of keyword dicts for ``model_cls``.
+        :return: ``(runs, summary)``. ``runs`` has one row per job (parameter
+            columns, ``param_set``, ``replicate``, the reporters and the
+            ``steps`` run); ``summary`` has the mean, standard deviation and
+            standard error of each reporter per parameter set.
+        """
+        keys = [(i, r) for i in range(len(param_sets)) for r in range(n_replicates)]
+        jobs = [(param_sets[i], replicate_seed(self.root_seed, i, r)) for i, r in keys]
+
+        values = [None] * len(jobs)
+        with self._pool(len(jobs)) as pool:
+            for offset, rows in self._execute(pool, jobs):
+                values[offset:offset + len(rows)] = rows
+
+        runs = self._runs_frame(keys, values, param_sets)
+        return runs, self.summarize(runs, param_sets)
+
+    def run_adaptive(self, param_sets, targets=None, tolerance=0.05, relative=True, confidence=0.95,
+                     min_replicates=4, batch_size=4, max_replicates=64, results_path=None):
+        """
+        Run replicates of every parameter set in batches until the
+        ``confidence`` interval of each target reporter is narrow enough.
+
+        A set is checked after ``min_replicates`` replicates and then after
+        every further ``batch_size``; it stops once every target's interval
+        half-width is at most ``tolerance`` (times the absolute mean if
+        ``relative``) or ``max_replicates`` is reached. Each round runs the
+        next batch of every unfinished set together in the pool. The check
+        after n replicates always uses replicates 0..n-1, whose seeds are
+        fixed, so results do not depend on the number of workers or on
+        interruptions.
+
+        :param targets: Reporter names to converge; defaults to all.
+        :param results_path: CSV file that receives each finished run as it
+            completes, with full float precision. If it exists, its runs
+            are reused and the sweep resumes where it stopped; call again
+            with the same ``param_sets``, ``root_seed`` and stopping settings.
+        :return: ``(runs, summary)`` as from ``run``; ``summary`` adds the
+            number of replicates, the interval half-width of each target and
+            whether the set ``converged`` before the cap.
+        """
+        targets = list(targets or self.reporters)
+        columns = ["param_set", "replicate"] + list(self.reporters) + ["steps"]
+        done = {}
+        if results_path is not None and os.path.exists(results_path):
+            # Reporters are floats even when every saved value looks like an integer.
+            saved = pd.read_csv(results_path, float_precision="round_trip",
+                                dtype={name: np.float64 for name in self.reporters})
+            for row in saved[columns].itertuples(index=False):
+                done[(int(row[0]), int(row[1]))] = list(row[2:])
+
+        def converged(i, n):
+            for name in targets:
+                values = [done[(i, r)][list(self.reporters).index(name)] for r in range(n)]
+                limit = tolerance * abs(np.mean(values)) if relative else tolerance
+                halfwidth = confidence_halfwidth(values, confidence)
+                # NaN reporters (or a NaN mean) never count as converged.
+                if not np.isfinite(halfwidth) or not np.isfinite(limit) or halfwidth > limit:
+                    return False
+            return True
+
+        n_target = [min(min_replicates, max_replicates)] * len(param_sets)
+        finished = [False] * len(param_sets)
+        is_converged = [False] * len(param_sets)
+        with self._pool(2 * self.workers) as pool:
+            while True:
+                # 1) Check every set whose scheduled replicates are all done.
+                keys = []
+                for i in range(len(param_sets)):
+                    while not finished[i]:
+                        missing = [(i, r) for r in range(n_target[i]) if (i, r) not in done]
+                        if missing:
+                            keys += missing
+                            break
+                        is_converged[i] = converged(i, n_target[i])
+                        if is_converged[i] or n_target[i] >= max_replicates:
+                            finished[i] = True
+                        else:
+                            n_target[i] = min(n_target[i] + batch_size, max_replicates)
+                if not keys:
+                    break
+
+                # 2) Run the next batch of all unfinished sets, saving as runs finish.
+                jobs = [(param_sets[i], replicate_seed(self.root_seed, i, r)) for i, r in keys]
+                for offset, rows in self._execute(pool, jobs):
+                    batch_keys = keys[offset:offset + len(rows)]
+                    for key, row in zip(batch_keys, rows):
+                        done[key] = row
+                    if results_path is not None:
+                        frame = pd.DataFrame([list(k) + row for k, row in zip(batch_keys, rows)], columns=columns)
+                        # 17 significant digits round-trip float64 exactly, so
+                        # resumed sweeps match uninterrupted ones.
+                        frame.to_csv(results_path, mode="a", header=not os.path.exists(results_path), index=False,
+                                     float_format="%.17g")
+
+        keys = [(i, r) for i in range(len(param_sets)) for r in range(n_target[i])]
+        runs = self._runs_frame(keys, [done[key] for key in keys], param_sets)
+        summary = self.summarize(runs, param_sets)
+        summary["n_replicates"] = n_target
+        for name in targets:
+            summary[f"{name}_ci"] = [
+                confidence_halfwidth(runs.loc[runs["param_set"] == i, name].to_numpy(), confidence)
+                for i in range(len(param_sets))
+            ]
+        summary["converged"] = is_converged
+        return runs, summary
+
+    def summarize(self, runs, param_sets):
+        grouped = runs.groupby("param_set")[list(self.reporters)]
+        summary = grouped.agg(["mean", "std", "sem"])
+        summary.columns = [f"{name}_{stat}" for name, stat in summary.columns]
+        params = pd.DataFrame(param_sets, index=pd.RangeIndex(len(param_sets), name="param_set"))
+        return params.join(summary).reset_index()
+
+
+if __name__ == "__main__":
+    param_sets = [{"num_households": n, "initial_vacancy_rate": v} for n in (1000, 5000) for v in (0.02, 0.1)]
+    runner = ReplicateRunner(n_steps=20, root_seed=42, workers=4)
+    runs, summary = runner.run(param_sets, n_replicates=8)
+    print(summary.to_string(index=False))
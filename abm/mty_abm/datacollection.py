@@ -0,0 +1,195 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+
+
+class ArrayDataCollector:
+    """
+    Columnar data collector for ``MonterreyModel``.
+
+    Reporters are array expressions evaluated once per collection instead of
+    per-agent Python calls:
+
+    - model reporters: name -> function(model) returning a scalar;
+    - node reporters: name -> ``CityNetwork`` array name (e.g.
+      ``"housing_cost"``) or function(model) returning an (n_nodes,) array;
+    - agent reporters: name -> ``HouseholdStore`` column name (e.g.
+      ``"income"``) or function(model, idx) returning values for households
+      ``idx``.
+
+    Node and agent data are only taken every ``node_every`` / ``agent_every``
+    collections, and agent data only for a fixed random sample of
+    ``agent_sample`` households, so the cost of a collection does not grow
+    with the number of steps and only grows with the population through the
+    sample size. Values go into preallocated buffers of ``buffer_size``
+    collections; when a buffer fills it is written to ``spill_dir`` as a
+    Parquet part file (needs pyarrow), or grown if no ``spill_dir`` is set.
+    """
+
+    TABLES = ("model", "nodes", "agents")
+
+    def __init__(self, model_reporters=None, node_reporters=None, agent_reporters=None, every=1, node_every=1,
+                 agent_every=1, agent_sample=1000, buffer_size=256, spill_dir=None, seed=None):
+        """
+        :param every: Collect on every ``every``-th call to ``collect``.
+        :param node_every, agent_every: Of those collections, record node /
+            agent data only every ``node_every`` / ``agent_every``-th one.
+        :param agent_sample: Number of households tracked (a fraction in
+            (0, 1] is taken as a share of the population), or None for all.
+        :param seed: Seed for drawing the agent sample; kept separate from the
+            model's generator so collecting does not change the simulation.
+        """
+        self.model_reporters = dict(model_reporters or {})
+        self.node_reporters = dict(node_reporters or {})
+        self.agent_reporters = dict(agent_reporters or {})
+        self.every = every
+        self.node_every = node_every
+        self.agent_every = agent_every
+        self.agent_sample = agent_sample
+        self.buffer_size = buffer_size
+        self.spill_dir = spill_dir
+        self.rng = np.random.default_rng(seed)
+
+        self.sample = None
+        self.n_nodes = None
+        self.collect_time = 0.0
+        self._calls = 0
+        self._collections = 0
+        self._buffers = {}
+        self._rows = dict.fromkeys(self.TABLES, 0)
+        self._parts = {table: [] for table in self.TABLES}
+
+    # ------------------------------------------------------------------
+    # Buffers
+    # ------------------------------------------------------------------
+    def _allocate(self, table, width, names):
+        buffers = {"step": np.zeros(self.buffer_size, dtype=np.int64)}
+        for name in names:
+            buffers[name] = np.zeros(self.buffer_size if width is None else (self.buffer_size, width))
+        self._buffers[table] = buffers
+
+    def _setup(self, model):
+        self.n_nodes = model.grid.n_nodes
+        n = len(model.households)
+        if self.agent_sample is None:
+            self.sample = np.arange(n)
+        else:
+            size = self.agent_sample
+            if isinstance(size, float) and size <= 1:
+                size = int(round(size * n))
+            self.sample = np.sort(self.rng.choice(n, size=min(int(size), n), replace=False))
+        self._allocate("model", None, self.model_reporters)
+        self._allocate("nodes", self.n_nodes, self.node_reporters)
+        self._allocate("agents", self.sample.shape[0], self.agent_reporters)
+
+    def _row(self, table, step):
+        """Next free row of ``table``, spilling or growing the buffer when full."""
+        buffers = self._buffers[table]
+        row = self._rows[table]
+        if row == buffers["step"].shape[0]:
+            if self.spill_dir is not None:
+                self._spill(table)
+                row = 0
+            else:
+                for name, values in buffers.items():
+                    buffers[name] = np.concatenate([values, np.zeros_like(values)])
+        buffers["step"][row] = step
+        self._rows[table] = row + 1
+        return row
+
+    def _frame(self, table, rows):
+        """Long-format DataFrame of the first ``rows`` rows of a buffer."""
+        buffers = self._buffers[table]
+        steps = buffers["step"][:rows]
+        if table == "model":
+            data = {"step": steps}
+            data.update({name: values[:rows] for name, values in buffers.items() if name != "step"})
+            return pd.DataFrame(data)
+        ids = np.arange(self.n_nodes) if table == "nodes" else self.sample
+        key = "node" if table == "nodes" else "household"
+        data = {"step": np.repeat(steps, ids.shape[0]), key: np.tile(ids, rows)}
+        data.update({name: values[:rows].ravel() for name, values in buffers.items() if name != "step"})
+        return pd.DataFrame(data)
+
+    def _spill(self, table):
+        rows = self._rows[table]
+        if rows == 0:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"{table}_{len(self._parts[table]):05d}.parquet")
+        try:
+            self._frame(table, rows).to_parquet(path, index=False)
+        except ImportError as exc:
+            raise ImportError("Spilling collected data to Parquet requires pyarrow") from exc
+        self._parts[table].append(path)
+        self._rows[table] = 0
+
+    # ------------------------------------------------------------------
+    # Collection
+    # ------------------------------------------------------------------
+    def collect(self, model):
+        """Record the reporters for the current step (subject to the sampling intervals)."""
+        self._calls += 1
+        if (self._calls - 1) % self.every:
+            return
+        start = time.perf_counter()
+        if self.sample is None:
+            self._setup(model)
+        step = model.steps
+        collection = self._collections
+        self._collections += 1
+
+        if self.model_reporters:
+            row = self._row("model", step)
+            for name, reporter in self.model_reporters.items():
+                self._buffers["model"][name][row] = reporter(model)
+
+        if self.node_reporters and collection % self.node_every == 0:
+            row = self._row("nodes", step)
+            for name, reporter in self.node_reporters.items():
+                values = model.grid.node_arrays[reporter] if isinstance(reporter, str) else reporter(model)
+                self._buffers["nodes"][name][row] = values
+
+        if self.agent_reporters and collection % self.agent_every == 0:
+            row = self._row("agents", step)
+            for name, reporter in self.agent_reporters.items():
+                if isinstance(reporter, str):
+                    values = getattr(model.households, reporter)[self.sample]
+                else:
+                    values = reporter(model, self.sample)
+                self._buffers["agents"][name][row] = values
+
+        self.collect_time += time.perf_counter() - start
+
+    def flush(self):
+        """Write everything still in the buffers to ``spill_dir``."""
+        if self.spill_dir is None:
+            raise ValueError("flush needs a spill_dir")
+        if self.sample is None:
+            return
+        for table in self.TABLES:
+            self._spill(table)
+
+    # ------------------------------------------------------------------
+    # Results
+    # ------------------------------------------------------------------
+    def _dataframe(self, table):
+        frames = [pd.read_parquet(path) for path in self._parts[table]]
+        if table in self._buffers:
+            frames.append(self._frame(table, self._rows[table]))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def get_model_vars_dataframe(self):
+        """One row per collection: ``step`` and the model reporters."""
+        return self._dataframe("model")
+
+    def get_node_vars_dataframe(self):
+        """One row per (collection, node): ``step``, ``node`` and the node reporters."""
+        return self._dataframe("nodes")
+
+    def get_agent_vars_dataframe(self):
+        """One row per (collection, sampled household): ``step``, ``household`` and the agent reporters."""
+        return self._dataframe("agents")
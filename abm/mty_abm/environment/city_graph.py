@@ -1,22 +1,150 @@
+from collections.abc import MutableMapping
+import networkx as nx
+import numpy as np
 import mesa
 
-class CityNetwork(mesa.NetworkGrid):
+# Per-node attributes held as arrays indexed by node id: name -> (dtype, default).
+NODE_ATTRIBUTES = {
+    "land_availability": (np.float64, 1.0),
+    "service_level": (np.float64, 1.0),
+    "housing_cost": (np.float64, 1000.0),
+    "regulation_index": (np.float64, 0.5),
+    "is_cbd": (np.bool_, False),
+    "dwellings": (np.int64, 0),
+}
+
+
+class NodeAttributes(MutableMapping):
+    """
+    networkx node-attribute dict backed by ``CityNetwork``'s arrays.
+
+    Keys listed in ``NODE_ATTRIBUTES`` read and write the arrays, so
+    ``G.nodes[n]["housing_cost"]`` stays a valid (if slow) way to look at a
+    node. Any other key (e.g. Mesa's ``"agent"`` list) is kept in a plain
+    dict.
+    """
+
+    __slots__ = ("_arrays", "_node", "_extra")
+
+    def __init__(self, arrays, node, extra=None):
+        self._arrays = arrays
+        self._node = node
+        self._extra = dict(extra or {})
+
+    def __getitem__(self, key):
+        if key in self._arrays:
+            return self._arrays[key][self._node].item()
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self._arrays:
+            self._arrays[key][self._node] = value
+        else:
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._arrays:
+            raise KeyError(f"Array-backed node attribute '{key}' cannot be deleted")
+        del self._extra[key]
+
+    def __iter__(self):
+        yield from self._arrays
+        yield from self._extra
+
+    def __len__(self):
+        return len(self._arrays) + len(self._extra)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CityNetwork(mesa.space.NetworkGrid):
+    """
+    City network whose node attributes are contiguous NumPy arrays.
+
+    Nodes are relabelled to ``0..n-1`` (the original labels are kept in
+    ``node_labels``) so every attribute in ``NODE_ATTRIBUTES`` is an array
+    indexed by node id, e.g. ``self.housing_cost[node]``. The networkx graph
+    stays available as a view over those arrays.
+    """
+
+    # Service levels relax toward base_service_level, lowered by overcrowding.
+    base_service_level = 1.0
+    service_adjustment_rate = 0.1
+    congestion_sensitivity = 0.5
+
+    # Prices move by price_adjustment_rate * (demand - supply) / supply per
+    # step, clipped to max_price_change, and never drop below min_housing_cost.
+    price_adjustment_rate = 0.05
+    max_price_change = 0.2
+    min_housing_cost = 100.0
+
     def __init__(self, G):
+        if set(G.nodes) != set(range(G.number_of_nodes())):
+            G = nx.convert_node_labels_to_integers(G, label_attribute="label")
         super().__init__(G)
-        for node_id in self.G.nodes:
-            self.G.nodes[node_id].update({
-                "land_availability": 1.0,
-                "service_level": 1.0,
-                "housing_cost": 1000,
-                "regulation_index": 0.5,
-                "is_cbd": False
-            })
-
-    def update_service_levels(self):
-        # Placeholder: Update service levels due to investment or decay
-        pass
-
-    def adjust_housing_costs(self):
-        # Placeholder: Update housing cost based on demand/supply
-        pass
+        self.n_nodes = self.G.number_of_nodes()
+        self.node_labels = np.array(
+            [self.G.nodes[n].get("label", n) for n in range(self.n_nodes)], dtype=object
+        )
+        self._label_ids = None
+
+        self.node_arrays = {}
+        for name, (dtype, default) in NODE_ATTRIBUTES.items():
+            values = np.full(self.n_nodes, default, dtype=dtype)
+            setattr(self, name, values)
+            self.node_arrays[name] = values
+
+        for node_id in range(self.n_nodes):
+            extra = {k: v for k, v in self.G.nodes[node_id].items() if k not in self.node_arrays}
+            self.G._node[node_id] = NodeAttributes(self.node_arrays, node_id, extra)
+
+    def node_ids(self, labels):
+        """Node ids of nodes given by their original labels."""
+        if self._label_ids is None:
+            self._label_ids = {label: i for i, label in enumerate(self.node_labels)}
+        return np.array([self._label_ids[label] for label in labels], dtype=np.int64)
+
+    def share_memory(self, shared):
+        """
+        Move the node arrays into ``shared`` (a ``parallel.SharedArrays``) so
+        worker processes can read them without copies.
+        """
+        for name, values in self.node_arrays.items():
+            array = shared.create(name, values.shape, values.dtype)
+            array[:] = values
+            setattr(self, name, array)
+            self.node_arrays[name] = array
+
+    def unshare_memory(self):
+        """Copy the node arrays back to private memory (before the shared blocks are freed)."""
+        for name, values in self.node_arrays.items():
+            array = values.copy()
+            setattr(self, name, array)
+            self.node_arrays[name] = array
+
+    def update_service_levels(self, household_counts, investment=None):
+        """
+        Move every node's service level toward its crowding-adjusted target.
+
+        :param household_counts: Households per node (e.g. ``np.bincount``).
+        :param investment: Optional per-node (or scalar) service boost.
+        """
+        overload = np.maximum(household_counts / np.maximum(self.dwellings, 1) - 1.0, 0.0)
+        target = self.base_service_level / (1.0 + self.congestion_sensitivity * overload)
+        if investment is not None:
+            self.service_level += investment
+        self.service_level += self.service_adjustment_rate * (target - self.service_level)
+
+    def adjust_housing_costs(self, household_counts):
+        """
+        Update housing cost from supply/demand pressure at every node.
 
+        :param household_counts: Households per node (demand); supply is
+            ``self.dwellings``.
+        """
+        supply = np.maximum(self.dwellings, 1)
+        pressure = (household_counts - self.dwellings) / supply
+        change = np.clip(self.price_adjustment_rate * pressure, -self.max_price_change, self.max_price_change)
+        self.housing_cost *= 1.0 + change
+        np.maximum(self.housing_cost, self.min_housing_cost, out=self.housing_cost)
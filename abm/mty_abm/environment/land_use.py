@@ -0,0 +1,279 @@
+import json
+import os
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Raster layers: name -> (dtype, fill value).
+# - developable: fraction of the cell that can still be built on;
+# - zoning: index into the raster's ``zoning_classes``;
+# - density: dwellings in the cell;
+# - node: network node the cell belongs to (-1 for none), see ``assign_nodes``.
+LAYERS = {
+    "developable": (np.float32, 1.0),
+    "zoning": (np.uint8, 0),
+    "density": (np.float32, 0.0),
+    "node": (np.int32, -1),
+}
+
+ZONING_CLASSES = ("unzoned", "residential", "mixed_use", "commercial", "industrial", "protected")
+
+
+def node_coordinates(G):
+    """(n_nodes, 2) array of the ``x`` / ``y`` node attributes (projected metres)."""
+    try:
+        return np.array([[G.nodes[n]["x"], G.nodes[n]["y"]] for n in range(G.number_of_nodes())], dtype=float)
+    except KeyError as exc:
+        raise ValueError("Land-use rasters need 'x' and 'y' coordinates on every network node") from exc
+
+
+class LandUseRaster:
+    """
+    Fine-resolution land-use layers of the metro area, memory-mapped from disk.
+
+    Each layer in ``LAYERS`` is a ``.npy`` file in ``path``, opened with
+    ``mmap_mode`` so only the tiles that are read or written are paged in;
+    rasters larger than RAM work the same way. All passes over a layer go
+    tile by tile (``tile_size`` cells square).
+
+    Zonal statistics per network node (``zonal``) are kept as per-tile
+    partial sums. Writes through ``write`` mark the tiles they touch, and the
+    next ``zonal`` call only recomputes those tiles, so per-step land
+    accounting costs the tiles that changed, not the raster.
+    """
+
+    def __init__(self, path, mode="r+"):
+        """
+        :param mode: ``mmap_mode`` of the layers: ``"r+"`` writes changes
+            back to the files, ``"c"`` keeps them private to this object
+            (e.g. a branch restored from a snapshot), ``"r"`` is read-only.
+        """
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.shape = tuple(meta["shape"])
+        self.cell_size = meta["cell_size"]
+        # Coordinates of the top-left corner; rows run south (decreasing y).
+        self.origin = tuple(meta["origin"])
+        self.tile_size = meta["tile_size"]
+        self.zoning_classes = tuple(meta["zoning_classes"])
+        self.layers = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in LAYERS
+        }
+        self.n_tiles = tuple(-(-n // self.tile_size) for n in self.shape)
+        self.n_nodes = meta.get("n_nodes", 0)
+        self._zonal = {}
+        self._node_tiles = None
+
+    @classmethod
+    def create(cls, path, shape, cell_size, origin=(0.0, 0.0), tile_size=512, zoning_classes=ZONING_CLASSES):
+        """
+        Create an empty raster on disk, filled with the ``LAYERS`` defaults.
+
+        :param shape: (rows, cols) in cells.
+        :param cell_size: Cell side in metres.
+        :param origin: (x, y) of the top-left corner.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name, (dtype, fill) in LAYERS.items():
+            layer = np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode="w+", dtype=dtype,
+                                              shape=tuple(shape))
+            for start in range(0, shape[0], tile_size):
+                layer[start:start + tile_size] = fill
+            layer.flush()
+            del layer
+        meta = {"shape": list(shape), "cell_size": cell_size, "origin": list(origin), "tile_size": tile_size,
+                "zoning_classes": list(zoning_classes)}
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        return cls(path)
+
+    def _save_meta(self, path=None):
+        meta = {"shape": list(self.shape), "cell_size": self.cell_size, "origin": list(self.origin),
+                "tile_size": self.tile_size, "zoning_classes": list(self.zoning_classes), "n_nodes": self.n_nodes}
+        with open(os.path.join(path or self.path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def flush(self):
+        """Write pending changes to disk."""
+        for layer in self.layers.values():
+            layer.flush()
+
+    def save(self, path):
+        """
+        Copy the raster as it is now (including changes not flushed, or kept
+        private with ``mode="c"``) to a new raster directory ``path``, one
+        band of tiles at a time.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name, (dtype, _) in LAYERS.items():
+            copy = np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode="w+", dtype=dtype,
+                                             shape=self.shape)
+            for start in range(0, self.shape[0], self.tile_size):
+                copy[start:start + self.tile_size] = self.layers[name][start:start + self.tile_size]
+            copy.flush()
+            del copy
+        self._save_meta(path)
+
+    # ------------------------------------------------------------------
+    # Tiles
+    # ------------------------------------------------------------------
+    @property
+    def cell_area(self):
+        """Cell area in km²."""
+        return (self.cell_size / 1000.0) ** 2
+
+    def tiles(self):
+        return [(i, j) for i in range(self.n_tiles[0]) for j in range(self.n_tiles[1])]
+
+    def tile_window(self, tile):
+        """Row and column slices of ``tile``."""
+        i, j = tile
+        t = self.tile_size
+        return slice(i * t, min((i + 1) * t, self.shape[0])), slice(j * t, min((j + 1) * t, self.shape[1]))
+
+    def read(self, layer, tile):
+        """In-memory copy of one tile of ``layer``."""
+        return np.array(self.layers[layer][self.tile_window(tile)])
+
+    def write(self, layer, rows, cols, values):
+        """Write ``values`` into the window ``[rows, cols]`` (slices) of ``layer``."""
+        self.layers[layer][rows, cols] = values
+        t = self.tile_size
+        touched = {
+            (i, j)
+            for i in range(rows.start // t, -(-rows.stop // t))
+            for j in range(cols.start // t, -(-cols.stop // t))
+        }
+        for (name, _), stat in self._zonal.items():
+            if name == layer or layer == "node":
+                stat["dirty"].update(touched)
+        if layer == "node":
+            self._node_tiles = None
+
+    def cell_centres(self, tile):
+        """x and y coordinates of the cell centres of ``tile``."""
+        rows, cols = self.tile_window(tile)
+        x = self.origin[0] + (np.arange(cols.start, cols.stop) + 0.5) * self.cell_size
+        y = self.origin[1] - (np.arange(rows.start, rows.stop) + 0.5) * self.cell_size
+        return np.meshgrid(x, y)
+
+    # ------------------------------------------------------------------
+    # Zonal aggregation
+    # ------------------------------------------------------------------
+    def assign_nodes(self, coordinates, max_distance=None):
+        """
+        Assign every cell to its nearest network node (a Voronoi partition).
+
+        :param coordinates: (n_nodes, 2) node x / y, e.g. ``node_coordinates(G)``.
+        :param max_distance: Cells farther than this from every node (metres)
+            get no node.
+        """
+        tree = cKDTree(coordinates)
+        self.n_nodes = coordinates.shape[0]
+        self._zonal = {}
+        bound = np.inf if max_distance is None else max_distance
+        for tile in self.tiles():
+            x, y = self.cell_centres(tile)
+            distance, nearest = tree.query(np.column_stack([x.ravel(), y.ravel()]), distance_upper_bound=bound)
+            nearest = np.where(np.isfinite(distance), nearest, -1).reshape(x.shape)
+            self.write("node", *self.tile_window(tile), nearest)
+        self._save_meta()
+
+    def _tile_stat(self, layer, n_classes, tile):
+        """Nodes in ``tile`` and their sum of ``layer`` (or class counts)."""
+        nodes = self.read("node", tile).ravel()
+        valid = nodes >= 0
+        present, inverse = np.unique(nodes[valid], return_inverse=True)
+        if layer is None:
+            return present, np.bincount(inverse, minlength=present.shape[0]).astype(np.float64)
+        values = self.read(layer, tile).ravel()[valid]
+        if n_classes is None:
+            return present, np.bincount(inverse, weights=values, minlength=present.shape[0])
+        counts = np.bincount(inverse * n_classes + values, minlength=present.shape[0] * n_classes)
+        return present, counts.reshape(present.shape[0], n_classes).astype(np.float64)
+
+    def zonal(self, layer, n_classes=None):
+        """
+        Per-node aggregate of ``layer``: the sum over each node's cells, or
+        with ``n_classes`` an (n_nodes, n_classes) count of cells per class.
+        ``layer=None`` counts cells. Only tiles written since the last call
+        are recomputed.
+        """
+        key = (layer, n_classes)
+        if key not in self._zonal:
+            width = () if n_classes is None else (n_classes,)
+            self._zonal[key] = {"total": np.zeros((self.n_nodes,) + width), "tiles": {}, "dirty": set(self.tiles())}
+        stat = self._zonal[key]
+        for tile in stat["dirty"]:
+            if tile in stat["tiles"]:
+                nodes, values = stat["tiles"][tile]
+                stat["total"][nodes] -= values
+            nodes, values = self._tile_stat(layer, n_classes, tile)
+            stat["total"][nodes] += values
+            stat["tiles"][tile] = (nodes, values)
+        stat["dirty"] = set()
+        return stat["total"]
+
+    def zonal_by_zone(self, layer, node_zone, n_zones, n_classes=None):
+        """``zonal`` aggregated further to zones of nodes, e.g. ``model.node_municipality``."""
+        per_node = self.zonal(layer, n_classes)
+        if n_classes is None:
+            return np.bincount(node_zone, weights=per_node, minlength=n_zones)
+        return np.stack([np.bincount(node_zone, weights=per_node[:, c], minlength=n_zones)
+                         for c in range(n_classes)], axis=1)
+
+    def land_availability(self):
+        """Mean developable fraction of each node's cells (NaN for nodes without cells)."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.zonal("developable") / self.zonal(None)
+
+    def developable_area(self):
+        """Developable land in km² over the whole raster."""
+        return float(self.zonal("developable").sum() * self.cell_area)
+
+    # ------------------------------------------------------------------
+    # Land accounting
+    # ------------------------------------------------------------------
+    def node_tiles(self, node):
+        """Tiles containing cells of ``node``."""
+        if self._node_tiles is None:
+            self.zonal(None)
+            index = {}
+            for tile, (nodes, _) in self._zonal[(None, None)]["tiles"].items():
+                for n in nodes.tolist():
+                    index.setdefault(n, []).append(tile)
+            self._node_tiles = index
+        return self._node_tiles.get(node, [])
+
+    def develop(self, nodes, dwellings, land_per_dwelling):
+        """
+        Build ``dwellings[i]`` new dwellings on the cells of ``nodes[i]``.
+
+        Each dwelling uses ``land_per_dwelling`` km² of developable land,
+        taken from the node's cells in proportion to what they have left; the
+        dwellings go to the same cells. Only the tiles holding those nodes
+        are read and written.
+
+        :return: Developable area actually used per entry (km²), less than
+            requested where the node runs out of land.
+        """
+        used = np.zeros(len(nodes))
+        for k, (node, count) in enumerate(zip(np.asarray(nodes).tolist(), np.asarray(dwellings).tolist())):
+            tiles = self.node_tiles(node)
+            windows = [self.tile_window(tile) for tile in tiles]
+            masks = [self.layers["node"][w] == node for w in windows]
+            free = [self.layers["developable"][w][m].astype(np.float64) for w, m in zip(windows, masks)]
+            capacity = sum(f.sum() for f in free) * self.cell_area
+            if capacity <= 0 or count <= 0:
+                continue
+            share = min(count * land_per_dwelling / capacity, 1.0)
+            used[k] = share * capacity
+            total_free = capacity / self.cell_area
+            for window, mask, f in zip(windows, masks, free):
+                developable = np.array(self.layers["developable"][window])
+                density = np.array(self.layers["density"][window])
+                developable[mask] = f * (1.0 - share)
+                density[mask] += count * f / total_free
+                self.write("developable", *window, developable)
+                self.write("density", *window, density)
+        return used
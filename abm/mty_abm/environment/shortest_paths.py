@@ -0,0 +1,143 @@
+import heapq
+import numpy as np
+
+
+def _position(matrix, u, v):
+    """Index of entry (u, v) in ``matrix.data`` (CSR)."""
+    start, stop = matrix.indptr[u], matrix.indptr[u + 1]
+    k = start + np.flatnonzero(matrix.indices[start:stop] == v)
+    if k.size == 0:
+        raise KeyError(f"No edge {u} -> {v}")
+    return k[0]
+
+
+class DynamicShortestPaths:
+    """
+    Travel time from every node to its nearest source, kept up to date under
+    edge-weight changes.
+
+    Holds the shortest-path tree toward the sources as ``next_hop`` (the
+    neighbour each node's best path goes through, -1 at sources and
+    unreachable nodes). When weights change, only the affected part is
+    repaired, in the manner of Ramalingam and Reps: a decreased edge
+    relaxes its tail and propagates; an increased tree edge invalidates the
+    subtree that routed through it, which is re-seeded from its unaffected
+    neighbours. Both then run one Dijkstra limited to the nodes whose
+    distance actually changes.
+
+    ``dist``, ``nearest`` and ``next_hop`` are updated in place, so views
+    held elsewhere (e.g. ``TravelTimeIndex.to_cbd``) stay current. Several
+    trees can share one network: change the weights once with
+    ``set_weights`` and call ``repair`` on each tree.
+    """
+
+    def __init__(self, adjacency, reverse, dist, nearest, next_hop):
+        """
+        :param adjacency: CSR matrix, ``adjacency[u, v]`` the travel time of edge u -> v.
+        :param reverse: Its transpose, as CSR.
+        :param dist, nearest, next_hop: Initial solution, e.g. from
+            ``scipy.sparse.csgraph.dijkstra`` on ``reverse`` with
+            ``min_only=True`` (its predecessors are the next hops).
+        """
+        self.adjacency = adjacency
+        self.reverse = reverse
+        self.dist = dist
+        self.nearest = nearest
+        self.next_hop = next_hop
+
+    @staticmethod
+    def set_weights(adjacency, reverse, tails, heads, weights):
+        """
+        Write new travel times for edges ``tails[i] -> heads[i]`` into both
+        matrices.
+
+        :return: The previous weights.
+        """
+        old = np.empty(len(tails))
+        for i, (u, v, w) in enumerate(zip(np.asarray(tails).tolist(), np.asarray(heads).tolist(),
+                                          np.asarray(weights, dtype=np.float64).tolist())):
+            k = _position(adjacency, u, v)
+            old[i] = adjacency.data[k]
+            # csgraph treats explicit zeros as missing edges.
+            adjacency.data[k] = max(w, 1e-9)
+            reverse.data[_position(reverse, v, u)] = max(w, 1e-9)
+        return old
+
+    def _subtree(self, root):
+        """Nodes whose best path passes through ``root`` (including it)."""
+        nodes, stack = [root], [root]
+        rev = self.reverse
+        while stack:
+            x = stack.pop()
+            preds = rev.indices[rev.indptr[x]:rev.indptr[x + 1]]
+            for p in preds[self.next_hop[preds] == x].tolist():
+                nodes.append(p)
+                stack.append(p)
+        return nodes
+
+    def repair(self, tails, heads, old_weights):
+        """
+        Repair the distances after edges ``tails[i] -> heads[i]`` changed
+        from ``old_weights[i]`` to their current weight (see ``set_weights``).
+
+        :return: Array of nodes whose distance changed.
+        """
+        adj, rev = self.adjacency, self.reverse
+        dist, nearest, next_hop = self.dist, self.nearest, self.next_hop
+        old_dist = {}
+        heap = []
+
+        # 1) Sort the changes: slower tree edges and faster edges.
+        raised = []
+        lowered = []
+        for u, v, old in zip(np.asarray(tails).tolist(), np.asarray(heads).tolist(), np.asarray(old_weights).tolist()):
+            w = adj.data[_position(adj, u, v)]
+            if w > old and next_hop[u] == v:
+                raised.append(u)
+            elif w < old:
+                lowered.append((u, v, w))
+
+        # 2) Invalidate the subtrees hanging from slower tree edges.
+        affected = set()
+        for u in raised:
+            if u not in affected:
+                affected.update(self._subtree(u))
+        for x in affected:
+            old_dist[x] = dist[x]
+            dist[x] = np.inf
+            next_hop[x] = -1
+            nearest[x] = -1
+
+        # 3) Seed each invalidated node from its best unaffected neighbour.
+        for x in affected:
+            succ = adj.indices[adj.indptr[x]:adj.indptr[x + 1]]
+            cand = adj.data[adj.indptr[x]:adj.indptr[x + 1]] + dist[succ]
+            if cand.size:
+                j = int(np.argmin(cand))
+                if np.isfinite(cand[j]):
+                    dist[x], next_hop[x], nearest[x] = cand[j], succ[j], nearest[succ[j]]
+                    heapq.heappush(heap, (dist[x], x))
+
+        # 4) Relax the faster edges.
+        for u, v, w in lowered:
+            d = w + dist[v]
+            if d < dist[u]:
+                old_dist.setdefault(u, dist[u])
+                dist[u], next_hop[u], nearest[u] = d, v, nearest[v]
+                heapq.heappush(heap, (d, u))
+
+        # 5) Dijkstra from the changed nodes, toward their predecessors.
+        while heap:
+            d, x = heapq.heappop(heap)
+            if d > dist[x]:
+                continue
+            start, stop = rev.indptr[x], rev.indptr[x + 1]
+            preds = rev.indices[start:stop]
+            cand = rev.data[start:stop] + d
+            better = cand < dist[preds]
+            for p, dp in zip(preds[better].tolist(), cand[better].tolist()):
+                old_dist.setdefault(p, dist[p])
+                dist[p], next_hop[p], nearest[p] = dp, x, nearest[x]
+                heapq.heappush(heap, (dp, p))
+
+        return np.array(sorted(x for x, d in old_dist.items() if d != dist[x]), dtype=np.int64)
@@ -0,0 +1,204 @@
+import functools
+import hashlib
+import os
+import networkx as nx
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+from environment.shortest_paths import DynamicShortestPaths
+
+# Speed used when an edge has a length but no travel time or speed.
+DEFAULT_SPEED_KPH = 30.0
+
+
+def _edge_travel_time(data, default_speed_kph):
+    """Edge travel time in minutes from ``travel_time`` (s), or ``length`` (m) and speed."""
+    if data.get("travel_time") not in (None, ""):
+        return float(data["travel_time"]) / 60.0
+    if data.get("length") not in (None, ""):
+        speed = data.get("speed_kph") or default_speed_kph
+        return float(data["length"]) / 1000.0 / float(speed) * 60.0
+    return 1.0
+
+
+def _simple_graph(G, default_speed_kph):
+    """Collapse parallel edges to the fastest one and store ``travel_time`` in minutes."""
+    H = nx.DiGraph() if G.is_directed() else nx.Graph()
+    H.add_nodes_from(G.nodes(data=True))
+    for u, v, data in G.edges(data=True):
+        minutes = _edge_travel_time(data, default_speed_kph)
+        if not H.has_edge(u, v) or minutes < H[u][v]["travel_time"]:
+            H.add_edge(u, v, travel_time=minutes)
+    return H
+
+
+def load_street_network(path, default_speed_kph=DEFAULT_SPEED_KPH):
+    """
+    Load a street or zone network from a local file.
+
+    Supports GraphML (``.graphml``, e.g. an OSMnx export) and GeoPackage
+    (``.gpkg`` with ``nodes`` and ``edges`` layers; needs geopandas). Edges
+    get a ``travel_time`` in minutes taken from ``travel_time`` (seconds) or
+    computed from ``length`` (metres) and ``speed_kph``.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".graphml":
+        G = nx.read_graphml(path)
+    elif extension == ".gpkg":
+        try:
+            import geopandas as gpd
+        except ImportError as exc:
+            raise ImportError("Reading GeoPackage networks requires geopandas") from exc
+        edges = gpd.read_file(path, layer="edges")
+        nodes = gpd.read_file(path, layer="nodes")
+        G = nx.MultiDiGraph()
+        node_id = "osmid" if "osmid" in nodes.columns else nodes.columns[0]
+        for row in nodes.drop(columns="geometry").to_dict("records"):
+            G.add_node(row[node_id], **row)
+        for row in edges.drop(columns="geometry").to_dict("records"):
+            G.add_edge(row["u"], row["v"], **row)
+    else:
+        raise ValueError(f"Unsupported network file '{path}', expected .graphml or .gpkg")
+    return _simple_graph(G, default_speed_kph)
+
+
+@functools.lru_cache(maxsize=None)
+def _grid_network(width, height):
+    G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(width, height))
+    nx.set_edge_attributes(G, 1.0, "travel_time")
+    return G
+
+
+def grid_network(width=5, height=5):
+    """Toy ``width`` x ``height`` grid with unit travel times (built once, copied per call)."""
+    return _grid_network(width, height).copy()
+
+
+class TravelTimeIndex:
+    """
+    Precomputed travel times from every node to the CBD, services and jobs.
+
+    Built with multi-source Dijkstra over the network's ``travel_time``
+    edge weights, so household location choice and accessibility metrics
+    are array lookups (``index.to_cbd[nodes]``) instead of shortest-path
+    runs. Results can be cached on disk as ``.npz`` files keyed by a hash
+    of the network and the source nodes.
+
+    ``update_edge_weights`` changes travel times on a few edges and repairs
+    the CBD and service distances incrementally (``DynamicShortestPaths``)
+    instead of rerunning Dijkstra over the whole network.
+    """
+
+    def __init__(self, G, cbd_nodes, service_nodes=(), job_centres=(), k_jobs=3, cache_dir=None):
+        self.n_nodes = G.number_of_nodes()
+        self.cbd_nodes = np.asarray(sorted(cbd_nodes), dtype=np.int64)
+        self.service_nodes = np.asarray(sorted(service_nodes), dtype=np.int64)
+        self.job_centres = np.asarray(sorted(job_centres), dtype=np.int64)
+        self.k_jobs = min(k_jobs, len(self.job_centres))
+        self.directed = G.is_directed()
+        self.adjacency = self._adjacency(G)
+
+        cache_path = None
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            cache_path = os.path.join(cache_dir, f"travel_times_{self.cache_key()}.npz")
+        if cache_path is not None and os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                arrays = dict(cached)
+        else:
+            arrays = self._compute()
+            if cache_path is not None:
+                np.savez(cache_path, **arrays)
+        for name, values in arrays.items():
+            setattr(self, name, values)
+
+        self.reverse = self.adjacency.T.tocsr()
+        self.cbd_paths = DynamicShortestPaths(
+            self.adjacency, self.reverse, self.to_cbd, self.nearest_cbd, self.cbd_next_hop
+        )
+        self.service_paths = DynamicShortestPaths(
+            self.adjacency, self.reverse, self.to_services, self.nearest_service, self.service_next_hop
+        )
+
+    def _adjacency(self, G):
+        u, v, w = [], [], []
+        for a, b, data in G.edges(data=True):
+            u.append(a)
+            v.append(b)
+            # csgraph treats explicit zeros as missing edges.
+            w.append(max(data.get("travel_time", 1.0), 1e-9))
+        adjacency = sparse.csr_matrix((w, (u, v)), shape=(self.n_nodes, self.n_nodes))
+        if not G.is_directed():
+            adjacency = adjacency.maximum(adjacency.T).tocsr()
+        return adjacency
+
+    def cache_key(self):
+        h = hashlib.sha1(b"next_hop")
+        for values in (self.adjacency.indptr, self.adjacency.indices, self.adjacency.data,
+                       self.cbd_nodes, self.service_nodes, self.job_centres, np.array([self.k_jobs])):
+            h.update(np.ascontiguousarray(values).tobytes())
+            h.update(b"|")
+        return h.hexdigest()[:16]
+
+    def _from_sources(self, sources):
+        """
+        Travel time from each node to its nearest source, which source that
+        is, and the next node on the way (-1 at sources and unreachable nodes).
+        """
+        if len(sources) == 0:
+            missing = np.full(self.n_nodes, -1, dtype=np.int64)
+            return np.full(self.n_nodes, np.inf), missing, missing.copy()
+        # Shortest paths *to* the sources are paths from them on the reversed
+        # graph, whose predecessors are the next hops toward the source.
+        dist, next_hop, nearest = csgraph.dijkstra(
+            self.adjacency.T, indices=sources, min_only=True, return_predecessors=True
+        )
+        return dist, np.maximum(nearest, -1).astype(np.int64), np.maximum(next_hop, -1).astype(np.int64)
+
+    def _compute(self):
+        arrays = {}
+        arrays["to_cbd"], arrays["nearest_cbd"], arrays["cbd_next_hop"] = self._from_sources(self.cbd_nodes)
+        arrays["to_services"], arrays["nearest_service"], arrays["service_next_hop"] = (
+            self._from_sources(self.service_nodes)
+        )
+        arrays.update(self._job_times())
+        return arrays
+
+    def _job_times(self):
+        arrays = {}
+        if self.k_jobs > 0:
+            # (n_centres, n_nodes) matrix, then the k smallest per node.
+            dist = csgraph.dijkstra(self.adjacency.T, indices=self.job_centres)
+            nearest = np.argpartition(dist, self.k_jobs - 1, axis=0)[:self.k_jobs]
+            times = np.take_along_axis(dist, nearest, axis=0)
+            order = np.argsort(times, axis=0)
+            arrays["nearest_jobs"] = self.job_centres[np.take_along_axis(nearest, order, axis=0)].T
+            arrays["nearest_job_times"] = np.take_along_axis(times, order, axis=0).T
+        else:
+            arrays["nearest_jobs"] = np.empty((self.n_nodes, 0), dtype=np.int64)
+            arrays["nearest_job_times"] = np.empty((self.n_nodes, 0))
+        return arrays
+
+    def update_edge_weights(self, tails, heads, weights):
+        """
+        Set the travel time (minutes) of edges ``tails[i] -> heads[i]`` and
+        update the travel-time arrays in place. Undirected networks update
+        both directions. CBD and service distances are repaired
+        incrementally; job-centre times, if any, are recomputed.
+
+        :return: Nodes whose CBD or service travel time changed.
+        """
+        tails = np.asarray(tails, dtype=np.int64)
+        heads = np.asarray(heads, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        if not self.directed:
+            tails, heads = np.concatenate([tails, heads]), np.concatenate([heads, tails])
+            weights = np.concatenate([weights, weights])
+        old = DynamicShortestPaths.set_weights(self.adjacency, self.reverse, tails, heads, weights)
+        changed = np.union1d(
+            self.cbd_paths.repair(tails, heads, old), self.service_paths.repair(tails, heads, old)
+        )
+        if self.k_jobs > 0:
+            for name, values in self._job_times().items():
+                getattr(self, name)[:] = values
+        return changed
@@ -0,0 +1,52 @@
+import heapq
+from collections import namedtuple
+
+# Project lifecycle event kinds.
+PROPOSAL = "proposal"                # landlord reviews its portfolio and may propose a project
+PERMIT_DECISION = "permit_decision"  # municipality decides on a proposed project
+COMPLETION = "completion"            # approved project delivers its dwellings
+
+Event = namedtuple("Event", ["time", "seq", "kind", "landlord", "project"])
+
+
+class EventQueue:
+    """
+    Global priority queue of project lifecycle events, keyed on due time.
+
+    Events due at the same time come out in the order they were scheduled,
+    so runs are deterministic. Only agents named in due events are woken;
+    projects waiting on a future event cost nothing per step.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._next_seq = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, time, kind, landlord, project=None):
+        event = Event(time, self._next_seq, kind, landlord, project)
+        self._next_seq += 1
+        heapq.heappush(self._heap, event)
+        return event
+
+    def next_time(self):
+        """Due time of the earliest event, or None if the queue is empty."""
+        return self._heap[0].time if self._heap else None
+
+    def pop_due(self, now):
+        """Remove and return all events due at or before ``now``, earliest first."""
+        due = []
+        while self._heap and self._heap[0].time <= now:
+            due.append(heapq.heappop(self._heap))
+        return due
+
+    def state(self):
+        """Pending events (in heap order) and the next sequence number, for snapshots."""
+        return list(self._heap), self._next_seq
+
+    def restore(self, events, next_seq):
+        """Replace the queue with ``events`` (in heap order, as from ``state``)."""
+        self._heap = list(events)
+        self._next_seq = next_seq
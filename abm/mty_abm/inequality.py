@@ -0,0 +1,301 @@
+import numpy as np
+from scipy.special import xlogy
+from agents.household_store import NO_NODE
+
+# Households spending more than this share of income on housing count as
+# cost burdened.
+BURDEN_THRESHOLD = 0.3
+
+
+# ----------------------------------------------------------------------
+# Vectorized metrics
+# ----------------------------------------------------------------------
+def _gini_sorted(x):
+    """Gini coefficient of an ascending array with a positive sum."""
+    n = x.shape[0]
+    total = x.sum()
+    if n == 0 or total <= 0:
+        return np.nan
+    # G = 2 * sum(i * x_(i)) / (n * sum(x)) - (n + 1) / n, with ranks i from 1.
+    return 2.0 * np.dot(np.arange(1, n + 1, dtype=np.float64), x) / (n * total) - (n + 1) / n
+
+
+def gini(values):
+    """Gini coefficient of ``values`` (one sort, no Python loop)."""
+    return _gini_sorted(np.sort(np.asarray(values, dtype=np.float64)))
+
+
+def theil(values):
+    """Theil T index of ``values`` (non-negative, zeros contribute nothing)."""
+    x = np.asarray(values, dtype=np.float64)
+    mean = x.mean() if x.size else 0.0
+    if mean <= 0:
+        return np.nan
+    return float(xlogy(x, x / mean).sum() / x.sum())
+
+
+def grouped_gini(values, groups, n_groups):
+    """
+    Gini coefficient of ``values`` within each group.
+
+    Sorting by value, then stably by group, lays every group out as a
+    contiguous ascending run, so the rank-weighted sums of all groups are
+    ``bincount`` calls.
+
+    :param groups: Group of each value, in ``[0, n_groups)``.
+    :return: (n_groups,) array, NaN for empty groups or groups summing to 0.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    groups = np.asarray(groups, dtype=np.int64)
+    # Two argsorts are about twice as fast as np.lexsort on large inputs.
+    order = np.argsort(values)
+    order = order[np.argsort(groups[order], kind="stable")]
+    x, g = values[order], groups[order]
+    count = np.bincount(g, minlength=n_groups).astype(np.float64)
+    total = np.bincount(g, weights=x, minlength=n_groups)
+    start = np.concatenate([[0], np.cumsum(count)[:-1]])
+    rank = np.arange(1, x.shape[0] + 1) - start[g]
+    weighted = np.bincount(g, weights=rank * x, minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = 2.0 * weighted / (count * total) - (count + 1) / count
+    result[(count == 0) | (total <= 0)] = np.nan
+    return result
+
+
+def grouped_theil(values, groups, n_groups):
+    """Theil T index of ``values`` within each group (NaN for empty groups)."""
+    values = np.asarray(values, dtype=np.float64)
+    count = np.bincount(groups, minlength=n_groups)
+    total = np.bincount(groups, weights=values, minlength=n_groups)
+    xlogx = np.bincount(groups, weights=xlogy(values, values), minlength=n_groups)
+    return _theil_from_sums(count, total, xlogx)
+
+
+def _theil_from_sums(count, total, xlogx):
+    """
+    Theil T from count, sum(x) and sum(x log x):
+    T = sum(x log x) / sum(x) - log(mean).
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = xlogx / total - np.log(total / count)
+    return np.where((count > 0) & (total > 0), result, np.nan)
+
+
+def rent_burden(model):
+    """
+    Housing cost over income of every housed household.
+
+    :return: ``(households, nodes, burden)`` arrays.
+    """
+    nodes = model.households.view("node")
+    households = np.flatnonzero(nodes != NO_NODE)
+    nodes = nodes[households]
+    burden = model.grid.housing_cost[nodes] / model.households.view("income")[households]
+    return households, nodes, burden
+
+
+def mean_burden(model):
+    """Mean rent burden of housed households (NaN if nobody is housed)."""
+    burden = rent_burden(model)[2]
+    return float(burden.mean()) if burden.size else np.nan
+
+
+def burdened_share(model, threshold=BURDEN_THRESHOLD):
+    """Share of housed households whose rent burden exceeds ``threshold``."""
+    burden = rent_burden(model)[2]
+    return float(np.mean(burden > threshold)) if burden.size else np.nan
+
+
+def burden_by_node(model, threshold=BURDEN_THRESHOLD):
+    """
+    Rent-burden distribution per node.
+
+    :return: ``(mean, share)``: mean burden of each node's households and
+        the share of them above ``threshold`` (NaN where nobody lives).
+    """
+    n_nodes = model.grid.n_nodes
+    _, nodes, burden = rent_burden(model)
+    count = np.bincount(nodes, minlength=n_nodes)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.bincount(nodes, weights=burden, minlength=n_nodes) / count
+        share = np.bincount(nodes, weights=burden > threshold, minlength=n_nodes) / count
+    return mean, share
+
+
+# ----------------------------------------------------------------------
+# Incremental tracking
+# ----------------------------------------------------------------------
+class InequalityTracker:
+    """
+    Income inequality and rent burden of a ``MonterreyModel``, updated
+    incrementally.
+
+    ``update`` only processes households whose income or node changed since
+    the last update (and households added since then):
+
+    - citywide incomes are kept sorted; changed incomes are removed and
+      reinserted with ``searchsorted``, so the Gini is one dot product
+      instead of a sort;
+    - per-node count, sum(income), sum(income log income) and
+      sum(1 / income) of housed households are adjusted with the old and
+      new values of the changed households only. They give the per-node and
+      citywide Theil index (and its within/between-node decomposition) and
+      the mean rent burden for the current prices;
+    - per-node Ginis are recomputed only for nodes that gained or lost
+      households.
+
+    The share of cost-burdened households depends on every household's
+    income against its node's price, and prices move every step, so it is
+    one vectorized pass (``burden_by_node``) when asked for. The running
+    sums accumulate rounding error over very many updates; ``reset``
+    rebuilds everything from the household store.
+    """
+
+    def __init__(self, model, threshold=BURDEN_THRESHOLD):
+        self.model = model
+        self.threshold = threshold
+        self.n_nodes = model.grid.n_nodes
+        self.reset()
+
+    def reset(self):
+        """Rebuild all statistics from the household store."""
+        store = self.model.households
+        self._income = store.view("income").copy()
+        self._node = store.view("node").copy()
+        self.sorted_income = np.sort(self._income)
+        self.city_total = self._income.sum()
+        self.city_xlogx = xlogy(self._income, self._income).sum()
+
+        self.count = np.zeros(self.n_nodes, dtype=np.int64)
+        self.income_sum = np.zeros(self.n_nodes)
+        self.xlogx_sum = np.zeros(self.n_nodes)
+        self.inverse_income_sum = np.zeros(self.n_nodes)
+        self._accumulate(self._node, self._income, 1)
+
+        housed = self._node != NO_NODE
+        self._node_gini = grouped_gini(self._income[housed], self._node[housed], self.n_nodes)
+        self._dirty = np.zeros(self.n_nodes, dtype=bool)
+
+    def _accumulate(self, nodes, income, sign):
+        housed = nodes != NO_NODE
+        nodes, income = nodes[housed], income[housed]
+        n = self.n_nodes
+        self.count += sign * np.bincount(nodes, minlength=n)
+        self.income_sum += sign * np.bincount(nodes, weights=income, minlength=n)
+        self.xlogx_sum += sign * np.bincount(nodes, weights=xlogy(income, income), minlength=n)
+        self.inverse_income_sum += sign * np.bincount(nodes, weights=1.0 / income, minlength=n)
+
+    def _replace_sorted(self, old, new):
+        """Swap ``old`` income values for ``new`` ones in ``sorted_income``."""
+        x = self.sorted_income
+        if old.size:
+            old = np.sort(old)
+            # Equal values go to consecutive positions.
+            repeat = np.arange(old.shape[0]) - np.searchsorted(old, old, side="left")
+            x = np.delete(x, np.searchsorted(x, old, side="left") + repeat)
+        if new.size:
+            new = np.sort(new)
+            x = np.insert(x, np.searchsorted(x, new), new)
+        self.sorted_income = x
+
+    def update(self, idx=None):
+        """
+        Bring the statistics up to date with the household store.
+
+        :param idx: Households known to have changed (repeats are fine). If
+            None, changes are found by comparing income and node with the
+            last update (two array comparisons).
+        :return: Indices of the existing households that were updated.
+        """
+        store = self.model.households
+        income, nodes = store.view("income"), store.view("node")
+        m = self._income.shape[0]
+        if idx is None:
+            idx = np.flatnonzero((income[:m] != self._income) | (nodes[:m] != self._node))
+        else:
+            # Repeated indices would retire the same old values twice.
+            idx = np.unique(np.asarray(idx, dtype=np.int64))
+            idx = idx[idx < m]
+
+        # 1) Retire the old values of changed households.
+        old_income, old_nodes = self._income[idx], self._node[idx]
+        self._accumulate(old_nodes, old_income, -1)
+        income_changed = old_income != income[idx]
+
+        # 2) Add households created since the last update.
+        added = np.arange(m, income.shape[0])
+        if added.size:
+            self._income = np.concatenate([self._income, income[added]])
+            self._node = np.concatenate([self._node, nodes[added]])
+        new_idx = np.concatenate([idx, added])
+        new_income, new_nodes = income[new_idx], nodes[new_idx]
+
+        # 3) Enter the current values.
+        self._accumulate(new_nodes, new_income, 1)
+        self._replace_sorted(old_income[income_changed],
+                             np.concatenate([income[idx][income_changed], income[added]]))
+        self.city_total += new_income.sum() - old_income.sum()
+        self.city_xlogx += xlogy(new_income, new_income).sum() - xlogy(old_income, old_income).sum()
+        self._dirty[old_nodes[old_nodes != NO_NODE]] = True
+        self._dirty[new_nodes[new_nodes != NO_NODE]] = True
+        self._income[new_idx] = new_income
+        self._node[new_idx] = new_nodes
+        return idx
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    @property
+    def gini(self):
+        """Citywide income Gini (all households)."""
+        return _gini_sorted(self.sorted_income)
+
+    @property
+    def theil(self):
+        """Citywide income Theil T index (all households)."""
+        return float(_theil_from_sums(self._income.shape[0], self.city_total, self.city_xlogx))
+
+    @property
+    def node_gini(self):
+        """Income Gini of the housed households of each node."""
+        if self._dirty.any():
+            dirty = self._dirty
+            members = np.flatnonzero((self._node != NO_NODE) & dirty[np.maximum(self._node, 0)])
+            gini_values = grouped_gini(self._income[members], self._node[members], self.n_nodes)
+            self._node_gini[dirty] = gini_values[dirty]
+            dirty[:] = False
+        return self._node_gini
+
+    @property
+    def node_theil(self):
+        """Income Theil T index of the housed households of each node."""
+        return _theil_from_sums(self.count, self.income_sum, self.xlogx_sum)
+
+    def theil_decomposition(self):
+        """
+        Split the Theil index of housed households into its within-node and
+        between-node parts.
+
+        :return: ``(within, between)``; their sum is the Theil index of the
+            housed population.
+        """
+        occupied = self.count > 0
+        total = self.income_sum[occupied].sum()
+        share = self.income_sum[occupied] / total
+        mean = total / self.count[occupied].sum()
+        within = float(np.dot(share, self.node_theil[occupied]))
+        between = float(np.dot(share, np.log(self.income_sum[occupied] / self.count[occupied] / mean)))
+        return within, between
+
+    def node_mean_burden(self):
+        """Mean rent burden of each node at current prices: price * mean(1 / income)."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.model.grid.housing_cost * self.inverse_income_sum / self.count
+
+    def mean_burden(self):
+        """Mean rent burden of housed households at current prices."""
+        return float(np.dot(self.model.grid.housing_cost, self.inverse_income_sum) / self.count.sum())
+
+    def burdened_share(self):
+        """Share of housed households whose burden exceeds ``threshold``."""
+        return burdened_share(self.model, self.threshold)
@@ -0,0 +1,160 @@
+from collections import namedtuple
+import numpy as np
+
+# Result of one clearing round: ``households`` matched to ``nodes`` (same
+# length), the new per-node ``prices`` and the ``demand`` (distinct
+# proposers) and ``supply`` (vacant units offered) that set them.
+ClearingResult = namedtuple("ClearingResult", ["households", "nodes", "prices", "demand", "supply"])
+
+
+class HousingMarket:
+    """
+    Batch matching of searching households to vacant dwellings.
+
+    Every searching household gets a sparse candidate set: the
+    ``n_candidates`` affordable nodes with vacancies that it prefers most,
+    and that beat its current dwelling. Households then propose down their
+    lists in household-proposing deferred acceptance, all proposals of a
+    round at once; each node holds the highest-income proposers up to its
+    number of vacancies. The outcome is stable and independent of agent
+    order. Prices then move with each node's excess demand.
+
+    Utility of node ``j`` for household ``h`` is
+    ``w_acc * accessibility[j] + w_srv * services[j] + w_cost * (1 - price[j] / budget[h])``
+    with the weights taken from ``HouseholdStore.preferences``.
+    """
+
+    def __init__(self, n_candidates=8, price_adjustment_rate=0.05, max_price_change=0.2, min_price=100.0,
+                 chunk_elements=2 ** 22):
+        """
+        :param n_candidates: Length of each household's candidate list.
+        :param chunk_elements: Households are scored against the supply
+            nodes in chunks of at most this many (household, node) pairs.
+        """
+        self.n_candidates = n_candidates
+        self.price_adjustment_rate = price_adjustment_rate
+        self.max_price_change = max_price_change
+        self.min_price = min_price
+        self.chunk_elements = chunk_elements
+
+    @staticmethod
+    def utility(weights, budgets, accessibility, services, prices):
+        """Utility of the given nodes; arrays broadcast (e.g. ``(n, 1)`` households by ``(m,)`` nodes)."""
+        w = weights.astype(np.float64)
+        # Same operation order as the in-place version in ``candidates``.
+        return w[..., 0] * accessibility + w[..., 1] * services - (w[..., 2] / budgets) * prices + w[..., 2]
+
+    def candidates(self, budgets, weights, current_utility, accessibility, services, prices, supply_nodes):
+        """
+        Top ``n_candidates`` supply nodes per household, best first.
+
+        :return: ``(n_households, n_candidates)`` node ids, padded with -1.
+        """
+        n = budgets.shape[0]
+        m = min(self.n_candidates, supply_nodes.shape[0])
+        out = np.full((n, self.n_candidates), -1, dtype=np.int64)
+        if m == 0 or n == 0:
+            return out
+        acc, svc, price = accessibility[supply_nodes], services[supply_nodes], prices[supply_nodes]
+        chunk = max(1, self.chunk_elements // supply_nodes.shape[0])
+        for start in range(0, n, chunk):
+            rows = slice(start, min(start + chunk, n))
+            budget = budgets[rows, None]
+            w = weights[rows].astype(np.float64)
+            # utility() as outer products, written in place.
+            u = np.multiply.outer(w[:, 0], acc)
+            u += np.multiply.outer(w[:, 1], svc)
+            u -= np.multiply.outer(w[:, 2] / budgets[rows], price)
+            u += w[:, 2, None]
+            # Unaffordable nodes and nodes no better than home are dropped.
+            u[(price > budget) | (u <= current_utility[rows, None])] = -np.inf
+            top = np.argpartition(-u, m - 1, axis=1)[:, :m]
+            top_u = np.take_along_axis(u, top, axis=1)
+            order = np.lexsort((top, -top_u), axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_u = np.take_along_axis(top_u, order, axis=1)
+            out[rows, :m] = np.where(np.isfinite(top_u), supply_nodes[top], -1)
+        return out
+
+    @staticmethod
+    def match(candidates, priority, capacity):
+        """
+        Household-proposing deferred acceptance over candidate lists.
+
+        :param candidates: ``(n, m)`` node ids per household, -1 padded.
+        :param priority: Per-household priority at nodes (higher wins; ties
+            go to the lower household index).
+        :param capacity: Vacant units per node.
+        :return: ``(assigned, demand)``: node per household (-1 if
+            unmatched) and the number of distinct households that proposed
+            to each node.
+        """
+        n, m = candidates.shape
+        demand = np.zeros(capacity.shape[0], dtype=np.int64)
+        pointer = np.zeros(n, dtype=np.int64)
+        assigned = np.full(n, -1, dtype=np.int64)
+        households = np.arange(n)
+        # Rank of each household in node priority order, used as a sort key.
+        rank = np.empty(n, dtype=np.int64)
+        rank[np.lexsort((households, -priority))] = households
+
+        active = households[candidates[:, 0] >= 0] if m else households[:0]
+        while active.size:
+            proposed = candidates[active, pointer[active]]
+            np.add.at(demand, proposed, 1)
+            # Pool this round's proposals with the ones nodes already hold.
+            held = np.flatnonzero(assigned >= 0)
+            pool = np.concatenate([held, active])
+            nodes = np.concatenate([assigned[held], proposed])
+            order = np.lexsort((rank[pool], nodes))
+            pool, nodes = pool[order], nodes[order]
+            first = np.searchsorted(nodes, nodes, side="left")
+            accepted = (np.arange(pool.size) - first) < capacity[nodes]
+            assigned[pool] = np.where(accepted, nodes, -1)
+            rejected = pool[~accepted]
+            pointer[rejected] += 1
+            active = rejected[pointer[rejected] < m]
+            active = active[candidates[active, pointer[active]] >= 0]
+        return assigned, demand
+
+    def clearing_prices(self, prices, demand, supply, dwellings):
+        """Prices moved by excess demand (proposers minus vacancies) relative to the stock."""
+        pressure = (demand - supply) / np.maximum(dwellings, 1)
+        change = np.clip(self.price_adjustment_rate * pressure, -self.max_price_change, self.max_price_change)
+        return np.maximum(prices * (1.0 + change), self.min_price)
+
+    def candidate_lists(self, budgets, weights, current_nodes, accessibility, services, prices, vacant):
+        """``candidates`` for households given by their current node (-1 if homeless) and node arrays."""
+        current_utility = np.full(budgets.shape[0], -np.inf)
+        housed = current_nodes >= 0
+        home = current_nodes[housed]
+        current_utility[housed] = self.utility(
+            weights[housed], budgets[housed], accessibility[home], services[home], prices[home]
+        )
+        supply_nodes = np.flatnonzero(vacant > 0)
+        return self.candidates(budgets, weights, current_utility, accessibility, services, prices, supply_nodes)
+
+    def settle(self, searchers, candidates, budgets, prices, vacant, dwellings):
+        """Run the matching on precomputed candidate lists and compute clearing prices."""
+        assigned, demand = self.match(candidates, budgets, vacant)
+        moved = assigned >= 0
+        return ClearingResult(
+            households=searchers[moved],
+            nodes=assigned[moved],
+            prices=self.clearing_prices(prices, demand, vacant, dwellings),
+            demand=demand,
+            supply=vacant.copy(),
+        )
+
+    def clear(self, searchers, budgets, weights, current_nodes, accessibility, services, prices, vacant, dwellings):
+        """
+        Match ``searchers`` to vacant units and compute clearing prices.
+
+        :param searchers: Household indices taking part in the market.
+        :param budgets, weights, current_nodes: Per-searcher housing budget,
+            preference weights and current node (-1 if homeless).
+        :param accessibility, services, prices, vacant, dwellings: Per-node arrays.
+        :return: ``ClearingResult``; only households that move are listed.
+        """
+        candidates = self.candidate_lists(budgets, weights, current_nodes, accessibility, services, prices, vacant)
+        return self.settle(searchers, candidates, budgets, prices, vacant, dwellings)
@@ -0,0 +1,120 @@
+import numpy as np
+
+
+class VacancyIndex:
+    """
+    Vacant dwellings per node, bucketed by price.
+
+    Nodes with at least one vacancy sit in one of ``n_buckets`` log-spaced
+    price buckets. Queries walk the buckets from the cheapest up and stop as
+    soon as enough units are found, so their cost follows the size of the
+    answer rather than the number of nodes. Moves, new dwellings and price
+    changes only touch the nodes involved.
+    """
+
+    def __init__(self, prices, dwellings, occupied, n_buckets=64, min_price=None, max_price=None):
+        """
+        :param prices: Per-node price array. The index keeps a reference and
+            re-reads it in ``reprice``, so pass the live ``CityNetwork.housing_cost``.
+        :param dwellings: Dwellings per node.
+        :param occupied: Occupied dwellings per node (e.g. household counts).
+        """
+        self.prices = prices
+        self.vacant = np.maximum(np.asarray(dwellings, dtype=np.int64) - occupied, 0)
+        low = min_price if min_price is not None else max(float(prices.min()) / 4, 1.0)
+        high = max_price if max_price is not None else max(float(prices.max()) * 4, low * 2)
+        self.edges = np.geomspace(low, high, n_buckets + 1)
+        self.bucket_of = self._bucket(prices)
+        self.buckets = [set() for _ in range(n_buckets)]
+        for node in np.flatnonzero(self.vacant > 0).tolist():
+            self.buckets[self.bucket_of[node]].add(node)
+
+    def _bucket(self, prices):
+        return np.clip(np.searchsorted(self.edges, prices, side="right") - 1, 0, len(self.edges) - 2)
+
+    @property
+    def total_vacant(self):
+        return int(self.vacant.sum())
+
+    def _refresh(self, nodes):
+        """Re-file ``nodes`` after their vacancy count changed."""
+        for node in np.unique(nodes).tolist():
+            bucket = self.buckets[self.bucket_of[node]]
+            if self.vacant[node] > 0:
+                bucket.add(node)
+            else:
+                bucket.discard(node)
+
+    # ------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------
+    def move(self, from_nodes, to_nodes):
+        """
+        Record households leaving ``from_nodes`` and occupying ``to_nodes``.
+
+        Either side may be -1 (entering or exiting the market). Arrays are
+        processed in bulk.
+        """
+        from_nodes = np.atleast_1d(np.asarray(from_nodes, dtype=np.int64))
+        to_nodes = np.atleast_1d(np.asarray(to_nodes, dtype=np.int64))
+        released = from_nodes[from_nodes >= 0]
+        taken = to_nodes[to_nodes >= 0]
+        np.add.at(self.vacant, released, 1)
+        np.subtract.at(self.vacant, taken, 1)
+        if (self.vacant[taken] < 0).any():
+            np.subtract.at(self.vacant, released, 1)
+            np.add.at(self.vacant, taken, 1)
+            raise ValueError("Move would occupy more dwellings than a node has vacant")
+        self._refresh(np.concatenate([released, taken]))
+
+    def add_units(self, nodes, counts=1):
+        """New (vacant) dwellings at ``nodes``."""
+        nodes = np.atleast_1d(np.asarray(nodes, dtype=np.int64))
+        np.add.at(self.vacant, nodes, np.broadcast_to(counts, nodes.shape))
+        self._refresh(nodes)
+
+    def reprice(self):
+        """Re-bucket the nodes whose price crossed a bucket edge since the last call."""
+        new_bucket = self._bucket(self.prices)
+        changed = np.flatnonzero(new_bucket != self.bucket_of)
+        for node in changed[self.vacant[changed] > 0].tolist():
+            self.buckets[self.bucket_of[node]].discard(node)
+            self.buckets[new_bucket[node]].add(node)
+        self.bucket_of = new_bucket
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def query(self, budget, k=1, max_travel_time=None, travel_time=None):
+        """
+        Cheapest ``k`` vacant units priced at most ``budget``.
+
+        :param max_travel_time: Optional limit on ``travel_time[node]``
+            (e.g. ``TravelTimeIndex.to_cbd``).
+        :return: ``(nodes, prices)`` arrays of length <= ``k`` sorted by
+            price; a node appears once per vacant unit it contributes.
+        """
+        found, units = [], 0
+        last_bucket = min(int(self._bucket(np.array([budget]))[0]), len(self.buckets) - 1)
+        for b in range(last_bucket + 1):
+            bucket = self.buckets[b]
+            if not bucket:
+                continue
+            nodes = np.fromiter(bucket, dtype=np.int64, count=len(bucket))
+            keep = self.prices[nodes] <= budget
+            if max_travel_time is not None:
+                keep &= travel_time[nodes] <= max_travel_time
+            nodes = nodes[keep]
+            if nodes.size:
+                found.append(nodes)
+                units += int(self.vacant[nodes].sum())
+            # Every later bucket is pricier than everything collected so far.
+            if units >= k:
+                break
+        if not found:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        nodes = np.concatenate(found)
+        nodes = nodes[np.argsort(self.prices[nodes], kind="stable")]
+        units = np.minimum(np.cumsum(self.vacant[nodes]), k)
+        nodes = np.repeat(nodes, np.diff(units, prepend=0))
+        return nodes, self.prices[nodes]
@@ -1,37 +1,313 @@
 from agents.households import HouseholdAgent
+from agents.household_store import HOMELESS, NO_NODE, RENTING, HouseholdStore
 from agents.landlords import LandlordAgent
 from agents.municipalities import MunicipalityAgent
 from environment.city_graph import CityNetwork 
-from mesa import BaseScheduler #TODO: This is deprecated we need to use the new scheduler which is shuffle.do and .do
-import networkx as nx
+from environment.land_use import LandUseRaster, node_coordinates
+from events import COMPLETION, PERMIT_DECISION, PROPOSAL, EventQueue
+from environment.street_network import TravelTimeIndex, grid_network, load_street_network
+from market.clearing import HousingMarket
+from market.vacancy_index import VacancyIndex
+from parallel import PartitionedMarket, partition_network
+from scheduler import TypeBatchedScheduler
+import numpy as np
 import mesa
 
 
 class MonterreyModel(mesa.Model):
-    def __init__(self, num_households=10, num_landlords=2, num_municipalities=1):
-        super().__init__()
-        self.schedule = BaseScheduler(self)
-        self.network = nx.grid_2d_graph(5, 5)
-        self.pos_map = {i: i for i in range(len(self.network.nodes))}
-        mapping = dict(zip(self.network.nodes, range(len(self.network.nodes))))
-        self.network = nx.relabel_nodes(self.network, mapping)
-        self.grid = CityNetwork(self.network)
-
-        # Create agents
-        for i in range(num_households):
-            a = HouseholdAgent(i, self, income=self.random.randint(500, 3000), preferences={})
-            self.schedule.add(a)
-            self.grid.place_agent(a, self.random.choice(list(self.grid.G.nodes)))
+    # Households only consider dwellings costing at most this share of income.
+    max_cost_to_income = 0.5
+    # Share of housed households that look for a better dwelling each step
+    # (on top of the homeless and those priced out of their dwelling).
+    mobility_rate = 0.05
+    # Land each new dwelling takes from a land-use raster, in km² (the SD
+    # model's initial_land_per_house).
+    land_per_dwelling = 0.00016
 
+    def __init__(self, num_households=10, num_landlords=2, num_municipalities=1, initial_vacancy_rate=0.05,
+                 network=None, cbd_nodes=None, service_nodes=None, job_centres=None, travel_time_cache_dir=None,
+                 datacollector=None, parallel_workers=None, land_use=None, population=None, profiler=None,
+                 seed=None):
+        """
+        :param network: networkx graph or path to a GraphML / GeoPackage street
+            network; defaults to a 5x5 toy grid with its centre as the CBD.
+        :param cbd_nodes: CBD nodes (original labels); defaults to nodes with a
+            truthy ``is_cbd`` attribute in the network file.
+        :param service_nodes: Service nodes (original labels); defaults to the CBD.
+        :param job_centres: Optional job centres; the 3 nearest are indexed per node.
+        :param travel_time_cache_dir: Directory where the travel-time index is
+            cached between runs.
+        :param datacollector: Optional ``ArrayDataCollector`` called at the end
+            of every step.
+        :param parallel_workers: If > 1, build the households' housing-market
+            candidate lists in this many processes, one per network district
+            (``parallel.PartitionedMarket``). Results are identical to the
+            serial run. Call ``close`` when done to free the workers.
+        :param land_use: Optional ``LandUseRaster`` or path to one. Its cells
+            are assigned to the network nodes (which need ``x`` / ``y``
+            coordinates) unless already done, ``land_availability`` is taken
+            from it, and new dwellings use up its developable land.
+        :param population: Optional dict of household arrays, e.g. from
+            ``population.SyntheticPopulation.sample``: ``income`` and
+            optionally ``members``, ``status`` and ``node``. Replaces the
+            ``num_households`` uniform draws; with ``node``, each node gets
+            dwellings for its households plus the vacancy margin.
+        :param profiler: Optional ``profiling.StepProfiler`` that records the
+            wall time and work counters of every phase of each step.
+        :param seed: Integer or ``np.random.SeedSequence``. Passed to Mesa as
+            ``rng`` because Mesa 3.0 does not seed ``model.rng`` from ``seed``.
+        """
+        super().__init__(rng=seed)
+        # Agents are activated in bulk by type, in this order.
+        self.schedule = TypeBatchedScheduler(self, [MunicipalityAgent, LandlordAgent, HouseholdAgent])
+        self.datacollector = datacollector
+        self.profiler = profiler
+        if network is None:
+            network = grid_network(5, 5)
+            cbd_nodes = [network.number_of_nodes() // 2] if cbd_nodes is None else cbd_nodes
+        elif isinstance(network, str):
+            network = load_street_network(network)
+        if cbd_nodes is None:
+            cbd_nodes = [n for n, is_cbd in network.nodes(data="is_cbd") if is_cbd in (True, "True", "true", 1)]
+        if not cbd_nodes:
+            raise ValueError("No CBD nodes given and none marked with 'is_cbd' in the network")
+        self.grid = CityNetwork(network)
+        self.network = self.grid.G
+
+        # Optional fine-resolution land use, aggregated to the nodes.
+        if isinstance(land_use, str):
+            land_use = LandUseRaster(land_use)
+        self.land_use = land_use
+        if land_use is not None:
+            if land_use.n_nodes != self.grid.n_nodes:
+                land_use.assign_nodes(node_coordinates(self.network))
+            self.update_land_availability()
+
+        # Travel times to the CBD, services and job centres are computed once
+        # (or loaded from the cache) and then looked up by node id.
+        cbd_ids = self.grid.node_ids(cbd_nodes)
+        self.grid.is_cbd[cbd_ids] = True
+        self.travel_times = TravelTimeIndex(
+            self.network,
+            cbd_nodes=cbd_ids,
+            service_nodes=self.grid.node_ids(service_nodes) if service_nodes is not None else cbd_ids,
+            job_centres=self.grid.node_ids(job_centres) if job_centres is not None else (),
+            cache_dir=travel_time_cache_dir,
+        )
+
+        n_nodes = self.grid.n_nodes
+        if population is None:
+            population = {"income": self.rng.integers(500, 3000, size=num_households, endpoint=True)}
+        num_households = len(population["income"])
+        if "node" in population:
+            # Dwellings where the households live, plus the vacancy margin.
+            counts = np.bincount(population["node"], minlength=n_nodes)
+            self.grid.dwellings[:] = np.ceil(counts * (1 + initial_vacancy_rate)).astype(np.int64)
+            nodes = population["node"]
+        else:
+            # Spread dwellings evenly with a small vacancy margin, then place
+            # each household in a distinct dwelling.
+            total_dwellings = int(np.ceil(num_households * (1 + initial_vacancy_rate)))
+            self.grid.dwellings[:] = total_dwellings // n_nodes
+            self.grid.dwellings[:total_dwellings % n_nodes] += 1
+            slots = np.repeat(np.arange(n_nodes), self.grid.dwellings)
+            nodes = self.rng.choice(slots, size=num_households, replace=False)
+
+        # Households live in arrays; HouseholdAgent objects are built on
+        # demand with self.household(i).
+        self.households = HouseholdStore(capacity=num_households)
+        self.households.add(
+            income=population["income"],
+            node=nodes,
+            status=population.get("status", RENTING),
+            members=population.get("members", 1),
+            preferences=self.rng.dirichlet(np.ones(3), size=num_households),
+        )
+        self.households.cbd_node[:num_households] = self.travel_times.nearest_cbd[self.households.view("node")]
+
+        self.market = HousingMarket(
+            price_adjustment_rate=self.grid.price_adjustment_rate,
+            max_price_change=self.grid.max_price_change,
+            min_price=self.grid.min_housing_cost,
+        )
+        if parallel_workers is not None and parallel_workers > 1:
+            # Moves the node arrays into shared memory, so this comes before
+            # anything keeps a reference to them.
+            self.market = PartitionedMarket(self.market, self.grid, parallel_workers)
+
+        # Vacant dwellings per node, bucketed by price, kept in sync with
+        # every move and price update.
+        self.vacancies = VacancyIndex(
+            self.grid.housing_cost, self.grid.dwellings, self.households.counts_per_node(n_nodes)
+        )
+
+        # Project lifecycle events (proposals, permit decisions, completions);
+        # landlords only act when one of their events is due.
+        self.events = EventQueue()
+        self.due_events = {kind: [] for kind in (PROPOSAL, PERMIT_DECISION, COMPLETION)}
+        self.landlords = []
         for i in range(num_landlords):
-            a = LandlordAgent(i + num_households, self, capital=100000, strategy="infill")
-            self.schedule.add(a)
+            a = LandlordAgent(self, capital=100000, strategy="infill")
+            self.landlords.append(a)
+            self.events.schedule(1 + i % LandlordAgent.review_interval, PROPOSAL, a)
 
+        # Each municipality governs one district of the network.
+        self.municipalities = []
         for i in range(num_municipalities):
-            a = MunicipalityAgent(i + num_households + num_landlords, self, budget=10000, policy_alignment=0.7)
-            self.schedule.add(a)
+            a = MunicipalityAgent(self, budget=10000, regulatory_flexibility=0.7, district=i)
+            self.municipalities.append(a)
+        self.node_municipality = partition_network(self.network, num_municipalities)
+
+    def close(self):
+        """
+        Stop the parallel market workers and free shared memory, if used.
+        The model keeps working afterwards with the serial market.
+        """
+        if isinstance(self.market, PartitionedMarket):
+            self.market.close()
+            self.vacancies.prices = self.grid.housing_cost
+            self.market = self.market.market
+
+    def household(self, index) -> HouseholdAgent:
+        """Agent view of household ``index`` for inspection."""
+        return self.households.agent(index, self)
+
+    def add_households(self, income):
+        """
+        New homeless households with the given incomes; they look for a
+        dwelling in the next market clearing.
+
+        :return: Index array of the new households.
+        """
+        income = np.atleast_1d(income)
+        return self.households.add(
+            income=income,
+            status=HOMELESS,
+            preferences=self.rng.dirichlet(np.ones(3), size=income.shape[0]),
+        )
+
+    def add_dwellings(self, nodes, counts=1):
+        """New vacant dwellings at ``nodes``."""
+        np.add.at(self.grid.dwellings, nodes, counts)
+        self.vacancies.add_units(nodes, counts)
+        if self.land_use is not None:
+            self.land_use.develop(nodes, np.broadcast_to(counts, np.shape(nodes)), self.land_per_dwelling)
+            self.update_land_availability()
+
+    def update_land_availability(self):
+        """Set ``land_availability`` from the land-use raster (nodes with no cells keep theirs)."""
+        availability = self.land_use.land_availability()
+        covered = np.isfinite(availability)
+        self.grid.land_availability[covered] = availability[covered]
+
+    def relocate_households(self, idx, nodes):
+        """Move households ``idx`` to ``nodes``, updating the vacancy index."""
+        idx = np.asarray(idx)
+        if self.profiler is not None:
+            self.profiler.count("relocations", idx.shape[0])
+        self.vacancies.move(self.households.node[idx], nodes)
+        self.households.relocate(idx, nodes)
+        self.households.cbd_node[idx] = self.travel_times.nearest_cbd[nodes]
+
+    def update_travel_times(self, tails, heads, times):
+        """
+        Set the travel time (minutes) of network edges ``tails[i] -> heads[i]``
+        and update the travel-time index incrementally.
+
+        :return: Nodes whose CBD or service travel time changed.
+        """
+        for u, v, t in zip(np.asarray(tails).tolist(), np.asarray(heads).tolist(), np.asarray(times).tolist()):
+            self.network[u][v]["travel_time"] = t
+        changed = self.travel_times.update_edge_weights(tails, heads, times)
+        # Households at those nodes may now be closer to another CBD node.
+        nodes = self.households.view("node")
+        moved = np.flatnonzero(np.isin(nodes, changed))
+        self.households.cbd_node[moved] = self.travel_times.nearest_cbd[nodes[moved]]
+        return changed
+
+    def exit_households(self, idx):
+        """Households ``idx`` leave the market and free their dwellings."""
+        idx = np.asarray(idx)
+        self.vacancies.move(self.households.node[idx], np.full(idx.shape, -1))
+        self.households.exit_market(idx)
+
+    def collect_due_events(self):
+        """
+        Pop the project events due this step into ``due_events``, by kind,
+        and queue due permit requests at the municipality of their node.
+        """
+        for events in self.due_events.values():
+            events.clear()
+        due = self.events.pop_due(self.steps)
+        for event in due:
+            self.due_events[event.kind].append(event)
+        if self.profiler is not None:
+            self.profiler.count("events", len(due))
+        requests = [event.project for event in self.due_events[PERMIT_DECISION]]
+        if requests:
+            districts = self.node_municipality[[p.node for p in requests]]
+            for project, district in zip(requests, districts.tolist()):
+                self.municipalities[district].queue_permit(project)
+
+    def searching_households(self):
+        """Homeless households, those priced out of their dwelling and a random share of the rest."""
+        store = self.households
+        nodes = store.view("node")
+        budgets = store.view("income") * self.max_cost_to_income
+        housed = nodes != NO_NODE
+        priced_out = housed & (self.grid.housing_cost[np.where(housed, nodes, 0)] > budgets)
+        moving = housed & (self.rng.random(len(store)) < self.mobility_rate)
+        return np.flatnonzero(~housed | priced_out | moving)
+
+    def clear_housing_market(self):
+        """
+        Match all searching households to vacant dwellings at once and set
+        ``housing_cost`` from the clearing prices.
+        """
+        store = self.households
+        searchers = self.searching_households()
+        if self.profiler is not None:
+            self.profiler.count("agents", searchers.shape[0])
+        try:
+            result = self.market.clear(
+                searchers,
+                budgets=store.income[searchers] * self.max_cost_to_income,
+                weights=store.preferences[searchers],
+                current_nodes=store.node[searchers],
+                accessibility=1.0 / (1.0 + self.travel_times.to_cbd),
+                services=self.grid.service_level,
+                prices=self.grid.housing_cost,
+                vacant=self.vacancies.vacant,
+                dwellings=self.grid.dwellings,
+            )
+        except BaseException:
+            # A failed parallel market has freed its shared memory; switch
+            # back to the serial market on private arrays.
+            self.close()
+            raise
+        # Movers release their dwellings before taking the new ones.
+        if result.households.size:
+            self.relocate_households(result.households, result.nodes)
+        self.grid.housing_cost[:] = result.prices
+        self.vacancies.reprice()
+        return result
 
     def step(self):
-        self.grid.update_service_levels()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start(self.steps, "service_levels")
+        counts = self.households.counts_per_node(self.grid.n_nodes)
+        self.grid.update_service_levels(counts)
+        if profiler is not None:
+            profiler.start(self.steps, "events")
+        self.collect_due_events()
+        # Municipalities decide permits, landlords handle their events, then
+        # households clear the housing market. The scheduler opens one
+        # profiler phase per agent type.
         self.schedule.step()
-        self.grid.adjust_housing_costs()
\ No newline at end of file
+        if self.datacollector is not None:
+            if profiler is not None:
+                profiler.start(self.steps, "datacollection")
+            self.datacollector.collect(self)
+        if profiler is not None:
+            profiler.stop()
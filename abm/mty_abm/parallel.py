@@ -0,0 +1,208 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import networkx as nx
+import numpy as np
+from market.clearing import HousingMarket
+
+
+def partition_network(G, n_parts, weights=None, seed=0):
+    """
+    Split the network into ``n_parts`` districts of similar total weight.
+
+    Louvain communities keep well-connected nodes together; they are then
+    packed largest-first into the lightest district. ``weights`` (e.g.
+    dwellings per node) defaults to one per node.
+
+    :return: District id per node (nodes must be ``0..n-1``).
+    """
+    n = G.number_of_nodes()
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    parts = np.zeros(n, dtype=np.int64)
+    if n_parts <= 1:
+        return parts
+    communities = [np.fromiter(c, dtype=np.int64) for c in nx.community.louvain_communities(G, seed=seed)]
+    communities.sort(key=lambda c: (-weights[c].sum(), c.min()))
+    load = np.zeros(n_parts)
+    for community in communities:
+        part = int(np.argmin(load))
+        parts[community] = part
+        load[part] += weights[community].sum()
+    return parts
+
+
+class SharedArrays:
+    """
+    Named NumPy arrays backed by ``multiprocessing.shared_memory`` blocks.
+
+    ``spec()`` is a small picklable description that worker processes pass
+    to ``attach`` to map the same memory without copying.
+    """
+
+    def __init__(self):
+        self._blocks = {}
+        self.arrays = {}
+
+    def create(self, name, shape, dtype):
+        """Allocate (or replace) array ``name``; returns the zeroed array."""
+        self.release(name)
+        dtype = np.dtype(dtype)
+        size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.fill(0)
+        self._blocks[name] = block
+        self.arrays[name] = array
+        return array
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def spec(self):
+        return {name: (self._blocks[name].name, a.shape, a.dtype.str) for name, a in self.arrays.items()}
+
+    def release(self, name):
+        block = self._blocks.pop(name, None)
+        self.arrays.pop(name, None)
+        if block is not None:
+            # Unlink first so the segment never outlives us, even if views
+            # of it are still alive (they keep the mapping until collected).
+            block.unlink()
+            try:
+                block.close()
+            except BufferError:
+                pass
+
+    def close(self):
+        for name in list(self._blocks):
+            self.release(name)
+
+
+# Blocks attached in a worker process, by block name.
+_ATTACHED = {}
+
+
+def attach(spec):
+    """Arrays described by ``SharedArrays.spec()``, mapped in this process."""
+    arrays = {}
+    for name, (block_name, shape, dtype) in spec.items():
+        if block_name not in _ATTACHED:
+            # Blocks replaced since the last call are no longer needed.
+            _ATTACHED[block_name] = shared_memory.SharedMemory(name=block_name)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=_ATTACHED[block_name].buf)
+    live = {block_name for block_name, _, _ in spec.values()}
+    for block_name in [b for b in _ATTACHED if b not in live]:
+        _ATTACHED.pop(block_name).close()
+    return arrays
+
+
+def _district_candidates(spec, n_searchers, district, market_params):
+    """Worker: candidate lists of the searchers of one district, written in place."""
+    a = attach(spec)
+    rows = np.flatnonzero(a["district"][:n_searchers] == district)
+    if rows.size:
+        market = HousingMarket(**market_params)
+        a["candidates"][rows] = market.candidate_lists(
+            a["budgets"][rows], a["weights"][rows], a["current_nodes"][rows],
+            a["accessibility"], a["service_level"], a["housing_cost"], a["vacant"],
+        )
+    return rows.size
+
+
+class PartitionedMarket:
+    """
+    ``HousingMarket`` whose candidate-list construction runs in parallel by
+    district.
+
+    The network is split with ``partition_network`` and node arrays are
+    moved into shared memory (``CityNetwork.share_memory``). Each step, the
+    searchers' inputs are written to shared buffers and one worker per
+    district builds the candidate lists of the households living there
+    (homeless households are spread over districts by index). Candidates
+    may lie in any district. At the barrier the main process runs the
+    matching over all lists at once, so cross-district moves and price
+    updates are resolved exactly as in the serial ``HousingMarket``, and the
+    result does not depend on the number of workers or districts. Only the
+    candidate lists are built in the workers; matching, prices and the
+    landlord and municipality stages of the step run in the main process.
+    """
+
+    def __init__(self, market, grid, workers, n_districts=None, seed=0):
+        self.market = market
+        self.workers = workers
+        self.n_districts = n_districts or workers
+        self.node_district = partition_network(grid.G, self.n_districts, weights=grid.dwellings, seed=seed)
+        self.grid = grid
+        self.shared = SharedArrays()
+        grid.share_memory(self.shared)
+        self.shared.create("accessibility", (grid.n_nodes,), np.float64)
+        self.shared.create("vacant", (grid.n_nodes,), np.int64)
+        self._capacity = 0
+        self._pool = ProcessPoolExecutor(max_workers=workers)
+        self.closed = False
+
+    def close(self):
+        """
+        Stop the workers, copy the grid's node arrays back to private memory
+        and unlink the shared blocks. Safe to call more than once.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._pool.shutdown(cancel_futures=True)
+        finally:
+            self.grid.unshare_memory()
+            self.shared.close()
+
+    def _reserve(self, n):
+        """Grow the per-searcher buffers to hold at least ``n`` rows."""
+        if n <= self._capacity:
+            return
+        self._capacity = max(n, 2 * self._capacity, 1024)
+        m = self.market.n_candidates
+        self.shared.create("budgets", (self._capacity,), np.float64)
+        self.shared.create("weights", (self._capacity, 3), np.float32)
+        self.shared.create("current_nodes", (self._capacity,), np.int64)
+        self.shared.create("district", (self._capacity,), np.int64)
+        self.shared.create("candidates", (self._capacity, m), np.int64)
+
+    def _put(self, name, values):
+        target = self.shared[name]
+        if not np.shares_memory(target, values):
+            target[:values.shape[0]] = values
+
+    def clear(self, searchers, budgets, weights, current_nodes, accessibility, services, prices, vacant, dwellings):
+        """Same as ``HousingMarket.clear``, with candidate lists built by the district workers."""
+        try:
+            return self._clear(searchers, budgets, weights, current_nodes, accessibility, services, prices,
+                               vacant, dwellings)
+        except BaseException:
+            # A failed worker or broken pool must not leave shared-memory
+            # segments behind in /dev/shm.
+            self.close()
+            raise
+
+    def _clear(self, searchers, budgets, weights, current_nodes, accessibility, services, prices, vacant, dwellings):
+        n = searchers.shape[0]
+        self._reserve(n)
+        for name, values in (("budgets", budgets), ("weights", weights), ("current_nodes", current_nodes),
+                             ("accessibility", accessibility), ("service_level", services),
+                             ("housing_cost", prices), ("vacant", vacant)):
+            self._put(name, values)
+        housed = current_nodes >= 0
+        district = self.shared["district"][:n]
+        district[housed] = self.node_district[current_nodes[housed]]
+        district[~housed] = np.flatnonzero(~housed) % self.n_districts
+
+        spec = self.shared.spec()
+        params = {"n_candidates": self.market.n_candidates, "chunk_elements": self.market.chunk_elements}
+        # Barrier: every district's candidate lists are written before matching.
+        list(self._pool.map(
+            _district_candidates, [spec] * self.n_districts, [n] * self.n_districts,
+            range(self.n_districts), [params] * self.n_districts,
+        ))
+        candidates = self.shared["candidates"][:n].copy()
+        return self.market.settle(searchers, candidates, budgets, prices, vacant, dwellings)
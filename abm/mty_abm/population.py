@@ -0,0 +1,250 @@
+import os
+import numpy as np
+import pandas as pd
+from agents.household_store import STATUS_CODES
+
+# Attributes of the joint table, in axis order after the zone axis. Each is
+# read from ``<name>.csv``: one row per zone (first column ``zone``), one
+# column per category with its household count.
+# - household_size: categories "1", "2", ..., open-ended "5+";
+# - income: monthly income bands "lo-hi", open-ended "lo+";
+# - tenure: names from ``STATUS_CODES`` ("renting", "owning").
+ATTRIBUTES = ("household_size", "income", "tenure")
+
+
+def _band(label):
+    """(low, high) bounds of a category label "lo-hi", "lo+" or "x"; high is inf when open."""
+    label = str(label).strip()
+    if label.endswith("+"):
+        return float(label[:-1]), np.inf
+    if "-" in label:
+        low, high = label.split("-", 1)
+        return float(low), float(high)
+    return float(label), float(label)
+
+
+def node_zones(G, zones, attribute="zone"):
+    """
+    Zone index of every node from its ``attribute`` (e.g. a census tract
+    code), -1 for nodes in none of ``zones``.
+    """
+    index = {str(zone): i for i, zone in enumerate(zones)}
+    return np.array([index.get(str(G.nodes[n].get(attribute)), -1) for n in range(G.number_of_nodes())],
+                    dtype=np.int64)
+
+
+class SyntheticPopulation:
+    """
+    Households drawn from census marginals by iterative proportional fitting.
+
+    ``fit`` builds the joint table zone x household size x income x tenure
+    that matches every marginal, scaling all zones at once along one axis at
+    a time. The starting table is uniform, or a cross-tabulation of
+    microdata (``seed_table``) that carries the correlations between
+    attributes the marginals cannot. ``sample`` then draws whole
+    populations from the table at once (integer parts of the expected
+    counts, plus one multinomial per zone for the remainders) and fills
+    income within its band, so a full municipality takes well under a
+    second and the same seed gives the same population.
+    """
+
+    # Open-ended income bands are drawn from a Pareto tail with this index.
+    pareto_index = 2.5
+
+    def __init__(self, marginals, seed_table=None):
+        """
+        :param marginals: ``{attribute: DataFrame}`` indexed by zone with one
+            column per category (as read by ``from_csv``). Every attribute's
+            zone totals are rescaled to those of the first attribute, since
+            published tables rarely add up exactly.
+        :param seed_table: Optional starting joint table over the attributes
+            (no zone axis), e.g. from ``seed_from_microdata``.
+        """
+        self.attributes = list(marginals)
+        first = marginals[self.attributes[0]]
+        self.zones = list(first.index)
+        self.categories = {name: [str(c) for c in df.columns] for name, df in marginals.items()}
+        totals = first.to_numpy(dtype=float).sum(axis=1)
+        self.targets = {}
+        for name, df in marginals.items():
+            values = df.reindex(self.zones).fillna(0.0).to_numpy(dtype=float)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scale = np.where(values.sum(axis=1) > 0, totals / values.sum(axis=1), 0.0)
+            self.targets[name] = values * scale[:, None]
+        self.seed_table = None if seed_table is None else np.asarray(seed_table, dtype=float)
+        self.joint = None
+
+    @classmethod
+    def from_csv(cls, directory, attributes=ATTRIBUTES, microdata=None):
+        """
+        Read ``<attribute>.csv`` marginals from ``directory``.
+
+        :param microdata: Optional CSV of sample households with one column
+            per attribute (category labels) and an optional ``weight`` column,
+            used as the IPF seed.
+        """
+        marginals = {}
+        for name in attributes:
+            df = pd.read_csv(os.path.join(directory, f"{name}.csv"), index_col=0)
+            df.index = df.index.astype(str)
+            marginals[name] = df
+        population = cls(marginals)
+        if microdata is not None:
+            population.seed_table = population.seed_from_microdata(pd.read_csv(microdata, dtype=str))
+        return population
+
+    def seed_from_microdata(self, df):
+        """Weighted cross-tabulation of ``df`` over the attributes' categories."""
+        shape = tuple(len(self.categories[name]) for name in self.attributes)
+        codes = []
+        for name in self.attributes:
+            lookup = {c: i for i, c in enumerate(self.categories[name])}
+            codes.append(df[name].astype(str).map(lookup).to_numpy())
+        valid = np.all([~pd.isna(c) for c in codes], axis=0)
+        flat = np.ravel_multi_index(tuple(np.asarray(c[valid], dtype=np.int64) for c in codes), shape)
+        weight = df["weight"].astype(float).to_numpy()[valid] if "weight" in df else None
+        return np.bincount(flat, weights=weight, minlength=int(np.prod(shape))).reshape(shape)
+
+    # ------------------------------------------------------------------
+    # Fitting
+    # ------------------------------------------------------------------
+    def fit(self, tolerance=1e-8, max_iterations=500):
+        """
+        Iterative proportional fitting of the joint table to the marginals.
+
+        :return: self; ``joint`` has shape (n_zones, *categories) and
+            ``fit_error`` is the largest relative marginal error left.
+        """
+        shape = tuple(len(self.categories[name]) for name in self.attributes)
+        seed_table = np.ones(shape) if self.seed_table is None else self.seed_table
+        joint = np.broadcast_to(seed_table, (len(self.zones),) + shape).copy()
+        axes = range(1, joint.ndim)
+        for iteration in range(max_iterations):
+            # Match each marginal in turn: sum over the other attribute axes,
+            # then rescale every cell by target / current.
+            for axis, name in zip(axes, self.attributes):
+                others = tuple(a for a in axes if a != axis)
+                current = joint.sum(axis=others)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    factor = np.where(current > 0, self.targets[name] / current, 0.0)
+                joint *= np.expand_dims(factor, others)
+            self.fit_error = self._error(joint)
+            if self.fit_error < tolerance:
+                break
+        self.iterations = iteration + 1
+        self.joint = joint
+        return self
+
+    def _error(self, joint):
+        axes = range(1, joint.ndim)
+        error = 0.0
+        for axis, name in zip(axes, self.attributes):
+            current = joint.sum(axis=tuple(a for a in axes if a != axis))
+            target = self.targets[name]
+            error = max(error, float(np.abs(current - target).max() / max(target.max(), 1e-12)))
+        return error
+
+    # ------------------------------------------------------------------
+    # Sampling
+    # ------------------------------------------------------------------
+    def sample(self, n=None, seed=None, node_zone=None):
+        """
+        Draw households from the fitted table.
+
+        :param n: Number of households; defaults to the marginal totals
+            (rounded per zone). Otherwise zones are drawn in proportion.
+        :param seed: Seed for the draws.
+        :param node_zone: Optional zone index of every network node (see
+            ``node_zones``); each household then gets a node of its zone,
+            uniformly.
+        :return: Dict of arrays: ``zone``, ``members``, ``income``, ``status``
+            and, with ``node_zone``, ``node``; ready for
+            ``MonterreyModel(population=...)``.
+        """
+        if self.joint is None:
+            raise ValueError("Call fit() before sample()")
+        rng = np.random.default_rng(seed)
+        n_zones = len(self.zones)
+        cells = self.joint.reshape(n_zones, -1)
+        zone_totals = cells.sum(axis=1)
+        if n is None:
+            counts_per_zone = np.rint(zone_totals).astype(np.int64)
+        else:
+            counts_per_zone = rng.multinomial(n, zone_totals / zone_totals.sum())
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p = np.where(zone_totals[:, None] > 0, cells / zone_totals[:, None], 1.0 / cells.shape[1])
+        # Integer parts of the expected counts, then the rest drawn by the
+        # fractional parts, so the marginals are kept to within rounding.
+        expected = p * counts_per_zone[:, None]
+        counts = np.floor(expected).astype(np.int64)
+        fraction = expected - counts
+        remainder = counts_per_zone - counts.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = np.where(remainder[:, None] > 0, fraction / fraction.sum(axis=1, keepdims=True), p)
+        counts += rng.multinomial(remainder, fraction)
+
+        # One row per household, shuffled so zones and categories are not in order.
+        flat = np.repeat(np.arange(counts.size), counts.ravel())
+        flat = flat[rng.permutation(flat.shape[0])]
+        zone, cell = np.divmod(flat, cells.shape[1])
+        codes = np.unravel_index(cell, self.joint.shape[1:])
+        code = dict(zip(self.attributes, codes))
+
+        households = {"zone": zone}
+        if "household_size" in code:
+            sizes = np.array([_band(c)[0] for c in self.categories["household_size"]])
+            households["members"] = sizes[code["household_size"]].astype(np.int8)
+        if "income" in code:
+            households["income"] = self._draw_income(code["income"], rng)
+        if "tenure" in code:
+            statuses = np.array([STATUS_CODES.index(c) for c in self.categories["tenure"]], dtype=np.int8)
+            households["status"] = statuses[code["tenure"]]
+        if node_zone is not None:
+            households["node"] = self._draw_nodes(zone, np.asarray(node_zone), rng)
+        return households
+
+    def _draw_income(self, band, rng):
+        bounds = np.array([_band(c) for c in self.categories["income"]])
+        low, high = bounds[band, 0], bounds[band, 1]
+        u = rng.random(band.shape[0])
+        open_ended = np.isinf(high)
+        return np.where(
+            open_ended,
+            low * (1.0 - u) ** (-1.0 / self.pareto_index),
+            low + u * np.where(open_ended, 0.0, high - low),
+        )
+
+    @staticmethod
+    def _draw_nodes(zone, node_zone, rng):
+        """Uniform node of each household's zone."""
+        order = np.argsort(node_zone, kind="stable")
+        n_zones = max(int(zone.max(initial=-1)), int(node_zone.max(initial=-1))) + 1
+        per_zone = np.bincount(node_zone[node_zone >= 0], minlength=n_zones)
+        if np.any(per_zone[np.unique(zone)] == 0):
+            raise ValueError("Some zones with households have no network nodes")
+        start = np.searchsorted(node_zone[order], np.arange(n_zones))
+        pick = start[zone] + (rng.random(zone.shape[0]) * per_zone[zone]).astype(np.int64)
+        return order[pick].astype(np.int64)
+
+    def marginal_table(self, households, name):
+        """Household counts per zone and category of ``name`` in a drawn population."""
+        values = {
+            "household_size": households.get("members"),
+            "income": households.get("income"),
+            "tenure": households.get("status"),
+        }[name]
+        n_categories = len(self.categories[name])
+        if name == "income":
+            bounds = np.array([_band(c) for c in self.categories[name]])
+            code = np.searchsorted(bounds[:, 0], values, side="right") - 1
+        elif name == "tenure":
+            lookup = np.zeros(len(STATUS_CODES), dtype=np.int64)
+            lookup[[STATUS_CODES.index(c) for c in self.categories[name]]] = np.arange(n_categories)
+            code = lookup[values]
+        else:
+            sizes = np.array([_band(c)[0] for c in self.categories[name]])
+            code = np.searchsorted(sizes, np.minimum(values, sizes[-1]))
+        table = np.bincount(households["zone"] * n_categories + code, minlength=len(self.zones) * n_categories)
+        return pd.DataFrame(table.reshape(len(self.zones), n_categories), index=self.zones,
+                            columns=self.categories[name])
+
@@ -0,0 +1,102 @@
+import json
+import time
+import pandas as pd
+
+# Work counters kept per phase.
+COUNTERS = ("agents", "relocations", "permits", "events")
+
+
+class StepProfiler:
+    """
+    Wall time and work counters of every phase of ``MonterreyModel.step``.
+
+    The model opens a phase around each part of its step (service levels,
+    event collection, each agent type of the schedule, data collection);
+    code running inside it adds to the phase's counters with ``count``:
+    agents activated, households relocated, permits decided and events
+    fired. Each closed phase is one tuple appended to ``records``, so the
+    cost is a couple of ``perf_counter_ns`` calls per phase, small enough to
+    leave on for whole production runs.
+
+    ``to_frame`` / ``to_csv`` give the per-step timeline as a table,
+    ``summary`` totals it per phase, and ``to_chrome_trace`` writes it for
+    ``chrome://tracing`` or Perfetto.
+    """
+
+    def __init__(self):
+        self.records = []
+        self._phase = None
+        self._counts = dict.fromkeys(COUNTERS, 0)
+
+    def start(self, step, phase, agent_type=""):
+        """Open ``phase`` of ``step`` (closing any phase still open)."""
+        if self._phase is not None:
+            self.stop()
+        self._phase = (step, phase, agent_type, time.perf_counter_ns())
+        for name in COUNTERS:
+            self._counts[name] = 0
+
+    def stop(self):
+        """Close the open phase and record it."""
+        end = time.perf_counter_ns()
+        step, phase, agent_type, start = self._phase
+        counts = self._counts
+        self.records.append((step, phase, agent_type, start, end - start, counts["agents"],
+                             counts["relocations"], counts["permits"], counts["events"]))
+        self._phase = None
+
+    def count(self, name, n=1):
+        """Add ``n`` to counter ``name`` of the open phase."""
+        self._counts[name] += n
+
+    def reset(self):
+        self.records = []
+        self._phase = None
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+    def to_frame(self):
+        """
+        One row per phase and step: ``step``, ``phase``, ``agent_type``,
+        ``start`` and ``duration`` (seconds) and the counters.
+        """
+        df = pd.DataFrame(self.records, columns=["step", "phase", "agent_type", "start", "duration", *COUNTERS])
+        origin = df["start"].min() if len(df) else 0
+        df["start"] = (df["start"] - origin) / 1e9
+        df["duration"] = df["duration"] / 1e9
+        return df
+
+    def to_csv(self, path):
+        self.to_frame().to_csv(path, index=False)
+
+    def summary(self):
+        """Per phase: total and mean wall time, share of the step, and counter totals."""
+        df = self.to_frame()
+        grouped = df.groupby(["phase", "agent_type"], sort=False)
+        summary = grouped[["duration", *COUNTERS]].sum()
+        summary["mean_duration"] = grouped["duration"].mean()
+        summary["share"] = summary["duration"] / summary["duration"].sum()
+        return summary
+
+    def to_chrome_trace(self, path):
+        """
+        Write the timeline in the Chrome trace event format: one complete
+        event per phase (times in microseconds), with the step and counters
+        as arguments.
+        """
+        origin = min((r[3] for r in self.records), default=0)
+        events = []
+        for step, phase, agent_type, start, duration, *counts in self.records:
+            events.append({
+                "name": agent_type or phase,
+                "cat": phase,
+                "ph": "X",
+                "ts": (start - origin) / 1e3,
+                "dur": duration / 1e3,
+                "pid": 0,
+                "tid": 0,
+                "args": {"step": step, **dict(zip(COUNTERS, counts))},
+            })
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,57 @@
+import mesa
+from mesa.agent import AgentSet
+
+
+class BatchedAgent(mesa.Agent):
+    """
+    Agent type activated in bulk by ``TypeBatchedScheduler``.
+
+    Subclasses override the class-level hooks: ``pending_agents`` picks the
+    agents of the type that have work this step and ``step_all`` runs them
+    all at once (vectorized where possible). The defaults fall back to
+    ``has_pending_work`` and per-agent ``step``.
+    """
+
+    def has_pending_work(self):
+        return True
+
+    @classmethod
+    def pending_agents(cls, model, agents):
+        """Subset of ``agents`` (an ``AgentSet`` of this type) to activate this step."""
+        return agents.select(lambda agent: agent.has_pending_work())
+
+    @classmethod
+    def step_all(cls, model, agents):
+        """Activate ``agents``."""
+        agents.do("step")
+
+
+class TypeBatchedScheduler:
+    """
+    Staged activation by agent type, built on Mesa's ``AgentSet``.
+
+    Replaces ``mesa.time.BaseScheduler``, which activated every agent one by
+    one. Each step, the types in ``stages`` run in order; for each type the
+    scheduler calls ``step_all`` once with the agents ``pending_agents``
+    returns, so idle agents are skipped and a type can act on all its
+    agents in a few array operations. If the model has a ``profiler``,
+    each type runs in its own profiler phase.
+    """
+
+    def __init__(self, model, stages):
+        self.model = model
+        self.stages = list(stages)
+
+    def agents_of(self, agent_type):
+        agents = self.model.agents_by_type.get(agent_type)
+        return agents if agents is not None else AgentSet([], random=self.model.random)
+
+    def step(self):
+        profiler = getattr(self.model, "profiler", None)
+        for agent_type in self.stages:
+            if profiler is not None:
+                profiler.start(self.model.steps, "agents", agent_type.__name__)
+            agents = agent_type.pending_agents(self.model, self.agents_of(agent_type))
+            if profiler is not None:
+                profiler.count("agents", len(agents))
+            agent_type.step_all(self.model, agents)
@@ -0,0 +1,247 @@
+import importlib.util
+import os
+import sys
+import types
+import numpy as np
+import pandas as pd
+from agents.household_store import NO_NODE
+from model import MonterreyModel
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+SD_DIR_PATH = os.path.normpath(os.path.join(DIR_PATH, "..", "..", "sd_model", "python_ver"))
+
+
+def _load_sd_model():
+    """
+    Import ``model_v6`` from ``SD_DIR_PATH`` by file location, as
+    ``sd_model_v6``, without touching ``sys.path``.
+
+    Its ``from utils.utils import Utils`` is served from the SD ``utils``
+    directory while it runs; any other ``utils`` module already imported is
+    put back afterwards, so the two code bases can be used together.
+    """
+    def load(name, path):
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+        return module
+
+    saved = {name: sys.modules.pop(name) for name in ("utils", "utils.utils") if name in sys.modules}
+    try:
+        utils = types.ModuleType("utils")
+        utils.__path__ = [os.path.join(SD_DIR_PATH, "utils")]
+        sys.modules["utils"] = utils
+        utils.utils = load("utils.utils", os.path.join(SD_DIR_PATH, "utils", "utils.py"))
+        return load("sd_model_v6", os.path.join(SD_DIR_PATH, "model_v6.py"))
+    finally:
+        sys.modules.pop("utils", None)
+        sys.modules.pop("utils.utils", None)
+        sys.modules.update(saved)
+
+
+_sd_model = _load_sd_model()
+CORE_INDEX, MV_VARIABLES, HousingModel = _sd_model.CORE_INDEX, _sd_model.MV_VARIABLES, _sd_model.HousingModel
+
+# Columns of ``HybridModel.drivers`` (SD -> ABM, one row per sync window):
+# SD households at the end of the window, houses completed during the
+# window, and the financing effect on construction.
+DRIVER_VARIABLES = ("households", "houses_built", "financing_effect")
+
+# Columns of ``HybridModel.feedback`` (ABM -> SD, one row per sync window):
+# ABM mean occupied housing cost relative to its start, and the land per
+# house implied by how spread out ABM households are.
+FEEDBACK_VARIABLES = ("housing_cost_ratio", "land_per_house")
+
+
+class HybridModel:
+    """
+    ``HousingModel`` (SD) driving a ``MonterreyModel`` (ABM) at a coarser rate.
+
+    The SD model advances at its own ``time_step`` and writes into its
+    preallocated record. Every ``sync_interval`` years the ABM reads that
+    window of the record, aggregates it into one row of ``drivers``, adds
+    the households and dwellings the SD model implies (scaled to the ABM
+    population) and takes ``abm_steps_per_sync`` steps. It then writes its
+    realized prices and land per house into one row of ``feedback``, which
+    pulls the SD ``housing_cost`` and ``land_per_house`` stocks toward them
+    by ``feedback_weight``. All exchange goes through these arrays (and
+    views of the SD record), never through per-step dicts.
+
+    A last window shorter than ``sync_interval`` gets a proportional share
+    of ABM steps (fractions carry over), so the ABM clock never runs ahead
+    of the SD one. Household coupling is one-way upward: a rising SD
+    household total adds newcomers to the ABM, but a falling one removes
+    nobody, since ABM households only leave the market by their own
+    choices.
+    """
+
+    def __init__(self, config_yaml_path, abm_params=None, sync_interval=1.0, abm_steps_per_sync=1,
+                 feedback_weight=0.5, seed=None):
+        """
+        :param config_yaml_path: SD scenario config.
+        :param abm_params: Keyword arguments for ``MonterreyModel``. Pass
+            ``num_landlords=0`` to make SD construction the only new supply.
+        :param sync_interval: Years between exchanges; rounded to a whole
+            number of SD time steps.
+        :param feedback_weight: Share of the gap between SD and ABM values
+            closed at each exchange (0 = one-way coupling).
+        """
+        self.hm = HousingModel(config_yaml_path)
+        self.config = self.hm.config
+        sim_p = self.config["simulation_parameters"]
+        self.dt = sim_p["time_step"]
+        self.time_range = np.arange(0, sim_p["sim_time"] + self.dt, self.dt)
+        self.steps_per_sync = max(1, int(round(sync_interval / self.dt)))
+        self.abm_steps_per_sync = abm_steps_per_sync
+        self.feedback_weight = feedback_weight
+
+        self.abm = MonterreyModel(**(abm_params or {}), seed=seed)
+
+        # Exchange buffers
+        n_steps = len(self.time_range)
+        n_windows = -(-n_steps // self.steps_per_sync)
+        self.record = self.hm.allocate_record(n_steps)
+        self.houses = np.empty(n_steps)
+        self.drivers = np.full((n_windows, len(DRIVER_VARIABLES)), np.nan)
+        self.feedback = np.full((n_windows, len(FEEDBACK_VARIABLES)), np.nan)
+
+        # ABM households and dwellings stand for this many SD ones.
+        params = self.config["model_parameters"]
+        households0 = params["initial_pop"] / params["avg_household_size"]
+        self.scale = len(self.abm.households) / households0
+        self._initial_cost = self._occupied_cost()
+        self._initial_spread = self._spread()
+        self._initial_financing = None
+        self._initial_cost_share = self.abm.max_cost_to_income
+        self._built_carry = 0.0
+        self._step_carry = 0.0
+
+    # ------------------------------------------------------------------
+    # ABM aggregates
+    # ------------------------------------------------------------------
+    def _housed_nodes(self):
+        nodes = self.abm.households.view("node")
+        return nodes[nodes != NO_NODE]
+
+    def _occupied_cost(self):
+        return float(self.abm.grid.housing_cost[self._housed_nodes()].mean())
+
+    def _spread(self):
+        """Occupied nodes per housed household."""
+        nodes = self._housed_nodes()
+        return np.unique(nodes).shape[0] / max(nodes.shape[0], 1)
+
+    # ------------------------------------------------------------------
+    # Exchange
+    # ------------------------------------------------------------------
+    def _collect_drivers(self, window, rows):
+        """Aggregate SD record rows ``rows`` into ``drivers[window]``."""
+        record = self.record[rows]
+        financing = self.hm.derive_variables(
+            self.time_range[rows], self.houses[rows], record, names=["effect_of_financing_on_construction_rate"]
+        )["effect_of_financing_on_construction_rate"]
+        out = self.drivers[window]
+        out[0] = record[-1, CORE_INDEX["households"]]
+        out[1] = record[:, CORE_INDEX["housing_stock_increase"]].sum() * self.dt
+        out[2] = financing.mean()
+
+    def _apply_drivers(self, window):
+        households, houses_built, financing = self.drivers[window]
+        abm = self.abm
+
+        # Newcomers, with incomes drawn from the current population. A lower
+        # SD total removes no ABM households (see the class docstring).
+        target = int(round(households * self.scale))
+        n_new = target - len(abm.households)
+        if n_new > 0:
+            abm.add_households(abm.rng.choice(abm.households.view("income"), size=n_new))
+
+        # New dwellings, carrying the fractional remainder to the next window
+        # and placed where land is available and prices are high.
+        built = houses_built * self.scale + self._built_carry
+        n_built = int(built)
+        self._built_carry = built - n_built
+        if n_built > 0:
+            weights = abm.grid.land_availability * abm.grid.housing_cost
+            counts = abm.rng.multinomial(n_built, weights / weights.sum())
+            nodes = np.flatnonzero(counts)
+            abm.add_dwellings(nodes, counts[nodes])
+
+        # Easier financing lets households spend a larger share of income.
+        if self._initial_financing is None:
+            self._initial_financing = financing
+        abm.max_cost_to_income = self._initial_cost_share * financing / max(self._initial_financing, 1e-12)
+
+    def _write_feedback(self, window):
+        out = self.feedback[window]
+        out[0] = self._occupied_cost() / self._initial_cost
+        land0 = self.config["model_parameters"]["initial_land_per_house"]
+        out[1] = land0 * self._spread() / self._initial_spread
+
+    def _apply_feedback(self, window):
+        w = self.feedback_weight
+        cost_ratio, land_per_house = self.feedback[window]
+        hm = self.hm
+        target_cost = cost_ratio * self.config["model_parameters"]["initial_housing_cost"]
+        hm.housing_cost_stock += w * (target_cost - hm.housing_cost_stock)
+        hm.land_per_house_stock += w * (land_per_house - hm.land_per_house_stock)
+
+    # ------------------------------------------------------------------
+    # Run
+    # ------------------------------------------------------------------
+    def run(self):
+        """
+        Run the coupled simulation over the SD ``sim_time``.
+
+        :return: ``(sd, exchange)`` DataFrames: the SD trajectory (as from
+            ``ScenarioRunner``) and one row per sync window with its end
+            time, drivers, feedback and ABM household count. A window's
+            end time is the time of its last SD step plus ``dt``, when the
+            SD state it hands to the ABM is reached.
+        """
+        houses = self.config["simulation_parameters"]["houses_init"]
+        n_steps = len(self.time_range)
+        n_households = np.empty(self.drivers.shape[0], dtype=np.int64)
+
+        for window, start in enumerate(range(0, n_steps, self.steps_per_sync)):
+            rows = slice(start, min(start + self.steps_per_sync, n_steps))
+            # 1) Fine SD steps over the window
+            for i in range(rows.start, rows.stop):
+                self.houses[i] = houses
+                housesD = self.hm.run_step_into(houses, self.time_range[i], self.dt, self.record[i])
+                houses += housesD * self.dt
+
+            # 2) SD -> ABM, then coarse ABM steps in proportion to the
+            # window's length (a short last window gets fewer).
+            self._collect_drivers(window, rows)
+            self._apply_drivers(window)
+            self._step_carry += self.abm_steps_per_sync * (rows.stop - rows.start) / self.steps_per_sync
+            n_abm_steps = int(round(self._step_carry, 9))
+            self._step_carry -= n_abm_steps
+            for _ in range(n_abm_steps):
+                self.abm.step()
+
+            # 3) ABM -> SD
+            self._write_feedback(window)
+            self._apply_feedback(window)
+            n_households[window] = len(self.abm.households)
+
+        sd = pd.DataFrame(self.hm.expand_record(self.time_range, self.houses, self.record), columns=MV_VARIABLES)
+        sd.insert(0, "houses", self.houses)
+        sd.insert(0, "time", self.time_range)
+
+        ends = np.minimum(np.arange(1, self.drivers.shape[0] + 1) * self.steps_per_sync, n_steps) - 1
+        exchange = pd.DataFrame(
+            np.hstack([self.drivers, self.feedback]), columns=list(DRIVER_VARIABLES + FEEDBACK_VARIABLES)
+        )
+        exchange.insert(0, "time", self.time_range[ends] + self.dt)
+        exchange["abm_households"] = n_households
+        return sd, exchange
+
+
+if __name__ == "__main__":
+    config_path = os.path.join(SD_DIR_PATH, "config", "baseline_mty.yaml")
+    hybrid = HybridModel(config_path, abm_params={"num_households": 20_000}, seed=1)
+    sd, exchange = hybrid.run()
+    print(exchange.to_string(index=False))
@@ -0,0 +1,338 @@
+import json
+import os
+import numpy as np
+from agents.landlords import APPROVED, COMPLETED, PROPOSED, REJECTED, Project
+from environment.land_use import LandUseRaster
+from events import COMPLETION, PERMIT_DECISION, PROPOSAL, Event
+
+# Codes used to store project statuses and event kinds as integers.
+PROJECT_STATUSES = (PROPOSED, APPROVED, REJECTED, COMPLETED)
+EVENT_KINDS = (PROPOSAL, PERMIT_DECISION, COMPLETION)
+
+# Travel-time arrays restored in place (the shortest-path trees hold views of them).
+TRAVEL_TIME_ARRAYS = ("to_cbd", "nearest_cbd", "cbd_next_hop", "to_services", "nearest_service",
+                      "service_next_hop", "nearest_jobs", "nearest_job_times")
+
+# Model parameters saved with the state; ``replay`` changes are applied after them.
+MODEL_PARAMETERS = ("max_cost_to_income", "mobility_rate", "land_per_dwelling")
+
+# Subdirectory of a snapshot holding the copy of a land-use raster.
+LAND_USE_DIR = "land_use"
+
+
+def _project_table(model):
+    """
+    Every live project (in landlord order, then any only referenced by
+    events or permit queues) and a ``Project -> row`` lookup.
+    """
+    projects, active = [], []
+    for landlord in model.landlords:
+        projects.extend(landlord.projects)
+        active.extend([True] * len(landlord.projects))
+    referenced = [event.project for event in model.events.state()[0]]
+    for municipality in model.municipalities:
+        referenced.extend(municipality.permit_queue)
+    rows = {id(p): i for i, p in enumerate(projects)}
+    for project in referenced:
+        if project is not None and id(project) not in rows:
+            rows[id(project)] = len(projects)
+            projects.append(project)
+            active.append(False)
+    return projects, np.array(active, dtype=bool), rows
+
+
+def model_state(model):
+    """
+    The state of ``model`` between two steps as flat arrays plus a
+    JSON-serializable dict.
+
+    :return: ``(arrays, meta)``.
+    """
+    landlord_index = {id(a): i for i, a in enumerate(model.landlords)}
+    arrays = {}
+
+    # 1) Households (current rows only) and node arrays.
+    store = model.households
+    for name in store.COLUMNS:
+        arrays[f"household_{name}"] = store.view(name)
+    for name, values in model.grid.node_arrays.items():
+        arrays[f"node_{name}"] = values
+
+    # 2) Vacancy index (the price buckets are rebuilt from bucket_of).
+    arrays["vacancy_vacant"] = model.vacancies.vacant
+    arrays["vacancy_bucket_of"] = model.vacancies.bucket_of
+    arrays["vacancy_edges"] = model.vacancies.edges
+
+    # 3) Travel times, which change with update_travel_times.
+    travel = model.travel_times
+    arrays["adjacency_data"] = travel.adjacency.data
+    arrays["reverse_data"] = travel.reverse.data
+    for name in TRAVEL_TIME_ARRAYS:
+        arrays[f"travel_{name}"] = getattr(travel, name)
+    arrays["node_municipality"] = model.node_municipality
+
+    # 4) Projects, landlords, municipalities and pending events, with
+    # objects replaced by their row in the matching table.
+    projects, active, rows = _project_table(model)
+    arrays["project_landlord"] = np.array([landlord_index[id(p.landlord)] for p in projects], dtype=np.int64)
+    arrays["project_node"] = np.array([p.node for p in projects], dtype=np.int64)
+    arrays["project_units"] = np.array([p.units for p in projects], dtype=np.int64)
+    arrays["project_cost"] = np.array([p.cost for p in projects], dtype=np.float64)
+    arrays["project_status"] = np.array([PROJECT_STATUSES.index(p.status) for p in projects], dtype=np.int8)
+    arrays["project_proposed_at"] = np.array([p.proposed_at for p in projects], dtype=np.int64)
+    arrays["project_completes_at"] = np.array(
+        [-1 if p.completes_at is None else p.completes_at for p in projects], dtype=np.int64
+    )
+    arrays["project_active"] = active
+    arrays["landlord_capital"] = np.array([a.capital for a in model.landlords], dtype=np.float64)
+    arrays["landlord_review_delay"] = np.array([a.review_delay for a in model.landlords], dtype=np.int64)
+    arrays["municipality_budget"] = np.array([a.budget for a in model.municipalities], dtype=np.float64)
+    arrays["municipality_flexibility"] = np.array(
+        [a.regulatory_flexibility for a in model.municipalities], dtype=np.float64
+    )
+    arrays["municipality_district"] = np.array([a.district for a in model.municipalities], dtype=np.int64)
+    queues = [[rows[id(p)] for p in a.permit_queue] for a in model.municipalities]
+    arrays["permit_queue_offsets"] = np.cumsum([0] + [len(q) for q in queues], dtype=np.int64)
+    arrays["permit_queue_projects"] = np.array(sum(queues, []), dtype=np.int64)
+    events, next_seq = model.events.state()
+    arrays["event_time"] = np.array([e.time for e in events], dtype=np.int64)
+    arrays["event_seq"] = np.array([e.seq for e in events], dtype=np.int64)
+    arrays["event_kind"] = np.array([EVENT_KINDS.index(e.kind) for e in events], dtype=np.int8)
+    arrays["event_landlord"] = np.array([landlord_index[id(e.landlord)] for e in events], dtype=np.int64)
+    arrays["event_project"] = np.array([-1 if e.project is None else rows[id(e.project)] for e in events],
+                                       dtype=np.int64)
+
+    # 5) Counters, parameters and both random generators.
+    version, internal, gauss = model.random.getstate()
+    meta = {
+        "steps": model.steps,
+        "running": model.running,
+        "n_nodes": model.grid.n_nodes,
+        "n_households": len(store),
+        "parameters": {name: getattr(model, name) for name in MODEL_PARAMETERS},
+        "landlord_strategy": [a.strategy for a in model.landlords],
+        "next_event_seq": next_seq,
+        "rng": model.rng.bit_generator.state,
+        "random": [version, list(internal), gauss],
+    }
+    return arrays, meta
+
+
+def save_snapshot(model, path, compress=False):
+    """
+    Write the state of ``model`` (between two steps) to ``path``.
+
+    Households, node and travel-time arrays, projects, pending events,
+    landlord and municipality state and both random generators are saved,
+    so a restored model continues exactly as the original would. The data
+    collector is not.
+
+    A land-use raster keeps changing on disk as the run goes on, so it is
+    copied whole into the snapshot (``land_use/``, as large as the raster
+    itself); this needs a directory snapshot.
+
+    :param path: A directory, written as one ``.npy`` file per array plus
+        ``meta.json`` and memory-mapped on restore; or a file ending in
+        ``.npz``.
+    :param compress: For ``.npz`` files, zlib-compress the arrays.
+    """
+    arrays, meta = model_state(model)
+    path = os.fspath(path)
+    if path.endswith(".npz"):
+        if model.land_use is not None:
+            raise ValueError("Models with a land-use raster need a directory snapshot, not .npz")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        meta_array = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+        (np.savez_compressed if compress else np.savez)(path, meta=meta_array, **arrays)
+        return path
+    os.makedirs(path, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(values))
+    meta["arrays"] = list(arrays)
+    if model.land_use is not None:
+        model.land_use.save(os.path.join(path, LAND_USE_DIR))
+        meta["land_use"] = LAND_USE_DIR
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return path
+
+
+def read_snapshot(path):
+    """
+    Arrays and meta dict of a snapshot. Directory snapshots are memory-mapped
+    copy-on-write, so nothing is read until used and writes stay private.
+    """
+    path = os.fspath(path)
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        meta = json.loads(arrays.pop("meta").tobytes().decode())
+        return arrays, meta
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    arrays = {
+        name: np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="c"))
+        for name in meta.pop("arrays")
+    }
+    if meta.get("land_use"):
+        meta["land_use"] = os.path.join(path, meta["land_use"])
+    return arrays, meta
+
+
+def load_snapshot(model, path):
+    """
+    Restore a snapshot into ``model``, which must be built on the same
+    network with the same number of landlords and municipalities (e.g. by
+    the factory that built the original). Its households, prices, projects,
+    events and random state are all replaced.
+
+    Household columns take the snapshot arrays as they are (memory-mapped
+    for directory snapshots) and are only copied when households are added;
+    the small per-node arrays are copied in place, so references to them
+    (the vacancy index, shared memory of a parallel market) stay valid.
+
+    A saved land-use raster replaces ``model.land_use``, opened
+    copy-on-write: the restored run sees the raster as it was at the
+    snapshot, and its own development stays private to it, so neither the
+    snapshot nor the original raster nor other branches change.
+
+    :param path: Snapshot path, or ``(arrays, meta)`` as from ``read_snapshot``.
+    :return: ``model``.
+    """
+    arrays, meta = path if isinstance(path, tuple) else read_snapshot(path)
+    if meta["n_nodes"] != model.grid.n_nodes:
+        raise ValueError(f"Snapshot has {meta['n_nodes']} nodes, the model {model.grid.n_nodes}")
+    if (len(meta["landlord_strategy"]) != len(model.landlords)
+            or arrays["municipality_budget"].shape[0] != len(model.municipalities)):
+        raise ValueError("Snapshot and model have different numbers of landlords or municipalities")
+    if model.land_use is not None and not meta.get("land_use"):
+        raise ValueError("The model has a land-use raster but the snapshot has none")
+
+    # 1) Households and node arrays.
+    store = model.households
+    for name in store.COLUMNS:
+        setattr(store, name, arrays[f"household_{name}"])
+    store.size = meta["n_households"]
+    store._views = {}
+    for name, values in model.grid.node_arrays.items():
+        values[:] = arrays[f"node_{name}"]
+    model.node_municipality = np.array(arrays["node_municipality"])
+    if meta.get("land_use"):
+        model.land_use = LandUseRaster(meta["land_use"], mode="c")
+
+    # 2) Vacancy index.
+    vacancies = model.vacancies
+    vacancies.vacant = np.array(arrays["vacancy_vacant"])
+    vacancies.bucket_of = np.array(arrays["vacancy_bucket_of"])
+    vacancies.edges = np.array(arrays["vacancy_edges"])
+    vacancies.buckets = [set() for _ in range(len(vacancies.edges) - 1)]
+    for node in np.flatnonzero(vacancies.vacant > 0).tolist():
+        vacancies.buckets[vacancies.bucket_of[node]].add(node)
+
+    # 3) Travel times; network edges only where they differ.
+    travel = model.travel_times
+    adjacency = travel.adjacency
+    changed = np.flatnonzero(adjacency.data != arrays["adjacency_data"])
+    if changed.size:
+        tails = np.searchsorted(adjacency.indptr, changed, side="right") - 1
+        for u, v, t in zip(tails.tolist(), adjacency.indices[changed].tolist(),
+                           arrays["adjacency_data"][changed].tolist()):
+            model.network[u][v]["travel_time"] = t
+    adjacency.data[:] = arrays["adjacency_data"]
+    travel.reverse.data[:] = arrays["reverse_data"]
+    for name in TRAVEL_TIME_ARRAYS:
+        getattr(travel, name)[...] = arrays[f"travel_{name}"]
+
+    # 4) Projects, agents and events.
+    projects = []
+    for row in range(arrays["project_node"].shape[0]):
+        project = Project(
+            model.landlords[int(arrays["project_landlord"][row])],
+            int(arrays["project_node"][row]),
+            int(arrays["project_units"][row]),
+            float(arrays["project_cost"][row]),
+            int(arrays["project_proposed_at"][row]),
+        )
+        project.status = PROJECT_STATUSES[arrays["project_status"][row]]
+        completes_at = int(arrays["project_completes_at"][row])
+        project.completes_at = None if completes_at < 0 else completes_at
+        projects.append(project)
+    for landlord, capital, delay, strategy in zip(model.landlords, arrays["landlord_capital"].tolist(),
+                                                  arrays["landlord_review_delay"].tolist(),
+                                                  meta["landlord_strategy"]):
+        landlord.capital = capital
+        landlord.review_delay = delay
+        landlord.strategy = strategy
+        landlord.projects = []
+    for project, active in zip(projects, arrays["project_active"].tolist()):
+        if active:
+            project.landlord.projects.append(project)
+    offsets = arrays["permit_queue_offsets"].tolist()
+    queued = arrays["permit_queue_projects"].tolist()
+    for i, municipality in enumerate(model.municipalities):
+        municipality.budget = float(arrays["municipality_budget"][i])
+        municipality.regulatory_flexibility = float(arrays["municipality_flexibility"][i])
+        municipality.district = int(arrays["municipality_district"][i])
+        municipality.permit_queue = [projects[k] for k in queued[offsets[i]:offsets[i + 1]]]
+    events = [
+        Event(time, seq, EVENT_KINDS[kind], model.landlords[landlord], None if project < 0 else projects[project])
+        for time, seq, kind, landlord, project in zip(
+            arrays["event_time"].tolist(), arrays["event_seq"].tolist(), arrays["event_kind"].tolist(),
+            arrays["event_landlord"].tolist(), arrays["event_project"].tolist(),
+        )
+    ]
+    model.events.restore(events, meta["next_event_seq"])
+    for due in model.due_events.values():
+        due.clear()
+
+    # 5) Counters, parameters and random generators.
+    model.steps = meta["steps"]
+    model.running = meta["running"]
+    for name, value in meta["parameters"].items():
+        setattr(model, name, value)
+    model.rng.bit_generator.state = meta["rng"]
+    version, internal, gauss = meta["random"]
+    model.random.setstate((version, tuple(internal), gauss))
+    return model
+
+
+def run_with_snapshots(model, n_steps, snapshot_every=None, snapshot_dir=None, compress=False):
+    """
+    Step ``model`` ``n_steps`` times, saving a snapshot every
+    ``snapshot_every`` steps to ``snapshot_dir/step_<steps>`` (or
+    ``step_<steps>.npz`` with ``compress``).
+
+    :return: Paths of the snapshots written.
+    """
+    paths = []
+    for _ in range(n_steps):
+        model.step()
+        if snapshot_every and model.steps % snapshot_every == 0:
+            name = f"step_{model.steps:05d}" + (".npz" if compress else "")
+            paths.append(save_snapshot(model, os.path.join(snapshot_dir, name), compress=compress))
+    return paths
+
+
+def replay(path, model_factory, n_steps, changes=None, snapshot_every=None, snapshot_dir=None):
+    """
+    Restart a run from a snapshot.
+
+    Without ``changes`` the replayed steps are identical to the original
+    run's, so a run can be inspected from any saved step. ``changes``
+    branches it: a dict of model attributes (e.g. ``{"mobility_rate":
+    0.1}``) or a function ``changes(model)`` that sets policies on the
+    restored model (municipality allocation, budgets, travel times...)
+    before stepping. Several branches can share one warm-up snapshot.
+
+    :param model_factory: Function returning a new ``MonterreyModel`` with
+        the original network, landlords and municipalities.
+    :return: The model after ``n_steps`` more steps.
+    """
+    model = load_snapshot(model_factory(), path)
+    if callable(changes):
+        changes(model)
+    elif changes:
+        for name, value in changes.items():
+            setattr(model, name, value)
+    run_with_snapshots(model, n_steps, snapshot_every, snapshot_dir)
+    return model
@@ -7,10 +7,9 @@ from mesa.datacollection import DataCollector
 
 
 def compute_gini(model):
-    agent_wealths = [agent.wealth for agent in model.agents]
-    x = sorted(agent_wealths)
+    x = np.sort(np.asarray(model.agents.get("wealth"), dtype=float))
     n = model.num_agents
-    B = sum(xi * (n - i) for i, xi in enumerate(x)) / (n * sum(x))
+    B = np.dot(x, n - np.arange(n)) / (n * x.sum())
     return 1 + (1 / n) - 2 * B
 
 
@@ -112,13 +111,18 @@ def lhs_parameter_sweep(
             this_params[dim_name] = val
         all_param_dicts.append(this_params)
 
+    # Independent seed per sample, spawned from random_seed (reusing
+    # random_seed for every model would give all samples the same stream).
+    sample_seeds = np.random.SeedSequence(random_seed).spawn(n_samples)
+
     results = []
     for idx, pset in enumerate(all_param_dicts):
         n_agents = pset["n"]
         w = pset["width"]
         h = pset["height"]
 
-        model = MoneyModelSpace(n=n_agents, width=w, height=h, seed=random_seed)
+        seed = int(sample_seeds[idx].generate_state(1)[0])
+        model = MoneyModelSpace(n=n_agents, width=w, height=h, seed=seed)
         model.run_model(n_steps)
 
         gini_series = model.datacollector.get_model_vars_dataframe()["Gini"]
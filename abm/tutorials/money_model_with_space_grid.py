@@ -1,11 +1,11 @@
 import mesa
+import numpy as np
 
 
 def compute_gini(model):
-    agent_wealths = [agent.wealth for agent in model.agents]
-    x = sorted(agent_wealths)
+    x = np.sort(np.asarray(model.agents.get("wealth"), dtype=float))
     n = model.num_agents
-    B = sum(xi * (n - i) for i, xi in enumerate(x)) / (n * sum(x))
+    B = np.dot(x, n - np.arange(n)) / (n * x.sum())
     return 1 + (1 / n) - 2 * B
 
 
@@ -2,7 +2,7 @@ import numpy as np
 import pandas as pd
 import os
 import matplotlib.pyplot as plt
-from model_v6 import HousingModel
+from model_v6 import HousingModel, MV_VARIABLES
 
 # Set up paths
 DIR_PATH = os.path.dirname(os.path.realpath(__file__))
@@ -24,32 +24,24 @@ sim_params = config["simulation_parameters"]
 houses = sim_params["houses_init"]
 sim_time = sim_params["sim_time"]
 time_step = sim_params["time_step"]
-time_steps = int(sim_time / time_step) + 1
 time_range = np.arange(0, sim_time + time_step, time_step)
 
-# Store simulation results
-results = {
-    "time": [],
-    "houses": [],
-}
+# Preallocate the results record (one row per time step)
+record = hm.allocate_record(len(time_range))
+houses_traj = np.empty(len(time_range))
 
 # Run simulation
-for time in time_range:
-    housesD, vars = hm.run_step(houses, time, time_step)
-    
-    # Store results
-    results["time"].append(time)
-    results["houses"].append(houses)
-    for key, value in vars.items():
-        if key not in results:
-            results[key] = []
-        results[key].append(value)
-    
+for i, time in enumerate(time_range):
+    houses_traj[i] = houses
+    housesD = hm.run_step_into(houses, time, time_step, record[i])
+
     # Update state
     houses += housesD * time_step
 
 # Convert to DataFrame
-df = pd.DataFrame(results)
+df = pd.DataFrame(hm.expand_record(time_range, houses_traj, record), columns=MV_VARIABLES)
+df.insert(0, "houses", houses_traj)
+df.insert(0, "time", time_range)
 
 # Save results to CSV
 output_file_name = f"baseline_sim_results_{config_file_name}.csv"
@@ -0,0 +1,91 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from model_graph import load_graph
+
+# Compiled kernels per worker process, keyed by (graph, outputs). Generated
+# kernels cannot be pickled, so each worker compiles its own once.
+_KERNELS = {}
+
+
+def _kernel(graph_name, outputs):
+    key = (graph_name, tuple(outputs))
+    if key not in _KERNELS:
+        _KERNELS[key] = load_graph(graph_name).compile(outputs, backend="numpy")
+    return _KERNELS[key]
+
+
+def _run_chunk(graph_name, outputs, configs, dtype=np.float64):
+    times, record, _ = _kernel(graph_name, outputs).run(configs, dtype=dtype)
+    return times, record
+
+
+class EnsembleRunner:
+    """
+    Run many variants of one config as a single batched simulation.
+
+    Each member is the base config with some ``model_policies`` (or other
+    section) values overridden. Members are simulated together with the
+    numpy backend of the model graph; with ``workers > 1`` the batch is split
+    into chunks that run in parallel processes. ``dtype=np.float32`` runs the
+    batch and stores its record in single precision (see
+    ``precision_report.py`` for the error this introduces).
+    """
+
+    def __init__(self, base_config: dict, outputs, graph_name="housing_v6", workers=1, chunk_size=None,
+                 dtype=np.float64):
+        self.base_config = base_config
+        self.dtype = np.dtype(dtype)
+        self.outputs = list(outputs)
+        self.graph_name = graph_name
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Shut down the worker pool, if one was started."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def build_configs(self, overrides, section="model_policies") -> list:
+        """One config per override dict; only the overridden section is copied."""
+        base_section = self.base_config[section]
+        return [{**self.base_config, section: {**base_section, **values}} for values in overrides]
+
+    def run(self, overrides, section="model_policies"):
+        """
+        Simulate one member per override dict.
+
+        :return: ``(times, record)`` with ``record`` of shape
+            (n_steps, n_outputs, n_members), members in input order.
+        """
+        return self.run_configs(self.build_configs(overrides, section))
+
+    def run_configs(self, configs):
+        """Simulate one member per full config dict; same return as ``run``."""
+        if self.workers <= 1 or len(configs) < 2:
+            return _run_chunk(self.graph_name, self.outputs, configs, self.dtype)
+
+        chunk_size = self.chunk_size or -(-len(configs) // self.workers)
+        chunks = [configs[i:i + chunk_size] for i in range(0, len(configs), chunk_size)]
+        if self._pool is None:
+            # Kept alive between calls so repeated batches (e.g. optimizer
+            # generations) reuse the workers and their compiled kernels.
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        n = len(chunks)
+        parts = list(self._pool.map(
+            _run_chunk, [self.graph_name] * n, [self.outputs] * n, chunks, [self.dtype] * n
+        ))
+        return parts[0][0], np.concatenate([record for _, record in parts], axis=-1)
+
+    def run_final(self, overrides, section="model_policies") -> np.ndarray:
+        """Output values at the last time step, shape (n_members, n_outputs)."""
+        _, record = self.run(overrides, section)
+        return record[-1].T
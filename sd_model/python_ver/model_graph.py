@@ -0,0 +1,462 @@
+import ast
+import heapq
+import os
+import numpy as np
+from utils.utils import Utils
+
+# Config sections reachable from equations as ``<alias>.<key>``.
+CONFIG_SECTIONS = {
+    "sim": "simulation_parameters",
+    "params": "model_parameters",
+    "pol": "model_policies",
+    "fp": "response_function_parameters",
+    "delays": "delays",
+}
+
+# Names every equation can use besides the model's own variables.
+BUILTINS = ("time", "dt")
+
+_u = Utils()
+
+# Response functions available in equations: name -> (scalar, vectorized).
+# The scalar versions are the ones model_v6 uses, so the scalar backend
+# reproduces it exactly.
+FUNCTIONS = {
+    "saturating": (_u.saturating_response, _u.saturating_response_array),
+    "logistic":   (_u.logistic, _u.logistic),
+    "power":      (_u.power_elasticity, _u.power_elasticity),
+    "exp_decay":  (_u.exp_decay, _u.exp_decay),
+    "exp_growth": (_u.exp_growth, _u.exp_growth),
+    "exp":        (np.exp, np.exp),
+    "max":        (max, np.maximum),
+    "min":        (min, np.minimum),
+}
+
+BACKENDS = ("scalar", "numpy")
+
+
+class _Equation:
+    """A parsed equation and the names it reads."""
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = str(source)
+        try:
+            self.tree = ast.parse(self.source, mode="eval")
+        except SyntaxError as exc:
+            raise ValueError(f"Invalid equation for '{name}': {self.source}") from exc
+        self.variables = set()
+        self.config_keys = set()
+        self.functions = set()
+        self._collect(self.tree.body)
+
+    def _collect(self, node):
+        if isinstance(node, ast.Attribute):
+            if not (isinstance(node.value, ast.Name) and node.value.id in CONFIG_SECTIONS):
+                raise ValueError(f"Unsupported attribute access in '{self.name}': {self.source}")
+            self.config_keys.add(f"{node.value.id}.{node.attr}")
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.keywords:
+                raise ValueError(f"Only plain positional function calls are allowed in '{self.name}': {self.source}")
+            self.functions.add(node.func.id)
+            for arg in node.args:
+                self._collect(arg)
+        elif isinstance(node, ast.Name):
+            self.variables.add(node.id)
+        else:
+            for child in ast.iter_child_nodes(node):
+                self._collect(child)
+
+
+class _Rename(ast.NodeTransformer):
+    """Rewrite equation names into the local names used by generated code."""
+
+    def __init__(self, local_name):
+        self.local_name = local_name
+
+    def visit_Attribute(self, node):
+        if isinstance(node.value, ast.Name) and node.value.id in CONFIG_SECTIONS:
+            return ast.copy_location(
+                ast.Name(id=_config_local(f"{node.value.id}.{node.attr}"), ctx=ast.Load()), node
+            )
+        return self.generic_visit(node)
+
+    def visit_Call(self, node):
+        node.args = [self.visit(arg) for arg in node.args]
+        node.func = ast.copy_location(ast.Name(id=f"f_{node.func.id}", ctx=ast.Load()), node.func)
+        return node
+
+    def visit_Name(self, node):
+        return ast.copy_location(ast.Name(id=self.local_name(node.id), ctx=node.ctx), node)
+
+
+def _config_local(key):
+    return "c_" + key.replace(".", "_")
+
+
+class ModelGraph:
+    """
+    Declarative stock-and-flow model.
+
+    A graph holds stocks (Euler-integrated levels), first-order delays,
+    auxiliaries (instantaneous equations) and constants. ``compile`` builds
+    the dependency DAG of one time step, orders it topologically, prunes
+    everything the requested outputs do not need and generates a kernel
+    that runs the whole simulation for the scalar or the numpy backend.
+
+    Graphs are built in Python with the ``add_*`` methods or loaded from a
+    dict / YAML file with the layout of ``config/graph/housing_v6.yaml``.
+    """
+
+    def __init__(self):
+        self.constants = {}
+        self.defaults = {}
+        self.stocks = {}      # name -> {"kind", "init", "rate" | "input"/"time", "output"}
+        self.auxiliaries = {}  # name -> _Equation
+        self.functions = dict(FUNCTIONS)
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_dict(cls, spec: dict) -> "ModelGraph":
+        graph = cls()
+        for name, value in (spec.get("constants") or {}).items():
+            graph.add_constant(name, value)
+        for key, value in (spec.get("defaults") or {}).items():
+            graph.add_default(key, value)
+        for name, s in (spec.get("stocks") or {}).items():
+            graph.add_stock(name, rate=s["rate"], init=s["init"], output=s.get("output"))
+        for name, d in (spec.get("delays") or {}).items():
+            graph.add_delay(name, input=d["input"], time=d["time"], init=d["init"], output=d.get("output"))
+        for name, equation in (spec.get("auxiliaries") or {}).items():
+            graph.add_auxiliary(name, equation)
+        return graph
+
+    @classmethod
+    def from_yaml(cls, file_path: str) -> "ModelGraph":
+        return cls.from_dict(Utils.load_yaml(file_path))
+
+    def add_constant(self, name, value):
+        self._check_new_name(name)
+        self.constants[name] = float(value)
+
+    def add_default(self, key, value):
+        """Fallback for config value ``key`` (e.g. ``"delays.pop_delay"``)."""
+        section = key.split(".", 1)[0]
+        if section not in CONFIG_SECTIONS or "." not in key:
+            raise ValueError(f"Default '{key}' must look like '<{'|'.join(CONFIG_SECTIONS)}>.<key>'")
+        self.defaults[key] = value
+
+    def add_function(self, name, scalar_fn, array_fn=None):
+        """Register a response function usable in equations."""
+        self.functions[name] = (scalar_fn, array_fn or scalar_fn)
+
+    def add_auxiliary(self, name, equation):
+        self._check_new_name(name)
+        self.auxiliaries[name] = _Equation(name, equation)
+
+    def add_stock(self, name, rate, init, output=None):
+        """Stock integrated as ``level += rate * dt``."""
+        self._add_level(name, "stock", init, output, rate=_Equation(name, rate))
+
+    def add_delay(self, name, input, time, init, output=None):
+        """First-order delay: ``level += (input - level) / time * dt``."""
+        self._add_level(
+            name, "delay", init, output,
+            input=_Equation(name, input), time=_Equation(name, time),
+        )
+
+    def _add_level(self, name, kind, init, output, **equations):
+        self._check_new_name(name)
+        if output is not None:
+            self._check_new_name(output)
+        self.stocks[name] = dict(
+            kind=kind, init=_Equation(name, init), output=output or f"{name}__next", **equations
+        )
+
+    def _check_new_name(self, name):
+        if not name.isidentifier() or name in BUILTINS or name in CONFIG_SECTIONS:
+            raise ValueError(f"Invalid variable name: '{name}'")
+        if name in self._all_names():
+            raise ValueError(f"Variable '{name}' is defined twice")
+
+    def _all_names(self):
+        names = set(self.constants) | set(self.auxiliaries) | set(self.stocks)
+        names |= {s["output"] for s in self.stocks.values()}
+        return names
+
+    # ------------------------------------------------------------------
+    # Dependency graph
+    # ------------------------------------------------------------------
+    def _nodes(self):
+        """Per-step equations in declaration order: node name -> (parsed equations, stock it advances)."""
+        nodes = {}
+        for name, eq in self.auxiliaries.items():
+            nodes[name] = ([eq], None)
+        for name, s in self.stocks.items():
+            equations = [s["rate"]] if s["kind"] == "stock" else [s["input"], s["time"]]
+            nodes[s["output"]] = (equations, name)
+        return nodes
+
+    def _node_dependencies(self, node):
+        equations, stock = node
+        deps = set()
+        for eq in equations:
+            deps |= eq.variables
+        if stock is not None:
+            deps.add(stock)
+        return deps - set(BUILTINS) - set(self.constants)
+
+    def validate(self):
+        """Check every name and function used in an equation is defined."""
+        known = self._all_names() | set(BUILTINS)
+        equations = [eq for eqs, _ in self._nodes().values() for eq in eqs]
+        equations += [s["init"] for s in self.stocks.values()]
+        for eq in equations:
+            missing = eq.variables - known
+            if missing:
+                raise ValueError(f"Equation for '{eq.name}' uses undefined names: {sorted(missing)}")
+            unknown = eq.functions - set(self.functions)
+            if unknown:
+                raise ValueError(f"Equation for '{eq.name}' uses unknown functions: {sorted(unknown)}")
+        for s in self.stocks.values():
+            init_deps = s["init"].variables - set(self.constants)
+            if init_deps:
+                raise ValueError(
+                    f"Initial value of '{s['init'].name}' may only use config values and constants, "
+                    f"got {sorted(init_deps)}"
+                )
+
+    def dependencies(self, name) -> set:
+        """All variables ``name`` depends on within one step (stocks are leaves)."""
+        nodes = self._nodes()
+        seen, stack = set(), [name]
+        while stack:
+            current = stack.pop()
+            for dep in (self._node_dependencies(nodes[current]) if current in nodes else ()):
+                if dep not in seen:
+                    seen.add(dep)
+                    stack.append(dep)
+        return seen
+
+    def required(self, outputs) -> set:
+        """Variables and stocks needed to compute ``outputs`` over a run."""
+        nodes = self._nodes()
+        needed, stack = set(), list(outputs)
+        while stack:
+            name = stack.pop()
+            if name in needed:
+                continue
+            if name not in nodes and name not in self.stocks:
+                raise KeyError(f"Unknown output variable: '{name}'")
+            needed.add(name)
+            if name in self.stocks:
+                # A stock that is read must also be advanced.
+                stack.append(self.stocks[name]["output"])
+            else:
+                stack.extend(self._node_dependencies(nodes[name]))
+        return needed
+
+    def evaluation_order(self, outputs=None) -> list:
+        """Topologically ordered per-step equations, pruned to ``outputs``."""
+        self.validate()
+        nodes = self._nodes()
+        names = list(nodes)
+        if outputs is not None:
+            needed = self.required(outputs)
+            names = [n for n in names if n in needed]
+        position = {name: i for i, name in enumerate(names)}
+        indegree = {name: 0 for name in names}
+        dependents = {name: [] for name in names}
+        for name in names:
+            for dep in self._node_dependencies(nodes[name]):
+                if dep in position:
+                    indegree[name] += 1
+                    dependents[dep].append(name)
+
+        # Kahn's algorithm, breaking ties by declaration order so the
+        # generated kernel is stable.
+        ready = [position[n] for n in names if indegree[n] == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            name = names[heapq.heappop(ready)]
+            order.append(name)
+            for dependent in dependents[name]:
+                indegree[dependent] -= 1
+                if indegree[dependent] == 0:
+                    heapq.heappush(ready, position[dependent])
+        if len(order) != len(names):
+            cyclic = sorted(n for n in names if indegree[n] > 0)
+            raise ValueError(f"Equations form a cycle through: {cyclic}")
+        return order
+
+    # ------------------------------------------------------------------
+    # Code generation
+    # ------------------------------------------------------------------
+    def compile(self, outputs, backend="scalar") -> "CompiledModel":
+        """
+        Generate a simulation kernel that records ``outputs`` every step.
+
+        :param outputs: Variable or stock names to record; a stock records
+            its level at the start of each step.
+        :param backend: ``"scalar"`` (one config, Python floats) or
+            ``"numpy"`` (a batch of configs, one array lane per member).
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+        outputs = list(outputs)
+        order = self.evaluation_order(outputs)
+        needed = self.required(outputs)
+        stocks = [name for name in self.stocks if name in needed]
+        nodes = self._nodes()
+        stock_of = {d["output"]: name for name, d in self.stocks.items()}
+
+        equations = [eq for name in order for eq in nodes[name][0]]
+        equations += [self.stocks[name]["init"] for name in stocks]
+        config_keys = sorted(set().union(*(eq.config_keys for eq in equations)))
+        functions = sorted(set().union(*(eq.functions for eq in equations)))
+
+        def local_name(name):
+            if name in self.stocks:
+                return f"s_{name}"
+            if name in self.constants or name in BUILTINS:
+                return name
+            return f"v_{name}"
+
+        def expr(eq):
+            tree = _Rename(local_name).visit(ast.parse(eq.source, mode="eval"))
+            return ast.unparse(ast.fix_missing_locations(tree))
+
+        lines = ["def init_state(cfg):"]
+        lines += [f"    {_config_local(k)} = cfg[{k!r}]" for k in config_keys]
+        lines.append("    return {")
+        lines += [f"        {name!r}: {expr(self.stocks[name]['init'])}," for name in stocks]
+        lines.append("    }")
+        lines.append("")
+
+        lines.append("def kernel(cfg, state, times, dt, out):")
+        lines += [f"    {_config_local(k)} = cfg[{k!r}]" for k in config_keys]
+        lines += [f"    s_{name} = state[{name!r}]" for name in stocks]
+        lines.append("    for step in range(len(times)):")
+        lines.append("        time = times[step]")
+        for name in order:
+            stock = stock_of.get(name)
+            if stock is None:
+                rhs = expr(self.auxiliaries[name])
+            elif self.stocks[stock]["kind"] == "stock":
+                rhs = f"s_{stock} + ({expr(self.stocks[stock]['rate'])}) * dt"
+            else:
+                d = self.stocks[stock]
+                rhs = f"s_{stock} + (({expr(d['input'])}) - s_{stock}) / ({expr(d['time'])}) * dt"
+            lines.append(f"        v_{name} = {rhs}")
+        for k, name in enumerate(outputs):
+            lines.append(f"        out[step, {k}] = {local_name(name)}")
+        for name in stocks:
+            lines.append(f"        s_{name} = v_{self.stocks[name]['output']}")
+        lines.append("    return {")
+        lines += [f"        {name!r}: s_{name}," for name in stocks]
+        lines.append("    }")
+        source = "\n".join(lines) + "\n"
+
+        column = 0 if backend == "scalar" else 1
+        namespace = dict(self.constants)
+        namespace.update({f"f_{fn}": self.functions[fn][column] for fn in functions})
+        exec(compile(source, f"<model_graph:{backend}>", "exec"), namespace)
+        return CompiledModel(
+            self, outputs, order, stocks, config_keys, backend, source,
+            namespace["init_state"], namespace["kernel"],
+        )
+
+
+class CompiledModel:
+    """A generated simulation kernel for a fixed set of outputs."""
+
+    def __init__(self, graph, outputs, order, stocks, config_keys, backend, source, init_fn, kernel_fn):
+        self.graph = graph
+        self.outputs = outputs
+        self.order = order
+        self.stocks = stocks
+        self.config_keys = config_keys
+        self.backend = backend
+        self.source = source
+        self._init_state = init_fn
+        self._kernel = kernel_fn
+
+    def config_values(self, config: dict) -> dict:
+        """Flatten ``config`` into the ``"<alias>.<key>"`` values the kernel reads."""
+        values = {}
+        for key in self.config_keys:
+            alias, name = key.split(".", 1)
+            section = config.get(CONFIG_SECTIONS[alias]) or {}
+            if name in section:
+                values[key] = section[name]
+            elif key in self.graph.defaults:
+                values[key] = self.graph.defaults[key]
+            else:
+                raise KeyError(f"Config value '{CONFIG_SECTIONS[alias]}.{name}' is missing and has no default")
+        return values
+
+    def batch_config_values(self, configs) -> dict:
+        """Stack config values across a batch; values shared by all members stay scalars."""
+        per_member = [self.config_values(c) for c in configs]
+        values = {}
+        for key in self.config_keys:
+            column = [v[key] for v in per_member]
+            if all(x == column[0] for x in column):
+                values[key] = column[0]
+            else:
+                values[key] = np.asarray(column, dtype=np.float64)
+        return values
+
+    @staticmethod
+    def time_range(config):
+        sim_p = config["simulation_parameters"]
+        return np.arange(0, sim_p["sim_time"] + sim_p["time_step"], sim_p["time_step"]), sim_p["time_step"]
+
+    def run(self, config, dtype=np.float64):
+        """
+        Simulate and record the outputs.
+
+        :param config: One config dict for the scalar backend, or a sequence
+            of config dicts sharing ``sim_time`` and ``time_step`` for the
+            numpy backend.
+        :param dtype: Float type of the numpy backend's state, arithmetic and
+            record. ``np.float32`` halves memory and bandwidth for very large
+            batches; initial stock levels are still computed in float64.
+        :return: ``(times, record, final_state)`` where ``record`` has shape
+            (n_steps, n_outputs) or (n_steps, n_outputs, n_members).
+        """
+        dtype = np.dtype(dtype)
+        if self.backend == "scalar":
+            if dtype != np.float64:
+                raise ValueError("The scalar backend only runs in float64")
+            times, dt = self.time_range(config)
+            cfg = self.config_values(config)
+            out = np.empty((len(times), len(self.outputs)), dtype=np.float64)
+            state = self._init_state(cfg)
+        else:
+            configs = list(config)
+            times, dt = self.time_range(configs[0])
+            for c in configs[1:]:
+                if self.time_range(c)[1] != dt or len(self.time_range(c)[0]) != len(times):
+                    raise ValueError("All configs in a batch must share sim_time and time_step")
+            cfg = self.batch_config_values(configs)
+            state = {
+                name: np.broadcast_to(np.asarray(value, dtype=dtype), (len(configs),)).copy()
+                for name, value in self._init_state(cfg).items()
+            }
+            # Cast every input to ``dtype`` so no float64 value silently
+            # promotes the per-step arithmetic back to double precision.
+            cfg = {key: np.asarray(value, dtype=dtype)[()] for key, value in cfg.items()}
+            times, dt = times.astype(dtype), dtype.type(dt)
+            out = np.empty((len(times), len(self.outputs), len(configs)), dtype=dtype)
+        final_state = self._kernel(cfg, state, times, dt, out)
+        return times, out, final_state
+
+
+def load_graph(name="housing_v6", graph_dir=None) -> ModelGraph:
+    """Load ``config/graph/<name>.yaml``."""
+    graph_dir = graph_dir or os.path.join(os.path.dirname(os.path.realpath(__file__)), "config", "graph")
+    return ModelGraph.from_yaml(os.path.join(graph_dir, f"{name}.yaml"))
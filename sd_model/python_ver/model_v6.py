@@ -1,6 +1,78 @@
 from utils.utils import Utils
 import numpy as np
 
+# Full set of model variables, in the column order of the old ``mv`` dict so
+# CSV outputs are unchanged.
+MV_VARIABLES = (
+    "population_target",
+    "households",
+    "houses_to_households_ratio",
+    "housing_scarcity",
+    "housing_slack",
+    "e_scar",
+    "e_slack",
+    "housing_cost_target",
+    "effect_of_financing_on_construction_rate",
+    "cost_ratio",
+    "private_investment_target",
+    "housing_cost",
+    "rent_cost",
+    "effect_of_taxes_on_construction_rate",
+    "effect_of_private_investment_on_base_construction_rate",
+    "population",
+    "compliance_rate",
+    "property_tax",
+    "public_funding",
+    "funding_for_services",
+    "funding_for_transportation",
+    "public_transportation_investment",
+    "private_transportation_investment",
+    "public_transportation_investment_in_billions",
+    "effect_pub",
+    "effect_priv",
+    "city_sprawl",
+    "base_prox",
+    "proximity_index",
+    "time_in_traffic",
+    "land_per_house",
+    "total_land_used_for_housing",
+    "fraction_of_total_occupied_land",
+    "available_land_for_housing",
+    "hh_per_km2",
+    "services_demand",
+    "services_supply",
+    "access_to_services",
+    "construction_rate_of_houses",
+    "construction_of_houses",
+    "housing_stock_increase",
+    "housing_stock_decrease",
+)
+MV_INDEX = {name: i for i, name in enumerate(MV_VARIABLES)}
+N_MV = len(MV_VARIABLES)
+
+# Variables the inner loop records, i.e. stock levels and values that depend
+# on the state at a point inside the step. ``run_step_into`` writes
+# ``CORE_VARIABLES[i]`` into slot ``i`` of its output row.
+CORE_VARIABLES = (
+    "households",
+    "cost_ratio",
+    "housing_cost",
+    "effect_of_taxes_on_construction_rate",
+    "effect_of_private_investment_on_base_construction_rate",
+    "population",
+    "city_sprawl",
+    "proximity_index",
+    "total_land_used_for_housing",
+    "housing_stock_increase",
+)
+CORE_INDEX = {name: i for i, name in enumerate(CORE_VARIABLES)}
+N_CORE = len(CORE_VARIABLES)
+
+# Diagnostics that are pure functions of time, houses, the core variables and
+# the config. Nothing in the loop feeds back on them, so they are computed
+# after the run, vectorized over whole trajectories (``derive_variables``).
+DERIVED_VARIABLES = tuple(name for name in MV_VARIABLES if name not in CORE_INDEX)
+
 class HousingModel:
 
     def __init__(self, config_yaml_path: str):
@@ -48,193 +120,261 @@ class HousingModel:
         # 8) Initialize land‐per‐house stock
         self.land_per_house_stock = params["initial_land_per_house"]
 
-    def calculate_model_variables(self, houses, time):
-        """Compute all the ‘instantaneous’ variables *except* geometry & sprawl."""
+    def allocate_record(self, n_steps: int) -> np.ndarray:
+        """Preallocate a (n_steps, N_CORE) slot array for ``run_step_into``."""
+        return np.empty((n_steps, N_CORE), dtype=np.float64)
+
+    def derive_variables(self, time, houses, record, names=None) -> dict:
+        """
+        Compute the derived diagnostics from stored trajectories.
+
+        Every argument holds one entry per step: ``time`` and ``houses`` are
+        1-D arrays and ``record`` is the (n_steps, N_CORE) array filled by
+        ``run_step_into``. The current config is used, so call this before
+        changing ``self.config``.
+
+        :param names: Optional subset of ``DERIVED_VARIABLES`` to return.
+        :return: Dict of 1-D arrays keyed by variable name.
+        """
         params = self.config["model_parameters"]
         pol    = self.config["model_policies"]
         fp     = self.config["response_function_parameters"]
-        mv     = {}
-
-        # Population (logistic)
+        u      = self.u
+        time   = np.asarray(time, dtype=np.float64)
+        houses = np.asarray(houses, dtype=np.float64)
+        core   = {name: record[:, i] for i, name in enumerate(CORE_VARIABLES)}
+        ones   = np.ones_like(houses)
+        dv     = {}
+
+        # Population & housing basics
         P0 = params["initial_pop"]
         r  = fp["pop_growth_rate"]
         K  = fp["pop_carrying_capacity"]
-        mv["population_target"] = K / (1 + ((K - P0) / P0) * np.exp(-r * time))
-
-        # Housing basics
-        mv["households"] = self.population_stock / params["avg_household_size"]
-        mv["houses_to_households_ratio"] = houses / mv["households"]
-        mv["housing_scarcity"] = max(0, 1 - mv["houses_to_households_ratio"])
-        mv["housing_slack"]   = max(0, mv["houses_to_households_ratio"] - 1)
+        dv["population_target"] = K / (1 + ((K - P0) / P0) * np.exp(-r * time))
+        ratio = dv["houses_to_households_ratio"] = houses / core["households"]
+        dv["housing_scarcity"] = np.maximum(0, 1 - ratio)
+        dv["housing_slack"]    = np.maximum(0, ratio - 1)
 
         # Housing cost response
-        mv["e_scar"] = self.u.saturating_response(mv["housing_scarcity"], fp["K_scarcity"])
-        mv["e_slack"] = self.u.saturating_response(mv["housing_slack"], fp["K_slack"])
-        delta = mv["e_scar"] - mv["e_slack"]
-        min_cost = 0.5 * params["initial_housing_cost"]
-        mv["housing_cost_target"] = max(min_cost, (1 + delta) * params["initial_housing_cost"])
+        dv["e_scar"]  = u.saturating_response_array(dv["housing_scarcity"], fp["K_scarcity"])
+        dv["e_slack"] = u.saturating_response_array(dv["housing_slack"], fp["K_slack"])
+        dv["housing_cost_target"] = np.maximum(
+            0.5 * params["initial_housing_cost"],
+            (1 + (dv["e_scar"] - dv["e_slack"])) * params["initial_housing_cost"],
+        )
+        dv["rent_cost"] = core["housing_cost"] * params["rent_to_housing_cost_ratio"]
 
         # Financing & private investment
-        mv["effect_of_financing_on_construction_rate"] = self.u.saturating_response(
+        dv["effect_of_financing_on_construction_rate"] = ones * u.saturating_response(
             pol["financial_availability"], fp["K_fin"]
         )
-        mv["cost_ratio"] = self.housing_cost_stock / params["initial_housing_cost"]
-        mv["private_investment_target"] = params["private_investment_base"] * self.u.power_elasticity(
-            mv["cost_ratio"], fp["inv_cost_sensitivity"]
+        dv["private_investment_target"] = params["private_investment_base"] * u.power_elasticity(
+            core["cost_ratio"], fp["inv_cost_sensitivity"]
         )
 
+        # Public funding & transportation
+        dv["compliance_rate"] = ones * u.logistic(
+            pol["engagement_with_stakeholders"], fp["k_eng"], fp["mid_eng"]
+        )
+        dv["property_tax"]   = pol["tax_rate"] * core["housing_cost"]
+        dv["public_funding"] = dv["compliance_rate"] * houses * dv["property_tax"]
+        frac_transport = pol["fraction_of_funding_for_transportation"]
+        dv["funding_for_services"]       = dv["public_funding"] * (1 - frac_transport)
+        dv["funding_for_transportation"] = dv["public_funding"] * frac_transport
+        frac_public = pol["fraction_of_investment_in_public_transportation"]
+        dv["public_transportation_investment"]  = dv["funding_for_transportation"] * frac_public
+        dv["private_transportation_investment"] = dv["funding_for_transportation"] * (1 - frac_public)
+        dv["public_transportation_investment_in_billions"] = dv["public_transportation_investment"] / 1e9
+        dv["effect_pub"]  = u.logistic(dv["public_transportation_investment_in_billions"], fp["k_pub"], fp["mid_pub"])
+        dv["effect_priv"] = 1 - u.saturating_response_array(dv["private_transportation_investment"], fp["K_priv"])
+
+        # Geometry
+        zoning = pol["zoning_and_regulation"]
+        prox   = core["proximity_index"]
+        dv["base_prox"]       = zoning * dv["effect_pub"] + (1 - zoning) * dv["effect_priv"]
+        dv["time_in_traffic"] = 1.0 / (prox + self.eps)
+        dv["land_per_house"]  = prox * fp["min_land_per_house"] + (1 - prox) * fp["max_land_per_house"]
+        total_land = core["total_land_used_for_housing"]
+        dv["fraction_of_total_occupied_land"] = total_land / params["total_land_area"]
+        dv["available_land_for_housing"]      = np.maximum(0.0, 1 - dv["fraction_of_total_occupied_land"])
+        dv["hh_per_km2"] = core["households"] / np.maximum(total_land, self.eps)
+
+        # Services access
+        dv["services_demand"] = u.saturating_response_array(dv["hh_per_km2"], fp["K_servd"])
+        dv["services_supply"] = u.saturating_response_array(dv["funding_for_services"], fp["K_serv"])
+        dv["access_to_services"] = np.minimum(dv["services_supply"] / (dv["services_demand"] + self.eps), 1.0)
+
+        # Construction & flows
+        base_rate = (
+            core["effect_of_private_investment_on_base_construction_rate"]
+            * params["base_construction_rate"]
+            * dv["effect_of_financing_on_construction_rate"]
+        )
+        dv["construction_rate_of_houses"] = np.minimum(
+            np.maximum(base_rate * (1.0 - core["effect_of_taxes_on_construction_rate"]), 0.0), 1.0
+        )
+        scarcity_factor = np.maximum(fp.get("min_scarcity_floor", 0.1), dv["housing_scarcity"])
+        dv["construction_of_houses"] = (
+            houses
+            * (1 + scarcity_factor)
+            * dv["construction_rate_of_houses"]
+            * dv["available_land_for_housing"]
+        )
+        dv["housing_stock_decrease"] = params["housing_demolition_rate"] * houses
 
-        return mv
+        if names is not None:
+            return {name: dv[name] for name in names}
+        return dv
 
-    def calculate_stock_derivatives(self, mv):
-        """Simple first‐order delay for housing increase."""
-        return self.housing_increase_stock - mv["housing_stock_decrease"]
+    def expand_record(self, time, houses, record) -> np.ndarray:
+        """Merge core and derived variables into a (n_steps, N_MV) array in ``MV_VARIABLES`` order."""
+        full = np.empty((record.shape[0], N_MV), dtype=np.float64)
+        for i, name in enumerate(CORE_VARIABLES):
+            full[:, MV_INDEX[name]] = record[:, i]
+        for name, values in self.derive_variables(time, houses, record).items():
+            full[:, MV_INDEX[name]] = values
+        return full
 
     def run_step(self, houses, time, dt):
-        
+        """Compatibility wrapper around ``run_step_into`` returning the full ``mv`` dict."""
+        row = np.empty((1, N_CORE), dtype=np.float64)
+        housesD = self.run_step_into(houses, time, dt, row[0])
+        full = self.expand_record(np.array([time]), np.array([houses]), row)[0]
+        return housesD, {name: full[i] for i, name in enumerate(MV_VARIABLES)}
+
+    def run_step_into(self, houses, time, dt, out):
+        """
+        Advance the stocks by one step and write the core variables into ``out``.
+
+        ``out`` is a preallocated 1-D float array of length ``N_CORE`` (usually
+        a row of ``allocate_record``); slot ``CORE_INDEX[name]`` holds variable
+        ``name``. Only the work needed to advance the state is done here; the
+        remaining diagnostics come from ``derive_variables`` after the run.
+
+        :return: Derivative of the houses stock.
+        """
         pol    = self.config["model_policies"]
         params = self.config["model_parameters"]
         fp     = self.config["response_function_parameters"]
-        
+        u      = self.u
+        ix     = CORE_INDEX
+
         # 1) Instantaneous variables
-        mv = self.calculate_model_variables(houses, time)
+        P0 = params["initial_pop"]
+        r  = fp["pop_growth_rate"]
+        K  = fp["pop_carrying_capacity"]
+        population_target = K / (1 + ((K - P0) / P0) * np.exp(-r * time))
 
-        # 2) Update housing cost stock (first‐order delay) and rent_cost
+        out[ix["households"]] = households = self.population_stock / params["avg_household_size"]
+        ratio = houses / households
+        housing_scarcity = max(0, 1 - ratio)
+        housing_slack = max(0, ratio - 1)
+
+        e_scar = u.saturating_response(housing_scarcity, fp["K_scarcity"])
+        e_slack = u.saturating_response(housing_slack, fp["K_slack"])
+        min_cost = 0.5 * params["initial_housing_cost"]
+        housing_cost_target = max(min_cost, (1 + (e_scar - e_slack)) * params["initial_housing_cost"])
+
+        fin_eff = u.saturating_response(pol["financial_availability"], fp["K_fin"])
+        out[ix["cost_ratio"]] = cost_ratio = self.housing_cost_stock / params["initial_housing_cost"]
+        private_investment_target = (
+            params["private_investment_base"] * u.power_elasticity(cost_ratio, fp["inv_cost_sensitivity"])
+        )
+
+        # 2) Update housing cost stock (first‐order delay)
         self.housing_cost_stock += (
-            mv["housing_cost_target"] - self.housing_cost_stock
+            housing_cost_target - self.housing_cost_stock
         ) / self.housing_cost_delay * dt
-        mv["housing_cost"] = self.housing_cost_stock
-        mv["rent_cost"] = self.housing_cost_stock * params["rent_to_housing_cost_ratio"]
+        out[ix["housing_cost"]] = housing_cost = self.housing_cost_stock
 
         # 3) Tax & investment delays
-        inst_tax_eff = self.u.saturating_response(pol["tax_rate"], fp["K_tax"])
-        inst_inv_eff = self.u.saturating_response(
-            mv["private_investment_target"], fp["K_inv"]
-        )
+        inst_tax_eff = u.saturating_response(pol["tax_rate"], fp["K_tax"])
+        inst_inv_eff = u.saturating_response(private_investment_target, fp["K_inv"])
         self.tax_effect_stock += (inst_tax_eff - self.tax_effect_stock) / self.tax_delay * dt
         self.inv_effect_stock += (inst_inv_eff - self.inv_effect_stock) / self.inv_delay * dt
 
-        mv["effect_of_taxes_on_construction_rate"]            = self.tax_effect_stock
-        mv["effect_of_private_investment_on_base_construction_rate"] = self.inv_effect_stock
+        out[ix["effect_of_taxes_on_construction_rate"]] = tax_eff = self.tax_effect_stock
+        out[ix["effect_of_private_investment_on_base_construction_rate"]] = inv_eff = self.inv_effect_stock
 
         # 4) Population stock update:
         #    a) first order toward logistic target
-        pop_flow_in = (mv["population_target"] - self.population_stock) / self.pop_delay
+        pop_flow_in = (population_target - self.population_stock) / self.pop_delay
         #    b) emigration if cost > initial
-       
         cost_over = max(0, (self.housing_cost_stock / params["initial_housing_cost"]) - 1)
         pop_flow_out = fp["pop_emigration_sensitivity"] * cost_over * self.population_stock
         #    c) net change
         self.population_stock += (pop_flow_in - pop_flow_out) * dt
-        mv["population"] = self.population_stock
-        
-        # 5) Stakeholder compliance → public funding
-        
-        mv["compliance_rate"] = self.u.logistic(
-            pol["engagement_with_stakeholders"], fp["k_eng"], fp["mid_eng"]
-        )
-        
-        mv["property_tax"] = pol["tax_rate"] * mv["housing_cost"]
-        
-        mv["public_funding"] = (
-            mv["compliance_rate"]
-            * houses
-            * mv["property_tax"]
-        )
-        mv["funding_for_services"]      = mv["public_funding"] * (1 - pol["fraction_of_funding_for_transportation"])
-        mv["funding_for_transportation"] = mv["public_funding"] * pol["fraction_of_funding_for_transportation"]
+        out[ix["population"]] = self.population_stock
 
-        # Transportation investments
-        mv["public_transportation_investment"]  = mv["funding_for_transportation"] * pol["fraction_of_investment_in_public_transportation"]
-        mv["private_transportation_investment"] = mv["funding_for_transportation"] * (1 - pol["fraction_of_investment_in_public_transportation"])
-        mv["public_transportation_investment_in_billions"] = mv["public_transportation_investment"] / 1e9
-        # Raw transport effects
-        mv["effect_pub"]  = self.u.logistic(mv["public_transportation_investment_in_billions"], fp["k_pub"], fp["mid_pub"])
-        mv["effect_priv"] = 1 - self.u.saturating_response(mv["private_transportation_investment"], fp["K_priv"])
+        # 5) Stakeholder compliance → public funding → transportation
+        compliance_rate = u.logistic(pol["engagement_with_stakeholders"], fp["k_eng"], fp["mid_eng"])
+        property_tax = pol["tax_rate"] * housing_cost
+        public_funding = compliance_rate * houses * property_tax
+        funding_for_transportation = public_funding * pol["fraction_of_funding_for_transportation"]
+        frac_public = pol["fraction_of_investment_in_public_transportation"]
+        public_inv = funding_for_transportation * frac_public
+        private_inv = funding_for_transportation * (1 - frac_public)
+        effect_pub = u.logistic(public_inv / 1e9, fp["k_pub"], fp["mid_pub"])
+        effect_priv = 1 - u.saturating_response(private_inv, fp["K_priv"])
 
-
-        # 5) Geometry & sprawl‐stock update
+        # 6) Geometry & sprawl‐stock update
 
         # a) Desired sprawl from current households & land per house stock
-        hh    = mv["households"]
-        hhpkm2 = hh / max(self.land_per_house_stock * houses, self.eps)
+        hhpkm2 = households / max(self.land_per_house_stock * houses, self.eps)
         desired_sprawl = fp["dense_city_density"] / max(hhpkm2, self.eps) # The sprawl that our stock should aim for
 
         # b) Sprawl as a stock
         self.sprawl_stock += (desired_sprawl - self.sprawl_stock) / self.sprawl_delay * dt
-        mv["city_sprawl"] = self.sprawl_stock
+        out[ix["city_sprawl"]] = self.sprawl_stock
 
         # c) Proximity, penalized by sprawl
-        mv["base_prox"] = pol["zoning_and_regulation"] * mv["effect_pub"] + (1 - pol["zoning_and_regulation"]) * mv["effect_priv"]
+        zoning    = pol["zoning_and_regulation"]
+        base_prox = zoning * effect_pub + (1 - zoning) * effect_priv
         max_sp    = fp.get("max_expected_sprawl", 50.0)
         norm_sp   = min(self.sprawl_stock / max_sp, 1.0)
         alpha     = fp.get("sprawl_penalty_sensitivity", 0.5)
 
-        inst_prox = max(0.01, mv["base_prox"] * (1 - (alpha * norm_sp)))
-        mv["proximity_index"] = inst_prox
-        mv["time_in_traffic"] = 1.0 / (inst_prox + self.eps)
-        
+        inst_prox = max(0.01, base_prox * (1 - (alpha * norm_sp)))
+        out[ix["proximity_index"]] = inst_prox
+
         # d) Instantaneous land_per_house from proximity
         inst_lph = inst_prox * fp["min_land_per_house"] \
                 + (1 - inst_prox) * fp["max_land_per_house"]
-        mv["land_per_house"] = inst_lph
-        
+
         # e) Now *delay* your land stock toward that
         self.land_per_house_stock += (inst_lph - self.land_per_house_stock) \
                                     / self.land_delay * dt
 
-        # f) Use the *updated* land_per_house_stock for everything else
-        mv["total_land_used_for_housing"]    = self.land_per_house_stock * houses
-        mv["fraction_of_total_occupied_land"] = mv["total_land_used_for_housing"] / params["total_land_area"]
-        mv["available_land_for_housing"]     = max(0.0, 1 - mv["fraction_of_total_occupied_land"])
-        mv["hh_per_km2"]                     = mv["households"] / max(mv["total_land_used_for_housing"], self.eps)
-
-
-        # g) Services access
-        mv["services_demand"] = self.u.saturating_response(mv["hh_per_km2"], fp["K_servd"])
-        mv["services_supply"] = self.u.saturating_response(mv["funding_for_services"], fp["K_serv"])
-        mv["access_to_services"] = min(mv["services_supply"] / (mv["services_demand"] + self.eps), 1.0)
+        # f) Use the *updated* land_per_house_stock for available land
+        out[ix["total_land_used_for_housing"]] = total_land = self.land_per_house_stock * houses
+        available_land = max(0.0, 1 - total_land / params["total_land_area"])
 
-        # 6) Construction & flows
+        # 7) Construction & flows
 
-        # 6a) Compute the base (pre-tax) construction **rate** [0,1]:
-        base_rate = (
-            mv["effect_of_private_investment_on_base_construction_rate"]
-            * params["base_construction_rate"]
-            * mv["effect_of_financing_on_construction_rate"]
-        )
+        # 7a) Compute the base (pre-tax) construction **rate** [0,1]:
+        base_rate = inv_eff * params["base_construction_rate"] * fin_eff
 
-        # 6b) Compute a tax *multiplier* so that higher taxes → lower rate:
+        # 7b) Compute a tax *multiplier* so that higher taxes → lower rate:
         #     tax_eff ∈ [0,1] → tax_mul ∈ [1,0]
-        tax_eff       = mv["effect_of_taxes_on_construction_rate"]
         tax_multiplier = 1.0 - tax_eff
 
-        # 6c) Apply tax multiplier, clamp to [0,1]:
-        mv["construction_rate_of_houses"] = base_rate * tax_multiplier
-        mv["construction_rate_of_houses"] = min(max(mv["construction_rate_of_houses"], 0.0), 1.0)
+        # 7c) Apply tax multiplier, clamp to [0,1]:
+        construction_rate = min(max(base_rate * tax_multiplier, 0.0), 1.0)
 
-        # 6d) Prevent scarcity from zeroing out construction:
+        # 7d) Prevent scarcity from zeroing out construction:
         #     pick a small floor (e.g. 0.1) so that even at zero scarcity
         #     you still get 10% of the capacity.
         min_scar = fp.get("min_scarcity_floor", 0.1)
-        scarcity_factor = max(min_scar, mv["housing_scarcity"])
+        scarcity_factor = max(min_scar, housing_scarcity)
 
-        # 6e) Finally compute flow of new houses:
-        mv["construction_of_houses"] = (
-            houses
-            * (1 + scarcity_factor)
-            * mv["construction_rate_of_houses"]
-            * mv["available_land_for_housing"]
-        )
+        # 7e) Finally compute flow of new houses:
+        construction = houses * (1 + scarcity_factor) * construction_rate * available_land
 
-        # 7) Housing-increase delay
+        # 8) Housing-increase delay
         self.housing_increase_stock += (
-            mv["construction_of_houses"] - self.housing_increase_stock
+            construction - self.housing_increase_stock
         ) / self.housing_delay * dt
-        mv["housing_stock_increase"] = self.housing_increase_stock
-
-        # 8) Demolition & derivative
-        mv["housing_stock_decrease"] = params["housing_demolition_rate"] * houses
-        housesD = self.calculate_stock_derivatives(mv)
+        out[ix["housing_stock_increase"]] = self.housing_increase_stock
 
-        return housesD, mv
+        # 9) Demolition & derivative
+        return self.housing_increase_stock - params["housing_demolition_rate"] * houses
@@ -0,0 +1,241 @@
+import os
+import numpy as np
+import pandas as pd
+from utils.utils import Utils
+from ensemble import EnsembleRunner
+
+# Search space of the six ``model_policies`` levers: (low, high).
+DEFAULT_POLICY_BOUNDS = {
+    "financial_availability": (0.0, 1.0),
+    "tax_rate": (0.0, 0.01),
+    "fraction_of_funding_for_transportation": (0.0, 1.0),
+    "zoning_and_regulation": (0.0, 1.0),
+    "fraction_of_investment_in_public_transportation": (0.0, 1.0),
+    "engagement_with_stakeholders": (0.0, 1.0),
+}
+
+# Objectives on the final time step: (output, "min" | "max").
+DEFAULT_OBJECTIVES = (
+    ("housing_cost", "min"),
+    ("time_in_traffic", "min"),
+    ("access_to_services", "max"),
+    ("city_sprawl", "min"),
+)
+
+
+def dominance_matrix(F, violation, chunk_size=1024):
+    """
+    ``D[i, j]`` is True when solution ``i`` constrained-dominates ``j``.
+
+    Feasible solutions (``violation <= 0``) dominate infeasible ones, and
+    infeasible ones are ordered by total violation; among feasible ones the
+    usual Pareto dominance on the (minimized) objectives ``F`` applies.
+    """
+    n = F.shape[0]
+    feasible = violation <= 0
+    D = np.empty((n, n), dtype=bool)
+    for start in range(0, n, chunk_size):
+        rows = slice(start, min(start + chunk_size, n))
+        a = F[rows, None, :]
+        pareto = (a <= F[None, :, :]).all(-1) & (a < F[None, :, :]).any(-1)
+        both_feasible = feasible[rows, None] & feasible[None, :]
+        D[rows] = np.where(both_feasible, pareto, violation[rows, None] < violation[None, :])
+    return D
+
+
+def non_dominated_sort(F, violation):
+    """Front index of each solution (0 = non-dominated)."""
+    D = dominance_matrix(F, violation)
+    dominated_by = D.sum(axis=0)
+    rank = np.full(F.shape[0], -1)
+    front = 0
+    current = np.flatnonzero(dominated_by == 0)
+    while current.size:
+        rank[current] = front
+        dominated_by -= D[current].sum(axis=0)
+        dominated_by[rank >= 0] = -1
+        current = np.flatnonzero(dominated_by == 0)
+        front += 1
+    return rank
+
+
+def crowding_distance(F, rank):
+    """Crowding distance of each solution within its front."""
+    distance = np.zeros(F.shape[0])
+    for front in np.unique(rank):
+        members = np.flatnonzero(rank == front)
+        if members.size <= 2:
+            distance[members] = np.inf
+            continue
+        for m in range(F.shape[1]):
+            values = F[members, m]
+            order = np.argsort(values, kind="stable")
+            span = values[order[-1]] - values[order[0]]
+            distance[members[order[[0, -1]]]] = np.inf
+            if span > 0:
+                gaps = (values[order[2:]] - values[order[:-2]]) / span
+                distance[members[order[1:-1]]] += gaps
+    return distance
+
+
+class PolicyOptimizer:
+    """
+    NSGA-II search over the ``model_policies`` levers.
+
+    Every generation (offspring included) is evaluated as one batched
+    ensemble run, so thousands of candidates per generation cost a handful of
+    vectorized simulations spread over ``workers`` processes.
+    """
+
+    def __init__(
+        self,
+        config_file_path,
+        bounds=None,
+        objectives=DEFAULT_OBJECTIVES,
+        constraints=(),
+        pop_size=200,
+        workers=1,
+        crossover_eta=15.0,
+        mutation_eta=20.0,
+        crossover_prob=0.9,
+        seed=None,
+        dtype=np.float64,
+    ):
+        """
+        :param config_file_path: Base scenario; levers not searched keep its values.
+        :param bounds: ``{lever: (low, high)}``; defaults to ``DEFAULT_POLICY_BOUNDS``.
+        :param objectives: Sequence of ``(output, "min" | "max")`` on the final step.
+        :param constraints: Callables taking ``{lever: array}`` for the whole
+            population and returning an array of violations (> 0 is infeasible).
+        :param dtype: Precision of the ensemble runs (``np.float32`` for very large populations).
+        """
+        self.config = Utils.load_yaml(config_file_path)
+        self.bounds = dict(bounds or DEFAULT_POLICY_BOUNDS)
+        self.levers = list(self.bounds)
+        self.low = np.array([self.bounds[k][0] for k in self.levers], dtype=float)
+        self.high = np.array([self.bounds[k][1] for k in self.levers], dtype=float)
+        self.objectives = list(objectives)
+        for output, sense in self.objectives:
+            if sense not in ("min", "max"):
+                raise ValueError(f"Objective sense for '{output}' must be 'min' or 'max', got '{sense}'")
+        self.sign = np.array([1.0 if sense == "min" else -1.0 for _, sense in self.objectives])
+        self.constraints = list(constraints)
+        self.pop_size = pop_size + pop_size % 2
+        self.crossover_eta = crossover_eta
+        self.mutation_eta = mutation_eta
+        self.crossover_prob = crossover_prob
+        self.rng = np.random.default_rng(seed)
+        self.ensemble = EnsembleRunner(
+            self.config, [output for output, _ in self.objectives], workers=workers, dtype=dtype
+        )
+
+    # ------------------------------------------------------------------
+    # Evaluation
+    # ------------------------------------------------------------------
+    def evaluate(self, X):
+        """Objective values (as in ``objectives``) and constraint violation for each row of ``X``."""
+        overrides = [dict(zip(self.levers, row)) for row in X.tolist()]
+        values = self.ensemble.run_final(overrides).astype(np.float64)
+        columns = {lever: X[:, i] for i, lever in enumerate(self.levers)}
+        violation = np.zeros(X.shape[0])
+        for constraint in self.constraints:
+            violation += np.maximum(np.asarray(constraint(columns), dtype=float), 0.0)
+        return values, violation
+
+    # ------------------------------------------------------------------
+    # Variation operators
+    # ------------------------------------------------------------------
+    def _tournament(self, rank, crowding, n):
+        a = self.rng.integers(0, rank.size, n)
+        b = self.rng.integers(0, rank.size, n)
+        a_wins = (rank[a] < rank[b]) | ((rank[a] == rank[b]) & (crowding[a] > crowding[b]))
+        return np.where(a_wins, a, b)
+
+    def _sbx(self, p1, p2):
+        """Simulated binary crossover, one random beta per gene."""
+        u = self.rng.random(p1.shape)
+        beta = np.where(
+            u <= 0.5,
+            (2 * u) ** (1 / (self.crossover_eta + 1)),
+            (1 / (2 * (1 - u))) ** (1 / (self.crossover_eta + 1)),
+        )
+        c1 = 0.5 * ((1 + beta) * p1 + (1 - beta) * p2)
+        c2 = 0.5 * ((1 - beta) * p1 + (1 + beta) * p2)
+        skip = (self.rng.random(p1.shape[0]) > self.crossover_prob)[:, None] | (self.rng.random(p1.shape) > 0.5)
+        return np.where(skip, p1, c1), np.where(skip, p2, c2)
+
+    def _mutate(self, X):
+        """Polynomial mutation with probability 1 / n_levers per gene."""
+        span = self.high - self.low
+        u = self.rng.random(X.shape)
+        delta = np.where(
+            u < 0.5,
+            (2 * u) ** (1 / (self.mutation_eta + 1)) - 1,
+            1 - (2 * (1 - u)) ** (1 / (self.mutation_eta + 1)),
+        )
+        mutate = self.rng.random(X.shape) < 1.0 / len(self.levers)
+        return np.where(mutate, X + delta * span, X)
+
+    def _offspring(self, X, rank, crowding):
+        parents = self._tournament(rank, crowding, self.pop_size)
+        p1, p2 = X[parents[0::2]], X[parents[1::2]]
+        c1, c2 = self._sbx(p1, p2)
+        children = self._mutate(np.vstack([c1, c2]))
+        return np.clip(children, self.low, self.high)
+
+    # ------------------------------------------------------------------
+    # Main loop
+    # ------------------------------------------------------------------
+    def _select(self, F, violation):
+        rank = non_dominated_sort(F, violation)
+        crowding = crowding_distance(F, rank)
+        keep = np.lexsort((-crowding, rank))[:self.pop_size]
+        return keep, rank[keep], crowding[keep]
+
+    def run(self, n_generations=50, verbose=False):
+        """
+        Evolve the population and return the final Pareto front.
+
+        :return: DataFrame with one row per non-dominated, feasible policy:
+            the lever values followed by the objective values.
+        """
+        # The ensemble's worker pool is shut down even if a generation fails.
+        with self.ensemble:
+            X = self.low + self.rng.random((self.pop_size, len(self.levers))) * (self.high - self.low)
+            values, violation = self.evaluate(X)
+            keep, rank, crowding = self._select(values * self.sign, violation)
+            X, values, violation = X[keep], values[keep], violation[keep]
+
+            for generation in range(n_generations):
+                children = self._offspring(X, rank, crowding)
+                child_values, child_violation = self.evaluate(children)
+                X = np.vstack([X, children])
+                values = np.vstack([values, child_values])
+                violation = np.concatenate([violation, child_violation])
+                keep, rank, crowding = self._select(values * self.sign, violation)
+                X, values, violation = X[keep], values[keep], violation[keep]
+                if verbose:
+                    print(f"generation {generation + 1}/{n_generations}: "
+                          f"{int((rank == 0).sum())} solutions on the first front")
+
+        front = (rank == 0) & (violation <= 0)
+        df = pd.DataFrame(X[front], columns=self.levers)
+        for i, (output, _) in enumerate(self.objectives):
+            df[output] = values[front, i]
+        return df.sort_values(self.objectives[0][0]).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+    RESULTS_DIR_PATH = os.path.join(DIR_PATH, "output", "optimization_results")
+
+    optimizer = PolicyOptimizer(
+        os.path.join(DIR_PATH, "config", "baseline_mty.yaml"),
+        pop_size=400,
+        workers=os.cpu_count(),
+        seed=42,
+    )
+    pareto = optimizer.run(n_generations=40, verbose=True)
+    os.makedirs(RESULTS_DIR_PATH, exist_ok=True)
+    pareto.to_csv(os.path.join(RESULTS_DIR_PATH, "pareto_front_baseline_mty.csv"), index=False)
+    print(pareto)
@@ -0,0 +1,68 @@
+import os
+import numpy as np
+import pandas as pd
+from utils.utils import Utils
+from model_graph import load_graph
+from model_v6 import MV_VARIABLES
+
+# Set up paths
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+CONFIG_DIR_PATH = os.path.join(DIR_PATH, "config")
+REPORT_DIR_PATH = os.path.join(DIR_PATH, "output", "precision_report")
+
+REFERENCE_SCENARIOS = (
+    "baseline_mty",
+    "efficient_mty",
+    "proximate_mty",
+    "reconceived_mty",
+    "well_financed_mty",
+)
+
+
+def precision_report(scenarios=REFERENCE_SCENARIOS, outputs=None, rel_tolerance=1e-3, config_dir=CONFIG_DIR_PATH):
+    """
+    Compare float32 ensemble runs against float64 on the reference scenarios.
+
+    Relative errors are taken against the largest magnitude each variable
+    reaches in the float64 run, so variables that cross zero do not blow up
+    the metric.
+
+    :return: DataFrame with one row per (scenario, variable): the max
+        absolute error, max relative error over the trajectory, relative error
+        at the final step and whether the max relative error is within
+        ``rel_tolerance``.
+    """
+    outputs = list(outputs or ("houses",) + MV_VARIABLES)
+    configs = [Utils.load_yaml(os.path.join(config_dir, f"{name}.yaml")) for name in scenarios]
+    kernel = load_graph().compile(outputs, backend="numpy")
+    _, ref, _ = kernel.run(configs, dtype=np.float64)
+    _, low, _ = kernel.run(configs, dtype=np.float32)
+
+    abs_err = np.abs(low.astype(np.float64) - ref)
+    scale = np.abs(ref).max(axis=0)
+    scale = np.where(scale > 0, scale, 1.0)
+    rel_err = abs_err / scale
+
+    rows = []
+    for j, scenario in enumerate(scenarios):
+        for k, name in enumerate(outputs):
+            rows.append({
+                "scenario": scenario,
+                "variable": name,
+                "max_abs_error": abs_err[:, k, j].max(),
+                "max_rel_error": rel_err[:, k, j].max(),
+                "final_rel_error": rel_err[-1, k, j],
+                "within_tolerance": rel_err[:, k, j].max() <= rel_tolerance,
+            })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    report = precision_report()
+    os.makedirs(REPORT_DIR_PATH, exist_ok=True)
+    report.to_csv(os.path.join(REPORT_DIR_PATH, "float32_vs_float64.csv"), index=False)
+
+    worst = report.sort_values("max_rel_error", ascending=False).head(10)
+    print(worst.to_string(index=False))
+    n_bad = int((~report["within_tolerance"]).sum())
+    print(f"\n{len(report) - n_bad}/{len(report)} scenario variables within tolerance")
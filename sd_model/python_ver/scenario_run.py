@@ -1,7 +1,7 @@
 import numpy as np
 import pandas as pd
 import os
-from model_v6 import HousingModel
+from model_v6 import HousingModel, MV_VARIABLES
 
 class ScenarioRunner:
     def __init__(self, config_file_name, base_dir=None):
@@ -22,22 +22,18 @@ class ScenarioRunner:
         time_step = self.sim_params["time_step"]
         time_range = np.arange(0, sim_time + time_step, time_step)
 
-        results = {
-            "time": [],
-            "houses": [],
-        }
+        n_steps = len(time_range)
+        record = self.hm.allocate_record(n_steps)
+        houses_traj = np.empty(n_steps)
 
-        for time in time_range:
-            housesD, vars = self.hm.run_step(houses, time, time_step)
-            results["time"].append(time)
-            results["houses"].append(houses)
-            for key, value in vars.items():
-                if key not in results:
-                    results[key] = []
-                results[key].append(value)
+        for i, time in enumerate(time_range):
+            houses_traj[i] = houses
+            housesD = self.hm.run_step_into(houses, time, time_step, record[i])
             houses += housesD * time_step
 
-        df = pd.DataFrame(results)
+        df = pd.DataFrame(self.hm.expand_record(time_range, houses_traj, record), columns=MV_VARIABLES)
+        df.insert(0, "houses", houses_traj)
+        df.insert(0, "time", time_range)
         output_file_name = f"scenario_sim_results_{self.config_file_name}.csv"
         output_file_path = os.path.join(self.results_dir, output_file_name)
         os.makedirs(self.results_dir, exist_ok=True)
@@ -0,0 +1,338 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy import linalg, optimize, stats
+from scipy.stats import qmc
+from utils.utils import Utils
+from ensemble import EnsembleRunner
+from policy_optimizer import DEFAULT_OBJECTIVES, DEFAULT_POLICY_BOUNDS
+
+# Trajectories emulated by default: the policy optimizer's objectives.
+DEFAULT_OUTPUTS = tuple(output for output, _ in DEFAULT_OBJECTIVES)
+
+
+def override_configs(base_config, names, X):
+    """
+    One config per row of ``X``.
+
+    :param names: Input names: a ``model_policies`` lever (``"tax_rate"``)
+        or ``"<section>.<key>"`` for any other section
+        (``"model_parameters.base_construction_rate"``).
+    """
+    keys = [name.split(".", 1) if "." in name else ("model_policies", name) for name in names]
+    configs = []
+    for row in np.asarray(X, dtype=float).tolist():
+        config = dict(base_config)
+        for section in {section for section, _ in keys}:
+            config[section] = dict(base_config[section])
+        for (section, key), value in zip(keys, row):
+            config[section][key] = value
+        configs.append(config)
+    return configs
+
+
+class GaussianProcess:
+    """
+    Gaussian process regression of several output columns on shared inputs.
+
+    All columns share one anisotropic squared-exponential correlation
+    (a length scale per input) and nugget, fitted by maximizing the summed
+    marginal likelihood; each column has its own signal variance, which is
+    profiled out. Inputs are expected in the unit cube.
+    """
+
+    def __init__(self, n_restarts=4, seed=None):
+        self.n_restarts = n_restarts
+        self.rng = np.random.default_rng(seed)
+
+    def correlation(self, A, B):
+        d = (A[:, None, :] - B[None, :, :]) / self.length_scales
+        return np.exp(-0.5 * np.einsum("ijk,ijk->ij", d, d))
+
+    def _factor(self, X, log_theta):
+        self.length_scales = np.exp(log_theta[:-1])
+        R = self.correlation(X, X)
+        R[np.diag_indices_from(R)] += np.exp(log_theta[-1])
+        return linalg.cho_factor(R, lower=True)
+
+    def _neg_log_likelihood(self, log_theta, X, Y):
+        try:
+            factor = self._factor(X, log_theta)
+        except linalg.LinAlgError:
+            return np.inf
+        n = X.shape[0]
+        quad = np.einsum("ij,ij->j", Y, linalg.cho_solve(factor, Y))
+        log_det = 2.0 * np.log(np.diag(factor[0])).sum()
+        return 0.5 * n * np.log(np.maximum(quad, 1e-300) / n).sum() + 0.5 * Y.shape[1] * log_det
+
+    def fit(self, X, Y):
+        """
+        :param X: (n, d) inputs in [0, 1].
+        :param Y: (n, k) outputs, roughly zero-mean.
+        """
+        n, d = X.shape
+        bounds = [(np.log(1e-2), np.log(1e2))] * d + [(np.log(1e-10), np.log(1e-1))]
+        starts = [np.concatenate([np.full(d, np.log(0.5)), [np.log(1e-6)]])]
+        for _ in range(self.n_restarts):
+            starts.append(np.array([self.rng.uniform(lo, hi) for lo, hi in bounds]))
+        best = None
+        for start in starts:
+            result = optimize.minimize(self._neg_log_likelihood, start, args=(X, Y), method="L-BFGS-B",
+                                       bounds=bounds)
+            if best is None or result.fun < best.fun:
+                best = result
+        self.log_theta = best.x
+        self.X = X
+        self.factor = self._factor(X, self.log_theta)
+        self.alpha = linalg.cho_solve(self.factor, Y)
+        # L^-1, so predictive variances are one matrix product, not a solve.
+        self.whiten = linalg.solve_triangular(self.factor[0], np.eye(n), lower=True)
+        self.signal_variance = np.einsum("ij,ij->j", Y, self.alpha) / n
+        self.nugget = np.exp(self.log_theta[-1])
+        return self
+
+    def latent_variance(self, X):
+        """Predictive variance per unit signal variance, shape (m,)."""
+        w = self.correlation(X, self.X) @ self.whiten.T
+        return np.maximum(1.0 - np.einsum("ij,ij->i", w, w), 0.0)
+
+    def predict(self, X):
+        """Mean (m, k) and variance (m, k) at inputs ``X``."""
+        r = self.correlation(X, self.X)
+        w = r @ self.whiten.T
+        latent = np.maximum(1.0 - np.einsum("ij,ij->i", w, w), 0.0)
+        return r @ self.alpha, latent[:, None] * self.signal_variance
+
+    def leave_one_out(self):
+        """Closed-form leave-one-out residuals (observed - predicted) and variances, both (n, k)."""
+        inverse_diag = np.diag(linalg.cho_solve(self.factor, np.eye(self.X.shape[0])))
+        residual = self.alpha / inverse_diag[:, None]
+        return residual, self.signal_variance / inverse_diag[:, None]
+
+
+class SDSurrogate:
+    """
+    Emulator of ``HousingModel`` output trajectories over policy levers and
+    parameters.
+
+    Training runs come from ``EnsembleRunner`` on a Latin hypercube design.
+    Each run's trajectories (n_steps x n_outputs) are standardized per
+    output and compressed with a principal component decomposition keeping
+    ``variance_kept`` of the variance; a ``GaussianProcess`` maps the inputs
+    to the component scores. A prediction is then a few small matrix
+    products and returns the full trajectories with a standard deviation
+    (GP variance plus the variance of the dropped components). Batching
+    scenarios in one ``predict`` call is cheaper per scenario than ``query``,
+    which also builds a DataFrame.
+
+    ``validate`` reports the emulator error (leave-one-out, or against fresh
+    runs) and ``refine`` adds the design points where the emulator is least
+    certain.
+    """
+
+    def __init__(self, config_file_path, bounds=None, outputs=DEFAULT_OUTPUTS, variance_kept=0.9999,
+                 workers=1, seed=None):
+        """
+        :param config_file_path: Base scenario; inputs not in ``bounds`` keep its values.
+        :param bounds: ``{name: (low, high)}``, names as in ``override_configs``;
+            defaults to the six ``model_policies`` levers (``DEFAULT_POLICY_BOUNDS``).
+        """
+        self.config = Utils.load_yaml(config_file_path)
+        self.bounds = dict(bounds or DEFAULT_POLICY_BOUNDS)
+        self.inputs = list(self.bounds)
+        self.low = np.array([self.bounds[k][0] for k in self.inputs], dtype=float)
+        self.high = np.array([self.bounds[k][1] for k in self.inputs], dtype=float)
+        self.outputs = list(outputs)
+        self.variance_kept = variance_kept
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.ensemble = EnsembleRunner(self.config, self.outputs, workers=workers)
+        self.X = np.empty((0, len(self.inputs)))
+        self.Y = None
+        self.times = None
+
+    # ------------------------------------------------------------------
+    # Training data
+    # ------------------------------------------------------------------
+    def _unit(self, X):
+        return (np.atleast_2d(np.asarray(X, dtype=float)) - self.low) / (self.high - self.low)
+
+    def sample(self, n):
+        """``n`` Latin hypercube points within the bounds."""
+        unit = qmc.LatinHypercube(d=len(self.inputs), seed=self.rng).random(n)
+        return self.low + unit * (self.high - self.low)
+
+    def simulate(self, X):
+        """Trajectories of each row of ``X``, shape (n, n_steps, n_outputs)."""
+        self.times, record = self.ensemble.run_configs(override_configs(self.config, self.inputs, X))
+        return np.moveaxis(record, -1, 0).astype(np.float64)
+
+    def add(self, X, Y=None):
+        """Add design points (simulated unless ``Y`` is given) and retrain."""
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        Y = self.simulate(X) if Y is None else np.asarray(Y, dtype=float)
+        self.X = np.vstack([self.X, X])
+        self.Y = Y if self.Y is None else np.concatenate([self.Y, Y])
+        self._train()
+        return self
+
+    def fit(self, n_samples=64):
+        """Train on a fresh Latin hypercube design of ``n_samples`` runs."""
+        return self.add(self.sample(n_samples))
+
+    def _train(self):
+        n, n_steps, n_outputs = self.Y.shape
+        flat = self.Y.reshape(n, -1)
+        self.mean = flat.mean(axis=0)
+        # One scale per output, so outputs in MXN and in ratios weigh alike.
+        self.scale = np.tile(np.maximum(self.Y.std(axis=(0, 1)), 1e-12), n_steps)
+        U, S, Vt = linalg.svd((flat - self.mean) / self.scale, full_matrices=False)
+        explained = np.cumsum(S ** 2) / max((S ** 2).sum(), 1e-300)
+        k = int(np.searchsorted(explained, self.variance_kept) + 1)
+        k = min(k, S.shape[0])
+        self.components = Vt[:k]
+        self.residual_variance = (S[k:, None] ** 2 * Vt[k:] ** 2).sum(axis=0) / max(n - 1, 1) * self.scale ** 2
+        self.gp = GaussianProcess(seed=self.seed).fit(self._unit(self.X), U[:, :k] * S[:k])
+        # Components pre-scaled back to output units for _reconstruct.
+        self._mean_map = self.components * self.scale
+        self._variance_map = self.components ** 2 * self.scale ** 2
+
+    # ------------------------------------------------------------------
+    # Prediction
+    # ------------------------------------------------------------------
+    def _reconstruct(self, score_mean, score_variance):
+        mean = self.mean + score_mean @ self._mean_map
+        variance = score_variance @ self._variance_map + self.residual_variance
+        shape = (-1,) + self.Y.shape[1:]
+        return mean.reshape(shape), np.sqrt(variance).reshape(shape)
+
+    def predict(self, X):
+        """
+        Emulated trajectories at inputs ``X`` (rows ordered as ``inputs``).
+        Pass many scenarios at once for the lowest cost per scenario.
+
+        :return: ``(mean, std)``, each of shape (m, n_steps, n_outputs).
+        """
+        return self._reconstruct(*self.gp.predict(self._unit(X)))
+
+    def query(self, **values):
+        """
+        Trajectories for one scenario given by input name; inputs not given
+        take the base config's value.
+
+        :return: DataFrame with ``time`` and, per output, its mean and ``<output>_std``.
+        """
+        row = [values.pop(name, self._base_value(name)) for name in self.inputs]
+        if values:
+            raise KeyError(f"Unknown surrogate inputs: {sorted(values)}")
+        mean, std = self.predict(np.array([row]))
+        columns = {"time": self.times}
+        columns.update({output: mean[0, :, i] for i, output in enumerate(self.outputs)})
+        columns.update({f"{output}_std": std[0, :, i] for i, output in enumerate(self.outputs)})
+        return pd.DataFrame(columns, copy=False)
+
+    def _base_value(self, name):
+        section, key = name.split(".", 1) if "." in name else ("model_policies", name)
+        return self.config[section][key]
+
+    # ------------------------------------------------------------------
+    # Validation and refinement
+    # ------------------------------------------------------------------
+    def _errors(self, observed, mean, std, confidence):
+        z = stats.norm.ppf((1 + confidence) / 2)
+        rows = []
+        for i, output in enumerate(self.outputs):
+            error = mean[..., i] - observed[..., i]
+            span = max(np.ptp(self.Y[..., i]), 1e-300)
+            rows.append({
+                "output": output,
+                "rmse": float(np.sqrt(np.mean(error ** 2))),
+                "nrmse": float(np.sqrt(np.mean(error ** 2)) / span),
+                "max_abs_error": float(np.abs(error).max()),
+                "coverage": float(np.mean(np.abs(error) <= z * std[..., i])),
+            })
+        return pd.DataFrame(rows)
+
+    def validate(self, X_test=None, n_test=0, confidence=0.95):
+        """
+        Emulator error per output: RMSE, RMSE relative to the output's range
+        in the training data, max absolute error, and the share of values
+        inside the ``confidence`` interval.
+
+        :param X_test: Inputs to simulate and compare against. If None and
+            ``n_test`` is 0, uses the closed-form leave-one-out predictions
+            of the training runs (no new simulations).
+        """
+        if X_test is None and n_test > 0:
+            X_test = self.sample(n_test)
+        if X_test is None:
+            residual, variance = self.gp.leave_one_out()
+            scores = self.Y.reshape(self.Y.shape[0], -1) - self.mean
+            scores = (scores / self.scale) @ self.components.T
+            mean, std = self._reconstruct(scores - residual, variance)
+            return self._errors(self.Y, mean, std, confidence)
+        mean, std = self.predict(X_test)
+        return self._errors(self.simulate(X_test), mean, std, confidence)
+
+    def select(self, n_new, n_candidates=2048):
+        """
+        Next design points: from ``n_candidates`` random points, greedily the
+        one with the largest predictive variance, treating each pick as
+        already run before taking the next (the GP variance does not depend
+        on the outputs).
+        """
+        candidates = self._unit(self.sample(n_candidates))
+        gp = self.gp
+        X_design = gp.X
+        chosen = []
+        for _ in range(n_new):
+            R = gp.correlation(X_design, X_design)
+            R[np.diag_indices_from(R)] += gp.nugget
+            factor = linalg.cho_factor(R, lower=True)
+            r = gp.correlation(candidates, X_design)
+            variance = 1.0 - np.einsum("ij,ji->i", r, linalg.cho_solve(factor, r.T))
+            best = int(np.argmax(variance))
+            chosen.append(candidates[best])
+            X_design = np.vstack([X_design, candidates[best]])
+            candidates = np.delete(candidates, best, axis=0)
+        return self.low + np.array(chosen) * (self.high - self.low)
+
+    def refine(self, n_new=8, n_candidates=2048):
+        """Simulate ``n_new`` points chosen by ``select`` and retrain; returns them."""
+        X_new = self.select(n_new, n_candidates)
+        self.add(X_new)
+        return X_new
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def save(self, path):
+        """Write the design and training runs to a ``.npz`` file."""
+        np.savez(path, X=self.X, Y=self.Y, times=self.times, inputs=np.array(self.inputs),
+                 outputs=np.array(self.outputs))
+
+    def load(self, path):
+        """Retrain from a file written by ``save`` (inputs and outputs must match)."""
+        with np.load(path) as data:
+            if list(data["inputs"]) != self.inputs or list(data["outputs"]) != self.outputs:
+                raise ValueError(f"'{path}' was saved for other inputs or outputs")
+            self.times = data["times"]
+            self.X = np.empty((0, len(self.inputs)))
+            self.Y = None
+            return self.add(data["X"], data["Y"])
+
+
+if __name__ == "__main__":
+    import time
+
+    DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+    surrogate = SDSurrogate(os.path.join(DIR_PATH, "config", "baseline_mty.yaml"), seed=42)
+    surrogate.fit(48)
+    print(surrogate.validate())
+    surrogate.refine(16)
+    print(surrogate.validate(n_test=16))
+
+    start = time.perf_counter()
+    answer = surrogate.query(tax_rate=0.004, zoning_and_regulation=0.6)
+    print(f"query in {(time.perf_counter() - start) * 1e6:.0f} us")
+    print(answer.iloc[::50].to_string(index=False))
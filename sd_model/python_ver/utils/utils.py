@@ -39,6 +39,11 @@ class Utils:
         """
         return x/(half_sat + x) if (half_sat + x) > 0 else 0
 
+    def saturating_response_array(self, x: np.ndarray, half_sat: float) -> np.ndarray:
+        """Elementwise ``saturating_response`` over an array of inputs."""
+        denom = half_sat + x
+        return np.where(denom > 0, x / np.where(denom > 0, denom, 1.0), 0.0)
+
     def exp_decay(self, x: float, sensitivity: float) -> float:
         """Negative exponential: exp(–sensitivity * x)."""
         return np.exp(-sensitivity * x)
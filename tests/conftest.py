@@ -0,0 +1,14 @@
+import os
+import sys
+
+# The ABM and SD scripts import their modules by flat name, as when run from
+# their own directories.
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+ABM_DIR = os.path.join(ROOT, "abm", "mty_abm")
+SD_DIR = os.path.join(ROOT, "sd_model", "python_ver")
+for path in (ABM_DIR, SD_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data")
+SD_CONFIG_DIR = os.path.join(SD_DIR, "config")
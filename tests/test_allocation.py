@@ -0,0 +1,32 @@
+import itertools
+import numpy as np
+
+from agents.municipalities import greedy_allocation, knapsack_allocation
+
+
+def best_subset(value, cost, budget):
+    best = 0.0
+    for mask in itertools.product([False, True], repeat=value.shape[0]):
+        mask = np.array(mask)
+        if cost[mask].sum() <= budget:
+            best = max(best, value[mask].sum())
+    return best
+
+
+def test_greedy_skips_items_that_do_not_fit():
+    selected = greedy_allocation(np.array([10.0, 1.0, 1.0]), np.array([8.0, 1.0, 1.0]), 9.0)
+    np.testing.assert_array_equal(selected, [True, True, False])
+
+
+def test_allocations_stay_within_budget():
+    rng = np.random.default_rng(4)
+    for _ in range(200):
+        n = int(rng.integers(1, 10))
+        value, cost = rng.uniform(0, 10, n), rng.uniform(0.1, 10, n)
+        budget = float(rng.uniform(0, cost.sum()))
+        greedy = greedy_allocation(value, cost, budget)
+        knapsack = knapsack_allocation(value, cost, budget)
+        assert cost[greedy].sum() <= budget
+        assert cost[knapsack].sum() <= budget
+        assert value[knapsack].sum() >= value[greedy].sum()
+        assert value[knapsack].sum() <= best_subset(value, cost, budget) + 1e-9
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from agents.household_store import NO_NODE
+from inequality import InequalityTracker, gini, grouped_gini, grouped_theil, mean_burden, theil
+from model import MonterreyModel
+
+
+def from_scratch(model):
+    """The tracker's metrics recomputed from the household store."""
+    income = model.households.view("income").astype(np.float64)
+    nodes = model.households.view("node")
+    housed = nodes != NO_NODE
+    n_nodes = model.grid.n_nodes
+    return {
+        "gini": gini(income),
+        "theil": theil(income),
+        "housed_theil": theil(income[housed]),
+        "node_gini": grouped_gini(income[housed], nodes[housed], n_nodes),
+        "node_theil": grouped_theil(income[housed], nodes[housed], n_nodes),
+        "mean_burden": mean_burden(model),
+    }
+
+
+def check(tracker, model):
+    expected = from_scratch(model)
+    assert tracker.gini == pytest.approx(expected["gini"], rel=1e-12)
+    assert tracker.theil == pytest.approx(expected["theil"], rel=1e-9)
+    np.testing.assert_allclose(tracker.node_gini, expected["node_gini"], rtol=1e-12)
+    np.testing.assert_allclose(tracker.node_theil, expected["node_theil"], rtol=1e-9, atol=1e-12)
+    assert tracker.mean_burden() == pytest.approx(expected["mean_burden"], rel=1e-9)
+    assert sum(tracker.theil_decomposition()) == pytest.approx(expected["housed_theil"], rel=1e-9)
+
+
+@pytest.mark.parametrize("known_changes", [False, True])
+def test_tracker_matches_full_recomputation(known_changes):
+    model = MonterreyModel(num_households=2000, num_landlords=4, seed=3)
+    rng = np.random.default_rng(11)
+    tracker = InequalityTracker(model)
+    check(tracker, model)
+    for _ in range(12):
+        before = model.households.view("node").copy()
+        model.step()
+        # Income shocks (with repeated values), exits and newcomers between
+        # updates, on top of the moves made by the step.
+        n = len(model.households)
+        income = model.households.view("income")
+        shocked = rng.choice(n, size=50, replace=False)
+        income[shocked] = rng.integers(500, 3000, size=50)
+        left = rng.choice(n, size=10, replace=False)
+        model.exit_households(left)
+        model.add_households(rng.integers(500, 3000, size=20))
+        if known_changes:
+            moved = np.flatnonzero(model.households.view("node")[:n] != before[:n])
+            # Overlapping lists, as callers naturally pass them.
+            tracker.update(np.concatenate([moved, shocked, left]))
+        else:
+            tracker.update()
+        check(tracker, model)
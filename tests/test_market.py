@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from environment.street_network import grid_network
+from model import MonterreyModel
+from parallel import PartitionedMarket
+
+
+def build(parallel_workers=None):
+    return MonterreyModel(network=grid_network(8, 8), cbd_nodes=[27], num_households=3000, num_landlords=6,
+                          num_municipalities=2, parallel_workers=parallel_workers, seed=5)
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_partitioned_market_matches_serial(workers):
+    serial = build()
+    parallel = build(workers)
+    assert isinstance(parallel.market, PartitionedMarket)
+    try:
+        for _ in range(8):
+            serial.step()
+            parallel.step()
+            np.testing.assert_array_equal(parallel.households.view("node"), serial.households.view("node"))
+            np.testing.assert_array_equal(parallel.grid.housing_cost, serial.grid.housing_cost)
+            np.testing.assert_array_equal(parallel.grid.dwellings, serial.grid.dwellings)
+    finally:
+        parallel.close()
+
+
+def test_model_keeps_clearing_after_close():
+    serial = build()
+    parallel = build(2)
+    for _ in range(3):
+        serial.step()
+        parallel.step()
+    parallel.close()
+    assert not isinstance(parallel.market, PartitionedMarket)
+    for _ in range(3):
+        serial.step()
+        parallel.step()
+    np.testing.assert_array_equal(parallel.households.view("node"), serial.households.view("node"))
+    np.testing.assert_array_equal(parallel.grid.housing_cost, serial.grid.housing_cost)
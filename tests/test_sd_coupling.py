@@ -0,0 +1,25 @@
+import os
+import numpy as np
+import pandas as pd
+
+from conftest import DATA_DIR, SD_CONFIG_DIR
+from sd_coupling import HybridModel
+
+BASELINE_CONFIG = os.path.join(SD_CONFIG_DIR, "baseline_mty.yaml")
+
+
+def test_one_way_coupling_keeps_standalone_sd_trajectory():
+    hybrid = HybridModel(BASELINE_CONFIG, abm_params={"num_households": 1000}, feedback_weight=0.0, seed=1)
+    sd, exchange = hybrid.run()
+    reference = pd.read_csv(os.path.join(DATA_DIR, "sd_baseline_mty_reference.csv"), float_precision="round_trip")
+    np.testing.assert_array_equal(sd.iloc[::10].to_numpy(), reference.to_numpy())
+    assert exchange["abm_households"].iloc[-1] > 1000
+
+
+def test_abm_steps_follow_window_length():
+    # 301 SD steps of 0.1 years: 30 full yearly windows and one of a single step.
+    hybrid = HybridModel(BASELINE_CONFIG, abm_params={"num_households": 1000}, abm_steps_per_sync=2, seed=1)
+    _, exchange = hybrid.run()
+    assert len(exchange) == 31
+    assert hybrid.abm.steps == 60
+    np.testing.assert_allclose(exchange["time"].iloc[[0, -1]], [1.0, 30.1])
@@ -0,0 +1,98 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import DATA_DIR, SD_CONFIG_DIR
+from model_v6 import HousingModel, MV_VARIABLES
+from model_graph import load_graph
+
+BASELINE_CONFIG = os.path.join(SD_CONFIG_DIR, "baseline_mty.yaml")
+
+# Every 10th step of the baseline run, written by the dict-based run_step the
+# model had before the preallocated record (full float precision).
+REFERENCE = os.path.join(DATA_DIR, "sd_baseline_mty_reference.csv")
+
+
+def time_range(config):
+    sim_p = config["simulation_parameters"]
+    return np.arange(0, sim_p["sim_time"] + sim_p["time_step"], sim_p["time_step"]), sim_p["time_step"]
+
+
+def run_record(config_path):
+    """Run ``HousingModel`` with ``run_step_into``; return the full table of the run."""
+    hm = HousingModel(config_path)
+    times, dt = time_range(hm.config)
+    record = hm.allocate_record(len(times))
+    houses_traj = np.empty(len(times))
+    houses = hm.config["simulation_parameters"]["houses_init"]
+    for i, time in enumerate(times):
+        houses_traj[i] = houses
+        houses += hm.run_step_into(houses, time, dt, record[i]) * dt
+    df = pd.DataFrame(hm.expand_record(times, houses_traj, record), columns=MV_VARIABLES)
+    df.insert(0, "houses", houses_traj)
+    df.insert(0, "time", times)
+    return df
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return pd.read_csv(REFERENCE, float_precision="round_trip")
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    return run_record(BASELINE_CONFIG)
+
+
+def test_run_step_matches_reference(reference):
+    hm = HousingModel(BASELINE_CONFIG)
+    times, dt = time_range(hm.config)
+    houses = hm.config["simulation_parameters"]["houses_init"]
+    rows = []
+    for time in times:
+        housesD, mv = hm.run_step(houses, time, dt)
+        rows.append({"time": time, "houses": houses, **mv})
+        houses += housesD * dt
+    df = pd.DataFrame(rows).iloc[::10].reset_index(drop=True)
+    assert list(df.columns) == list(reference.columns)
+    np.testing.assert_array_equal(df.to_numpy(), reference.to_numpy())
+
+
+def test_record_matches_reference(baseline, reference):
+    df = baseline.iloc[::10].reset_index(drop=True)
+    assert list(df.columns) == list(reference.columns)
+    np.testing.assert_array_equal(df.to_numpy(), reference.to_numpy())
+
+
+@pytest.mark.parametrize("backend", ["scalar", "numpy"])
+def test_graph_kernel_matches_model_v6(baseline, backend):
+    graph = load_graph("housing_v6")
+    outputs = ["houses", *MV_VARIABLES]
+    kernel = graph.compile(outputs, backend=backend)
+    config = HousingModel(BASELINE_CONFIG).config
+    times, record, _ = kernel.run(config if backend == "scalar" else [config])
+    if backend == "numpy":
+        record = record[..., 0]
+    np.testing.assert_array_equal(times, baseline["time"].to_numpy())
+    np.testing.assert_allclose(record, baseline[outputs].to_numpy(), rtol=1e-12, atol=0)
+
+
+def test_graph_kernel_batch_members_match_single_runs():
+    graph = load_graph("housing_v6")
+    outputs = ["houses", "housing_cost", "time_in_traffic"]
+    configs = [HousingModel(os.path.join(SD_CONFIG_DIR, f"{name}_mty.yaml")).config
+               for name in ("baseline", "efficient", "proximate")]
+    _, batch, _ = graph.compile(outputs, backend="numpy").run(configs)
+    scalar = graph.compile(outputs, backend="scalar")
+    for k, config in enumerate(configs):
+        _, single, _ = scalar.run(config)
+        np.testing.assert_allclose(batch[..., k], single, rtol=1e-12, atol=0)
+
+
+def test_pruned_kernel_matches_full_kernel():
+    graph = load_graph("housing_v6")
+    config = HousingModel(BASELINE_CONFIG).config
+    _, full, _ = graph.compile(["houses", *MV_VARIABLES], backend="scalar").run(config)
+    _, pruned, _ = graph.compile(["houses"], backend="scalar").run(config)
+    np.testing.assert_array_equal(pruned[:, 0], full[:, 0])
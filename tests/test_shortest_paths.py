@@ -0,0 +1,56 @@
+import networkx as nx
+import numpy as np
+import pytest
+from scipy.sparse import csgraph
+
+from environment.street_network import TravelTimeIndex
+
+
+def random_network(directed, seed):
+    rng = np.random.default_rng(seed)
+    G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(12, 12))
+    if directed:
+        G = G.to_directed()
+    for u, v in G.edges():
+        G.edges[u, v]["travel_time"] = float(rng.uniform(0.5, 5.0))
+    return G
+
+
+def full_dijkstra(index, sources):
+    return csgraph.dijkstra(index.adjacency.T, indices=sources, min_only=True)
+
+
+def check_tree(index, paths):
+    """Every next hop lies on a shortest path: dist[u] = w(u, next_hop[u]) + dist[next_hop[u]]."""
+    hop = paths.next_hop
+    routed = np.flatnonzero(hop >= 0)
+    weights = np.asarray(index.adjacency[routed, hop[routed]]).ravel()
+    np.testing.assert_allclose(paths.dist[routed], weights + paths.dist[hop[routed]], rtol=1e-12)
+    np.testing.assert_array_equal(paths.nearest[routed], paths.nearest[hop[routed]])
+
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_repair_matches_full_dijkstra(directed):
+    rng = np.random.default_rng(7)
+    G = random_network(directed, seed=1)
+    index = TravelTimeIndex(G, cbd_nodes=[0, 77], service_nodes=[30, 100, 143])
+    tails, heads = np.array(list(G.edges())).T
+    for _ in range(40):
+        # A few edges per round, a mix of slowdowns (e.g. congestion) and
+        # speedups (e.g. new lanes), some far out of the previous range.
+        pick = rng.choice(len(tails), size=rng.integers(1, 8), replace=False)
+        weights = rng.uniform(0.1, 20.0, size=len(pick))
+        index.update_edge_weights(tails[pick], heads[pick], weights)
+
+        np.testing.assert_allclose(index.to_cbd, full_dijkstra(index, index.cbd_nodes), rtol=1e-12)
+        np.testing.assert_allclose(index.to_services, full_dijkstra(index, index.service_nodes), rtol=1e-12)
+        check_tree(index, index.cbd_paths)
+        check_tree(index, index.service_paths)
+
+
+def test_repair_returns_changed_nodes():
+    G = random_network(False, seed=2)
+    index = TravelTimeIndex(G, cbd_nodes=[0])
+    before = index.to_cbd.copy()
+    changed = index.update_edge_weights([0], [1], [50.0])
+    np.testing.assert_array_equal(changed, np.flatnonzero(index.to_cbd != before))
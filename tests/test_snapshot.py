@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pytest
+
+from environment.land_use import LAYERS, LandUseRaster
+from environment.street_network import grid_network
+from model import MonterreyModel
+from snapshot import load_snapshot, model_state, replay, run_with_snapshots, save_snapshot
+
+WARM_UP = 10
+N_STEPS = 30
+
+
+def build(land_use=None):
+    G = grid_network(6, 6)
+    for n in G.nodes:
+        # Node centres of a 600 m x 600 m raster with its corner at the origin.
+        G.nodes[n]["x"] = 50.0 + 100.0 * (n % 6)
+        G.nodes[n]["y"] = -50.0 - 100.0 * (n // 6)
+    return MonterreyModel(network=G, cbd_nodes=[14], num_households=1500, num_landlords=8, num_municipalities=2,
+                          land_use=land_use, seed=9)
+
+
+def assert_same_state(a, b):
+    arrays_a, meta_a = model_state(a)
+    arrays_b, meta_b = model_state(b)
+    assert meta_a == meta_b
+    assert arrays_a.keys() == arrays_b.keys()
+    for name in arrays_a:
+        np.testing.assert_array_equal(arrays_a[name], arrays_b[name], err_msg=name)
+
+
+@pytest.mark.parametrize("name", ["snapshot", "snapshot.npz"])
+def test_replay_matches_straight_run(tmp_path, name):
+    straight = build()
+    for _ in range(WARM_UP):
+        straight.step()
+    path = save_snapshot(straight, tmp_path / name, compress=name.endswith(".npz"))
+    for _ in range(N_STEPS - WARM_UP):
+        straight.step()
+
+    replayed = replay(path, build, N_STEPS - WARM_UP)
+    assert replayed.steps == straight.steps == N_STEPS
+    assert_same_state(replayed, straight)
+
+
+def test_periodic_snapshots_restore_exactly(tmp_path):
+    model = build()
+    paths = run_with_snapshots(model, N_STEPS, snapshot_every=10, snapshot_dir=tmp_path)
+    assert [os.path.basename(p) for p in paths] == ["step_00010", "step_00020", "step_00030"]
+    assert_same_state(load_snapshot(build(), paths[-1]), model)
+
+
+def test_replay_with_land_use(tmp_path):
+    raster_path = str(tmp_path / "raster")
+    LandUseRaster.create(raster_path, shape=(60, 60), cell_size=10.0, tile_size=16)
+
+    def layers(raster):
+        return {name: np.array(raster.layers[name]) for name in LAYERS}
+
+    straight = build(raster_path)
+    for _ in range(WARM_UP):
+        straight.step()
+    path = save_snapshot(straight, tmp_path / "snapshot")
+    warm_up = layers(straight.land_use)
+    for _ in range(N_STEPS - WARM_UP):
+        straight.step()
+    straight.land_use.flush()
+    after = layers(straight.land_use)
+    assert after["density"].sum() > warm_up["density"].sum(), "nothing was built after the snapshot"
+
+    # The replay develops its private copy of the warm-up raster; neither the
+    # snapshot's copy nor the original raster changes.
+    replayed = replay(path, lambda: build(raster_path), N_STEPS - WARM_UP)
+    assert_same_state(replayed, straight)
+    for name, values in layers(replayed.land_use).items():
+        np.testing.assert_array_equal(values, after[name], err_msg=name)
+    for name, values in layers(LandUseRaster(os.path.join(path, "land_use"), mode="r")).items():
+        np.testing.assert_array_equal(values, warm_up[name], err_msg=name)
+    for name, values in layers(LandUseRaster(raster_path, mode="r")).items():
+        np.testing.assert_array_equal(values, after[name], err_msg=name)
+
+    with pytest.raises(ValueError):
+        save_snapshot(straight, tmp_path / "snapshot.npz")